@@ -1,14 +1,20 @@
 import os
+import json
 import time
+import uuid
+import shutil
 import datetime
-from flask import request
+from flask import request, Response, stream_with_context
 from flask_restx import Resource, Namespace, fields, reqparse
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
-from database.mongo_client import insert_pdf_record, insert_log_record, get_log_records
-from utils.pdf_processor import process_pdf
-from utils.embeddings import get_embeddings_model
-from langchain_chroma import Chroma
+from database.mongo_client import insert_log_record, get_log_records, get_job_record, get_log_writer_stats
+from database.document_catalog import get_document_catalog, get_document_matcher
+from rag.answer_cache import get_answer_cache
+from rag.structure_answers import answer_structural_question
+from rag.scheduler import get_llm_scheduler, SchedulerOverloaded
+from utils.metrics import span
+from utils.ingestion_queue import get_ingestion_queue, IngestionQueueFull
 
 # Create namespaces
 pdf_ns = Namespace('pdf', description='PDF upload operations')
@@ -35,15 +41,31 @@ query_response_model = query_ns.model('QueryResponse', {
     'citations': fields.List(fields.Raw, description='Citations from the document')
 })
 
+query_batch_item_model = query_ns.model('QueryBatchItem', {
+    'question': fields.String(required=True, description='Question to ask'),
+    'document': fields.String(required=False, description='Document to search; matched from the question when omitted')
+})
+
+query_batch_request_model = query_ns.model('QueryBatchRequest', {
+    'items': fields.List(fields.Nested(query_batch_item_model), required=True, description='Questions to answer')
+})
+
 logs_response_model = logs_ns.model('LogsResponse', {
     'success': fields.Boolean(description='Operation success status'),
     'message': fields.String(description='Response message'),
     'logs': fields.List(fields.Raw, description='Log records'),
+    'next_cursor': fields.String(description='Cursor for the next page, empty on the last page'),
     'x_fields': fields.String(description='X-FIELDS header value', required=False)
 })
 
 logs_parser = reqparse.RequestParser()
 logs_parser.add_argument('log_id', location='args', type=str, required=False, help='Log ID to filter logs')
+logs_parser.add_argument('endpoint', location='args', type=str, required=False, help='Only logs for this endpoint, e.g. /query/')
+logs_parser.add_argument('status_code', location='args', type=int, required=False, help='Only logs with this HTTP status code')
+logs_parser.add_argument('since', location='args', type=str, required=False, help='ISO timestamp, only logs at or after it')
+logs_parser.add_argument('until', location='args', type=str, required=False, help='ISO timestamp, only logs before it')
+logs_parser.add_argument('cursor', location='args', type=str, required=False, help='next_cursor from the previous page')
+logs_parser.add_argument('limit', location='args', type=int, required=False, default=100, help='Page size (max 500)')
 
 @pdf_ns.route('/papers')
 class PDFUpload(Resource):
@@ -60,46 +82,62 @@ class PDFUpload(Resource):
             if not file.filename.lower().endswith('.pdf'):
                 return {'success': False, 'message': 'Only PDF files are allowed', 'data': None}, 400
             
-            # Save file
-            filename = secure_filename(file.filename)
-            storage_dir = os.getenv('PDF_STORAGE_DIR', '/app/storage/pdfs')
-            os.makedirs(storage_dir, exist_ok=True)
-            filepath = os.path.join(storage_dir, filename)
-            file.save(filepath)
-            
-            # Process PDF and store in ChromaDB
-            chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
-            chunk_count = process_pdf(filepath, chroma_dir)
-            
-            # Store metadata in MongoDB
-            record_id = insert_pdf_record({
-                'filename': filename,
-                'filepath': filepath,
-                'chunks': chunk_count,
-                'upload_time': datetime.datetime.utcnow().isoformat()
-            })
+            queue = get_ingestion_queue()
+            try:
+                # Refuse before touching storage when no job slot is free
+                if not queue.has_capacity():
+                    raise IngestionQueueFull('Ingestion queue is full, retry later')
+
+                # Stage the upload under its own directory; the job moves it over the
+                # stored file only after indexing it, so a rejected or still running
+                # upload never rewrites the stored PDF
+                filename = secure_filename(file.filename)
+                storage_dir = os.getenv('PDF_STORAGE_DIR', '/app/storage/pdfs')
+                staging_dir = os.path.join(storage_dir, '.incoming', uuid.uuid4().hex)
+                os.makedirs(staging_dir, exist_ok=True)
+                staged_path = os.path.join(staging_dir, filename)
+                file.save(staged_path)
+
+                # Queue the PDF for indexing in ChromaDB by the ingestion workers
+                chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
+                try:
+                    job_id = queue.submit(filename, staged_path, chroma_dir,
+                                          stored_path=os.path.join(storage_dir, filename))
+                except Exception:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    raise
+            except IngestionQueueFull as e:
+                insert_log_record({
+                    'timestamp': datetime.datetime.utcnow().isoformat(),
+                    'endpoint': '/pdf/papers',
+                    'method': 'POST',
+                    'status_code': 429,
+                    'message': str(e),
+                    'additional_data': {'filename': file.filename}
+                })
+                retry_after = os.getenv('INGESTION_RETRY_AFTER', '30')
+                return {'success': False, 'message': str(e), 'data': None}, 429, {'Retry-After': retry_after}
 
             insert_log_record({
                 'timestamp': datetime.datetime.utcnow().isoformat(),
                 'endpoint': '/pdf/papers',
                 'method': 'POST',
-                'status_code': 200,
-                'message': 'PDF uploaded and indexed',
+                'status_code': 202,
+                'message': 'PDF uploaded and queued for indexing',
                 'additional_data': {
                     'filename': file.filename,
-                    'record_id': record_id,
-                    'chunks': chunk_count
+                    'job_id': job_id
                 }
             })
 
             return {
                 'success': True,
-                'message': 'PDF uploaded and embedded successfully',
+                'message': 'PDF uploaded and queued for indexing',
                 'data': {
-                    'record_id': record_id,
-                    'chunks_processed': chunk_count
+                    'job_id': job_id,
+                    'status_url': f'/pdf/jobs/{job_id}'
                 }
-            }, 200
+            }, 202
             
         except Exception as e:
             insert_log_record({
@@ -113,6 +151,132 @@ class PDFUpload(Resource):
             return {'success': False, 'message': f'Error processing PDF: {str(e)}', 'data': None}, 500
 
 
+@pdf_ns.route('/jobs/<string:job_id>')
+class IngestionJob(Resource):
+    @pdf_ns.marshal_with(pdf_response_model)
+    def get(self, job_id):
+        try:
+            job = get_job_record(job_id)
+            if not job:
+                return {'success': False, 'message': 'Job not found', 'data': None}, 404
+            return {
+                'success': True,
+                'message': f"Job is {job['state']}",
+                'data': job
+            }, 200
+        except Exception as e:
+            return {'success': False, 'message': f'Error fetching job: {str(e)}', 'data': None}, 500
+
+
+def _find_query_documents(question, endpoint):
+    """
+    Validate the question and find the documents it mentions.
+    Returns (mentioned_documents, available_documents, error_message); error_message is
+    set, and the failure already logged, when the request should be rejected with 400.
+    """
+    if not question or not question.strip():
+        insert_log_record({
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'endpoint': endpoint,
+            'method': 'POST',
+            'status_code': 400,
+            'message': 'Missing question',
+            'additional_data': {}
+        })
+        return [], set(), 'Please provide a question.'
+
+    # Get list of available documents from the document catalog
+    available_documents = set(get_document_catalog().keys())
+    
+    # Check if question mentions any document name
+    with span('document_matching'):
+        mentioned_documents = get_document_matcher().find_documents(question)
+    
+    # Validation: Require at least one document to be mentioned
+    if not mentioned_documents:
+        error_message = f"Please specify which document you're asking about. Available documents: {', '.join(available_documents)}"
+        
+        insert_log_record({
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'endpoint': endpoint,
+            'method': 'POST',
+            'status_code': 400,
+            'message': 'No document specified in question',
+            'additional_data': {
+                'question': question,
+                'available_documents': list(available_documents),
+                'error': 'Document name not mentioned in question'
+            }
+        })
+        return [], available_documents, error_message
+
+    return mentioned_documents, available_documents, None
+
+
+def _build_query_log_data(question, result, retrieved_chunks, processing_metadata, processing_time,
+                          mentioned_documents, available_documents):
+    return {
+        'question': question,
+        'answer': result.get('answer', ''),
+        'citations': result.get('citations', []),
+        'processing_time': processing_time,
+        'mentioned_documents': mentioned_documents,
+        'available_documents': list(available_documents),
+        'retrieved_chunks': [
+            {
+                'content': chunk.page_content[:200] + '...' if len(chunk.page_content) > 200 else chunk.page_content,
+                'metadata': chunk.metadata,
+                'document_name': chunk.metadata.get('document_name', ''),
+                'chunk_id': chunk.metadata.get('chunk_id', '')
+            }
+            for chunk in retrieved_chunks
+        ],
+        'performance_metrics': {
+            'total_processing_time': processing_time,
+            'chunks_retrieved': len(retrieved_chunks),
+            'model_response_time': processing_metadata.get('model_response_time', 0),
+            'retrieval_time': processing_metadata.get('retrieval_time', 0),
+            'context_tokens': processing_metadata.get('context_tokens'),
+            'context_tokens_saved': processing_metadata.get('context_tokens_saved', 0),
+            'time_to_first_token': processing_metadata.get('time_to_first_token'),
+            'llm_queue_wait_time': processing_metadata.get('llm_queue_wait_time', 0),
+            'llm_coalesced_wait_time': processing_metadata.get('llm_coalesced_wait_time', 0),
+            'llm_coalesced': processing_metadata.get('llm_coalesced', False),
+            'streamed': processing_metadata.get('streamed', False),
+            'answer_cache': processing_metadata.get('answer_cache', 'bypass'),
+            'answer_cache_tier': processing_metadata.get('answer_cache_tier'),
+            'fast_path': processing_metadata.get('fast_path')
+        },
+        'source_citations': [
+            {
+                'document_name': citation.get('document_name', ''),
+                'chunk_id': citation.get('chunk_id', ''),
+                'page': citation.get('page', ''),
+                'confidence': citation.get('confidence', 1.0)
+            }
+            for citation in result.get('citations', [])
+            if isinstance(citation, dict)
+        ]
+    }
+
+
+def _format_citations(result):
+    raw_citations = result.get("citations", [])
+    formatted_citations = []
+    if isinstance(raw_citations, list):
+        for c in raw_citations:
+            if isinstance(c, dict):
+                formatted_citations.append({
+                    "document_name": c.get("document_name", ""),
+                    "chunk_id": c.get("chunk_id", "")
+                })
+    return formatted_citations
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
 @query_ns.route('/')
 class Query(Resource):
     @query_ns.expect(query_parser)
@@ -123,73 +287,8 @@ class Query(Resource):
             args = query_parser.parse_args()
             question = args['question']
             
-            if not question or not question.strip():
-                insert_log_record({
-                    'timestamp': datetime.datetime.utcnow().isoformat(),
-                    'endpoint': '/query/',
-                    'method': 'POST',
-                    'status_code': 400,
-                    'message': 'Missing question',
-                    'additional_data': {}
-                })
-                return {
-                    'answer': 'Please provide a question.',
-                    'pdf_name': '',
-                    'citations': []
-                }, 400
-
-            # Get list of available documents from ChromaDB
-            from utils.embeddings import get_embeddings_model
-            from langchain_chroma import Chroma
-            
-            embedding_model = get_embeddings_model()
-            chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
-            vectorstore = Chroma(
-                collection_name="pdf_chunks",
-                embedding_function=embedding_model,
-                persist_directory=chroma_dir
-            )
-            
-            # Get all documents and their names
-            chroma_data = vectorstore.get()
-            available_documents = set()
-            
-            for metadata in chroma_data.get("metadatas", []):
-                if metadata and "document_name" in metadata:
-                    available_documents.add(metadata["document_name"])
-            
-            # Check if question mentions any document name
-            question_lower = question.lower()
-            mentioned_documents = []
-            
-            for doc_name in available_documents:
-                doc_name_lower = doc_name.lower()
-                # Remove file extension for comparison
-                doc_name_without_ext = doc_name_lower.replace('.pdf', '').replace('.txt', '')
-                
-                if (doc_name_lower in question_lower or 
-                    doc_name_without_ext in question_lower or
-                    doc_name_without_ext.replace('_', ' ') in question_lower or
-                    doc_name_without_ext.replace('-', ' ') in question_lower):
-                    mentioned_documents.append(doc_name)
-            
-            # Validation: Require at least one document to be mentioned
-            if not mentioned_documents:
-                error_message = f"Please specify which document you're asking about. Available documents: {', '.join(available_documents)}"
-                
-                insert_log_record({
-                    'timestamp': datetime.datetime.utcnow().isoformat(),
-                    'endpoint': '/query/',
-                    'method': 'POST',
-                    'status_code': 400,
-                    'message': 'No document specified in question',
-                    'additional_data': {
-                        'question': question,
-                        'available_documents': list(available_documents),
-                        'error': 'Document name not mentioned in question'
-                    }
-                })
-                
+            mentioned_documents, available_documents, error_message = _find_query_documents(question, '/query/')
+            if error_message:
                 return {
                     'answer': error_message,
                     'pdf_name': '',
@@ -197,46 +296,37 @@ class Query(Resource):
                 }, 400
 
             start_time = time.time()
-            
-            # Get detailed information from the chain
-            from rag.chain import run_query_chain_with_details
-            result, retrieved_chunks, processing_metadata = run_query_chain_with_details(question, mentioned_documents[0])
+
+            # Structural questions (first line, title, abstract, sections, page count) are
+            # answered from the document structure stored in the catalog, without the LLM
+            with span('structure_lookup'):
+                structural = answer_structural_question(question, mentioned_documents, get_document_catalog())
+
+            # Serve repeated questions about unchanged documents from the answer cache
+            answer_cache = get_answer_cache()
+            cached = None if structural else answer_cache.lookup(question, mentioned_documents)
+            if structural:
+                result, intent = structural
+                retrieved_chunks = []
+                processing_metadata = {'fast_path': f"structure:{intent}"}
+            elif cached:
+                result, retrieved_chunks, processing_metadata, cache_tier = cached
+                processing_metadata.update({'answer_cache': 'hit', 'answer_cache_tier': cache_tier})
+            else:
+                # Get detailed information from the chain
+                from rag.chain import run_query_chain_with_details
+                result, retrieved_chunks, processing_metadata = run_query_chain_with_details(question, mentioned_documents[0], mentioned_documents)
+                if retrieved_chunks:
+                    answer_cache.store(question, mentioned_documents, result, retrieved_chunks, processing_metadata)
+                processing_metadata = dict(processing_metadata, answer_cache='miss')
             
             processing_time = time.time() - start_time
 
             # Prepare detailed logging data
-            log_data = {
-                'question': question,
-                'answer': result.get('answer', ''),
-                'citations': result.get('citations', []),
-                'processing_time': processing_time,
-                'mentioned_documents': mentioned_documents,
-                'available_documents': list(available_documents),
-                'retrieved_chunks': [
-                    {
-                        'content': chunk.page_content[:200] + '...' if len(chunk.page_content) > 200 else chunk.page_content,
-                        'metadata': chunk.metadata,
-                        'document_name': chunk.metadata.get('document_name', ''),
-                        'chunk_id': chunk.metadata.get('chunk_id', '')
-                    }
-                    for chunk in retrieved_chunks
-                ],
-                'performance_metrics': {
-                    'total_processing_time': processing_time,
-                    'chunks_retrieved': len(retrieved_chunks),
-                    'model_response_time': processing_metadata.get('model_response_time', 0),
-                    'retrieval_time': processing_metadata.get('retrieval_time', 0)
-                },
-                'source_citations': [
-                    {
-                        'document_name': citation.get('document_name', ''),
-                        'chunk_id': citation.get('chunk_id', ''),
-                        'page': citation.get('page', ''),
-                        'confidence': citation.get('confidence', 1.0)
-                    }
-                    for citation in result.get('citations', [])
-                ]
-            }
+            log_data = _build_query_log_data(
+                question, result, retrieved_chunks, processing_metadata, processing_time,
+                mentioned_documents, available_documents
+            )
 
             insert_log_record({
                 'timestamp': datetime.datetime.utcnow().isoformat(),
@@ -247,24 +337,29 @@ class Query(Resource):
                 'additional_data': log_data
             })
 
-            raw_citations = result.get("citations", [])
-            formatted_citations = []
-            if isinstance(raw_citations, list):
-                for c in raw_citations:
-                    if isinstance(c, dict):
-                        formatted_citations.append({
-                            "document_name": c.get("document_name", ""),
-                            "chunk_id": c.get("chunk_id", "")
-                        })
-
             response_data = {
                 'answer': str(result.get('answer', '')),
                 'pdf_name': mentioned_documents[0] if mentioned_documents else 'context',
-                'citations': formatted_citations
+                'citations': _format_citations(result)
             }
             
             return response_data, 200
             
+        except SchedulerOverloaded as e:
+            insert_log_record({
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'endpoint': '/query/',
+                'method': 'POST',
+                'status_code': 429,
+                'message': str(e),
+                'additional_data': {'retry_after': e.retry_after}
+            })
+            return {
+                'answer': str(e),
+                'pdf_name': '',
+                'citations': []
+            }, 429, {'Retry-After': str(e.retry_after)}
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -283,16 +378,287 @@ class Query(Resource):
             }, 500
 
 
+@query_ns.route('/stream')
+class QueryStream(Resource):
+    @query_ns.expect(query_parser)
+    def post(self):
+        """
+        Stream the answer as Server-Sent Events: a 'citations' event with the retrieved
+        chunks, one 'token' event per generated piece, then a 'summary' event with timings
+        """
+        args = query_parser.parse_args()
+        question = args['question']
+
+        mentioned_documents, available_documents, error_message = _find_query_documents(question, '/query/stream')
+        if error_message:
+            return {
+                'answer': error_message,
+                'pdf_name': '',
+                'citations': []
+            }, 400
+
+        # Admission happens before the stream starts so overload can still answer 429
+        try:
+            release_slot = get_llm_scheduler().acquire_slot()
+        except SchedulerOverloaded as e:
+            insert_log_record({
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'endpoint': '/query/stream',
+                'method': 'POST',
+                'status_code': 429,
+                'message': str(e),
+                'additional_data': {'retry_after': e.retry_after}
+            })
+            return {
+                'answer': str(e),
+                'pdf_name': '',
+                'citations': []
+            }, 429, {'Retry-After': str(e.retry_after)}
+
+        def generate():
+            start_time = time.time()
+            try:
+                from rag.chain import stream_query_chain
+                for event, data in stream_query_chain(question, mentioned_documents[0], mentioned_documents):
+                    if event == 'citations':
+                        yield _sse_event('citations', {'pdf_name': mentioned_documents[0], 'citations': data})
+                    elif event == 'token':
+                        yield _sse_event('token', {'text': data})
+                    elif event == 'summary':
+                        processing_time = time.time() - start_time
+                        result = data['result']
+                        processing_metadata = data['processing_metadata']
+
+                        insert_log_record({
+                            'timestamp': datetime.datetime.utcnow().isoformat(),
+                            'endpoint': '/query/stream',
+                            'method': 'POST',
+                            'status_code': 200,
+                            'message': 'Query streamed successfully',
+                            'additional_data': _build_query_log_data(
+                                question, result, data['retrieved_docs'], processing_metadata,
+                                processing_time, mentioned_documents, available_documents
+                            )
+                        })
+
+                        yield _sse_event('summary', {
+                            'answer': str(result.get('answer', '')),
+                            'pdf_name': mentioned_documents[0],
+                            'citations': _format_citations(result),
+                            'timings': {
+                                'total_processing_time': processing_time,
+                                'retrieval_time': processing_metadata.get('retrieval_time', 0),
+                                'time_to_first_token': processing_metadata.get('time_to_first_token'),
+                                'model_response_time': processing_metadata.get('model_response_time', 0)
+                            }
+                        })
+
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                insert_log_record({
+                    'timestamp': datetime.datetime.utcnow().isoformat(),
+                    'endpoint': '/query/stream',
+                    'method': 'POST',
+                    'status_code': 500,
+                    'message': f'Error processing query: {str(e)}',
+                    'additional_data': {}
+                })
+                yield _sse_event('error', {'message': f'Error processing the question: {str(e)}'})
+            finally:
+                release_slot()
+
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # Also release the slot if the client disconnects before the stream starts
+        response.call_on_close(release_slot)
+        return response
+
+
+def _max_batch_items():
+    return int(os.getenv('QUERY_BATCH_MAX_ITEMS', '500'))
+
+
+def _resolve_batch_item(item, catalog):
+    """
+    Return (question, target_documents, error_message) for one batch item
+    """
+    if not isinstance(item, dict):
+        return '', [], 'Each item must be an object with a question.'
+
+    question = item.get('question')
+    if not isinstance(question, str) or not question.strip():
+        return '', [], 'Please provide a question.'
+
+    document = item.get('document')
+    if document:
+        if document not in catalog:
+            return question, [], f"Unknown document: {document}"
+        return question, [document], None
+
+    with span('document_matching'):
+        mentioned_documents = get_document_matcher().find_documents(question)
+    if not mentioned_documents:
+        return question, [], f"Please specify which document you're asking about. Available documents: {', '.join(catalog)}"
+    return question, mentioned_documents, None
+
+
+@query_ns.route('/batch')
+class QueryBatch(Resource):
+    @query_ns.expect(query_batch_request_model)
+    def post(self):
+        """
+        Answer a list of {question, document} items. Results stream back as
+        newline-delimited JSON, one line per item in completion order, followed
+        by a summary line. The whole batch is logged as one record.
+        """
+        payload = request.get_json(silent=True) or {}
+        items = payload.get('items')
+        if not isinstance(items, list) or not items:
+            return {'success': False, 'message': 'Provide a non-empty items list', 'data': None}, 400
+        if len(items) > _max_batch_items():
+            return {
+                'success': False,
+                'message': f'A batch can hold at most {_max_batch_items()} items',
+                'data': None
+            }, 400
+
+        catalog = get_document_catalog()
+        resolved = [_resolve_batch_item(item, catalog) for item in items]
+
+        def generate():
+            start_time = time.time()
+            item_logs = []
+            completed = False
+
+            def emit(index, status_code, result, retrieved_docs, processing_metadata, cache_status):
+                question, documents, _ = resolved[index]
+                item_logs.append({
+                    'index': index,
+                    'question': question,
+                    'documents': documents,
+                    'status_code': status_code,
+                    'answer': result.get('answer', ''),
+                    'citations': result.get('citations', []),
+                    'chunk_ids': [doc.metadata.get('chunk_id', '') for doc in retrieved_docs],
+                    'processing_time': processing_metadata.get('total_processing_time', 0),
+                    'llm_queue_wait_time': processing_metadata.get('llm_queue_wait_time', 0),
+                    'llm_coalesced_wait_time': processing_metadata.get('llm_coalesced_wait_time', 0),
+                    'llm_coalesced': processing_metadata.get('llm_coalesced', False),
+                    'answer_cache': cache_status
+                })
+                return json.dumps({
+                    'index': index,
+                    'status_code': status_code,
+                    'question': question,
+                    'answer': str(result.get('answer', '')),
+                    'pdf_name': documents[0] if documents else '',
+                    'citations': _format_citations(result),
+                    'answer_cache': cache_status
+                }, default=str) + '\n'
+
+            try:
+                # Invalid items and cached answers are answered before any generation starts
+                answer_cache = get_answer_cache()
+                pending = []
+                for index, (question, documents, error_message) in enumerate(resolved):
+                    if error_message:
+                        yield emit(index, 400, {'answer': error_message, 'citations': []}, [], {}, 'bypass')
+                        continue
+                    cached = answer_cache.lookup(question, documents)
+                    if cached:
+                        result, retrieved_docs, processing_metadata, _ = cached
+                        yield emit(index, 200, result, retrieved_docs, processing_metadata, 'hit')
+                    else:
+                        pending.append(index)
+
+                from rag.chain import run_query_batch
+                batch = [(resolved[index][0], resolved[index][1]) for index in pending]
+                for position, result, retrieved_docs, processing_metadata in run_query_batch(batch):
+                    index = pending[position]
+                    if 'error' in processing_metadata:
+                        status_code = 429 if 'retry_after' in processing_metadata else 500
+                    else:
+                        status_code = 200
+                        if retrieved_docs:
+                            answer_cache.store(resolved[index][0], resolved[index][1], result,
+                                               retrieved_docs, processing_metadata)
+                    yield emit(index, status_code, result, retrieved_docs, processing_metadata, 'miss')
+
+                completed = True
+                yield json.dumps({'summary': {
+                    'items': len(items),
+                    'succeeded': sum(1 for entry in item_logs if entry['status_code'] == 200),
+                    'failed': sum(1 for entry in item_logs if entry['status_code'] != 200),
+                    'cache_hits': sum(1 for entry in item_logs if entry['answer_cache'] == 'hit'),
+                    'total_processing_time': time.time() - start_time
+                }}) + '\n'
+
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                yield json.dumps({'error': f'Error processing the batch: {str(e)}'}) + '\n'
+
+            finally:
+                # One record for the whole batch, also when the client disconnected early
+                insert_log_record({
+                    'timestamp': datetime.datetime.utcnow().isoformat(),
+                    'endpoint': '/query/batch',
+                    'method': 'POST',
+                    'status_code': 200,
+                    'message': 'Query batch executed' if completed else 'Query batch interrupted',
+                    'additional_data': {
+                        'items_requested': len(items),
+                        'items_completed': len(item_logs),
+                        'succeeded': sum(1 for entry in item_logs if entry['status_code'] == 200),
+                        'cache_hits': sum(1 for entry in item_logs if entry['answer_cache'] == 'hit'),
+                        'processing_time': time.time() - start_time,
+                        'items': sorted(item_logs, key=lambda entry: entry['index'])
+                    }
+                })
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+
+@query_ns.route('/scheduler')
+class QueryScheduler(Resource):
+    def get(self):
+        return {
+            'success': True,
+            'message': 'LLM scheduler statistics',
+            'stats': get_llm_scheduler().stats()
+        }, 200
+
+
 @logs_ns.route('/')
 class Logs(Resource):
     @logs_ns.expect(logs_parser)
     def get(self):
         try:
             args = logs_parser.parse_args()
-            log_id = args.get('log_id')
-            logs = get_log_records()
-            if log_id:
-                logs = [log for log in logs if str(log.get('record_id') or log.get('log_id') or log.get('id')) == log_id]
+            try:
+                logs, next_cursor = get_log_records(
+                    log_id=args.get('log_id'),
+                    endpoint=args.get('endpoint'),
+                    status_code=args.get('status_code'),
+                    since=args.get('since'),
+                    until=args.get('until'),
+                    cursor=args.get('cursor'),
+                    limit=args.get('limit')
+                )
+            except ValueError as e:
+                return {
+                    'success': False,
+                    'message': str(e),
+                    'logs': []
+                }, 400
             insert_log_record({
                 'timestamp': datetime.datetime.utcnow().isoformat(),
                 'endpoint': '/logs/',
@@ -306,7 +672,8 @@ class Logs(Resource):
             return {
                 'success': True,
                 'message': 'Log records retrieved',
-                'logs': logs
+                'logs': logs,
+                'next_cursor': next_cursor
             }, 200
         except Exception as e:
             return {
@@ -316,6 +683,16 @@ class Logs(Resource):
             }, 500
 
 
+@logs_ns.route('/stats')
+class LogWriterStats(Resource):
+    def get(self):
+        return {
+            'success': True,
+            'message': 'Log writer statistics',
+            'stats': get_log_writer_stats()
+        }, 200
+
+
 def register_routes(api):
     api.add_namespace(pdf_ns)
     api.add_namespace(query_ns)
@@ -0,0 +1,347 @@
+"""
+Offline bulk indexer for a directory of PDFs:
+
+    python bulk_index.py /app/storage/pdfs --workers 4
+
+Files are parsed, split and embedded on a pool of worker processes with the
+same chunking and chunk metadata as uploads through the API. The main process
+writes the chunks to the vector store and the lexical index in large batches,
+and writes the pdfs records and catalog entries to MongoDB in bulk.
+
+Completed files are appended to a checkpoint file. Re-running the same command
+after a crash or Ctrl-C skips everything recorded there. At most the files of
+the last uncommitted batch are indexed again, and that is harmless because
+chunk IDs are deterministic and vector writes are upserts.
+
+Run it while the API is not ingesting, since both write to the same vector store.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_CHECKPOINT = '.bulk_index_checkpoint.jsonl'
+
+
+def _write_batch_size():
+    return int(os.getenv('BULK_INDEX_WRITE_BATCH_SIZE', '1000'))
+
+
+def _commit_every():
+    return int(os.getenv('BULK_INDEX_COMMIT_EVERY', '20'))
+
+
+def find_pdfs(directory: str, recursive: bool = True):
+    """
+    Return the PDF files under directory, sorted so every run visits them in the same order
+    """
+    if not recursive:
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith('.pdf') and os.path.isfile(os.path.join(directory, name))
+        )
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        found.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+    return sorted(found)
+
+
+class Checkpoint:
+    """
+    Append-only JSONL record of completed files. A file counts as done while
+    its size and modification time still match the recorded ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'rb+') as f:
+                data = f.read()
+                # A run killed mid-write leaves a partial last line; drop it before appending
+                complete = data[:data.rfind(b'\n') + 1]
+                if len(complete) != len(data):
+                    f.truncate(len(complete))
+            for line in complete.decode('utf-8').splitlines():
+                entry = json.loads(line)
+                self.entries[entry['path']] = entry
+
+    @staticmethod
+    def _stat(file_path: str):
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime
+
+    def is_done(self, file_path: str) -> bool:
+        entry = self.entries.get(os.path.abspath(file_path))
+        return entry is not None and (entry['size'], entry['mtime']) == self._stat(file_path)
+
+    def record(self, entries):
+        lines = []
+        for entry in entries:
+            size, mtime = self._stat(entry['path'])
+            entry = dict(entry, size=size, mtime=mtime, finished_at=datetime.utcnow().isoformat())
+            self.entries[entry['path']] = entry
+            lines.append(json.dumps(entry) + '\n')
+        with open(self.path, 'a') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _init_worker(torch_threads: int):
+    # Every worker embeds, so each one gets its share of the cores instead of all of them
+    if os.getenv('EMBEDDING_BACKEND', 'huggingface').lower() == 'onnx':
+        os.environ.setdefault('EMBEDDING_ONNX_THREADS', str(torch_threads))
+    else:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+def prepare_file(file_path: str, document_hash: str):
+    """
+    Worker task: parse, split and embed one PDF. Returns the rows to write.
+    """
+    from utils.pdf_processor import (
+        iter_pages, iter_document_chunks, iter_batches, get_page_count, _embedding_batch_size
+    )
+    from utils.embeddings import get_embeddings_model
+    from utils.document_structure import DocumentStructureBuilder
+
+    start = time.time()
+    total_pages = get_page_count(file_path)
+    document_name = os.path.basename(file_path)
+    # The page pool of utils.pdf_extraction is not used; files are already spread over processes
+    pages = iter_pages(file_path, total_pages, parallel=False)
+    structure = DocumentStructureBuilder(total_pages)
+
+    def structured_pages():
+        for page in pages:
+            structure.add_page(page)
+            yield page
+
+    chunks = list(iter_document_chunks(structured_pages(), document_name, document_hash, total_pages))
+
+    # Chunks repeated within the document are embedded once
+    model = get_embeddings_model()
+    vectors = {}
+    unique = list({chunk.metadata['content_hash']: chunk.page_content for chunk in chunks}.items())
+    for batch in iter_batches(unique, _embedding_batch_size()):
+        for (content_hash, _), embedding in zip(batch, model.embed_documents([text for _, text in batch])):
+            vectors[content_hash] = embedding
+
+    return {
+        'path': file_path,
+        'document_name': document_name,
+        'content_hash': document_hash,
+        'total_pages': total_pages,
+        'structure': structure.build(),
+        'ids': [chunk.metadata['chunk_id'] for chunk in chunks],
+        'texts': [chunk.page_content for chunk in chunks],
+        'embeddings': [vectors[chunk.metadata['content_hash']] for chunk in chunks],
+        'metadatas': [chunk.metadata for chunk in chunks],
+        'upload_time': chunks[0].metadata['upload_time'] if chunks else datetime.utcnow().isoformat(),
+        'seconds': time.time() - start
+    }
+
+
+class BulkWriter:
+    """
+    Collects prepared files and writes them in batches: vector rows every
+    write_batch_size chunks, and MongoDB records plus the checkpoint every
+    commit_every files. A file is checkpointed only after all its writes.
+    """
+
+    def __init__(self, vectorstore, lexical_index, checkpoint: Checkpoint, write_batch_size: int = None,
+                 commit_every: int = None):
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.checkpoint = checkpoint
+        self.write_batch_size = write_batch_size or _write_batch_size()
+        self.commit_every = commit_every or _commit_every()
+        self.rows = {'ids': [], 'texts': [], 'embeddings': [], 'metadatas': []}
+        self.files = []
+        self.duplicates = []
+
+    def add(self, result):
+        for key in self.rows:
+            self.rows[key].extend(result[key])
+        self.files.append({
+            key: result[key] for key in ('path', 'document_name', 'content_hash', 'ids', 'upload_time', 'structure')
+        })
+        if len(self.rows['ids']) >= self.write_batch_size:
+            self.flush_vectors()
+        if len(self.files) >= self.commit_every:
+            self.commit()
+
+    def add_duplicate(self, file_path: str, content_hash: str, chunks: int):
+        self.duplicates.append({'path': file_path, 'content_hash': content_hash, 'chunks': chunks, 'duplicate': True})
+        if len(self.duplicates) >= self.commit_every:
+            self.commit()
+
+    def flush_vectors(self):
+        from database.chroma_client import upsert_chunks
+
+        for start in range(0, len(self.rows['ids']), self.write_batch_size):
+            batch = {key: values[start:start + self.write_batch_size] for key, values in self.rows.items()}
+            upsert_chunks(self.vectorstore, **batch)
+            self.lexical_index.upsert(batch['ids'], batch['texts'], batch['metadatas'])
+        self.rows = {key: [] for key in self.rows}
+
+    def commit(self):
+        from database.chroma_client import delete_stale_chunks
+        from database.mongo_client import insert_pdf_records
+        from database.document_catalog import record_document_uploads
+
+        self.flush_vectors()
+        if self.files:
+            for entry in self.files:
+                delete_stale_chunks(self.vectorstore, entry['document_name'], entry['ids'])
+                self.lexical_index.delete_stale(entry['document_name'], entry['ids'])
+
+            record_ids = insert_pdf_records([
+                {
+                    'filename': entry['document_name'],
+                    'filepath': entry['path'],
+                    'chunks': len(entry['ids']),
+                    'content_hash': entry['content_hash'],
+                    'upload_time': entry['upload_time']
+                }
+                for entry in self.files
+            ])
+            record_document_uploads([
+                {
+                    'document_name': entry['document_name'],
+                    'chunks': len(entry['ids']),
+                    'upload_time': entry['upload_time'],
+                    'content_hash': entry['content_hash'],
+                    'structure': entry['structure']
+                }
+                for entry in self.files
+            ])
+            self.checkpoint.record(
+                {'path': entry['path'], 'content_hash': entry['content_hash'],
+                 'chunks': len(entry['ids']), 'record_id': record_id}
+                for entry, record_id in zip(self.files, record_ids)
+            )
+        if self.duplicates:
+            self.checkpoint.record(self.duplicates)
+        self.files = []
+        self.duplicates = []
+
+
+def run(directory: str, workers: int, checkpoint_path: str = None, recursive: bool = True,
+        chroma_dir: str = None):
+    """
+    Index every PDF under directory that the checkpoint does not list yet.
+    Returns a summary dict.
+    """
+    from utils.pdf_processor import hash_file
+    from database.chroma_client import get_vectorstore
+    from database.lexical_index import get_lexical_index
+    from database.mongo_client import ensure_indexes
+    from database.document_catalog import find_indexed_document
+
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(directory, DEFAULT_CHECKPOINT))
+    files = [os.path.abspath(path) for path in find_pdfs(directory, recursive)]
+    pending = [path for path in files if not checkpoint.is_done(path)]
+    print(f"Found {len(files)} PDFs, {len(files) - len(pending)} already in the checkpoint, {len(pending)} to index")
+
+    ensure_indexes()
+    writer = BulkWriter(get_vectorstore(chroma_dir), get_lexical_index(chroma_dir), checkpoint)
+    summary = {'files': len(files), 'indexed': 0, 'duplicates': 0, 'name_conflicts': [], 'failed': [], 'chunks': 0}
+    start = time.time()
+
+    def report(name, note):
+        elapsed = max(time.time() - start, 1e-9)
+        done = (summary['indexed'] + summary['duplicates'] + len(summary['name_conflicts'])
+                + len(summary['failed']))
+        print(f"[{done}/{len(pending)}] {name}: {note} | "
+              f"{summary['indexed'] / elapsed:.2f} files/s, {summary['chunks'] / elapsed:.1f} chunks/s")
+
+    # Documents are identified by file name, so only the first file of each name is indexed
+    names = {}
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(torch_threads,)
+    )
+    in_flight = {}
+    queue = iter(pending)
+    try:
+        while True:
+            # Keep a couple of files per worker queued, so finished results never pile up in memory
+            while len(in_flight) < workers * 2:
+                path = next(queue, None)
+                if path is None:
+                    break
+                name = os.path.basename(path)
+                if name in names:
+                    summary['name_conflicts'].append(path)
+                    print(f"WARNING: Skipping {path}, document name {name} is already used by {names[name]}")
+                    continue
+                names[name] = path
+
+                content_hash = hash_file(path)
+                indexed = find_indexed_document(name, content_hash)
+                if indexed:
+                    summary['duplicates'] += 1
+                    writer.add_duplicate(path, content_hash, indexed.get('chunks', 0))
+                    report(name, 'already indexed')
+                    continue
+                in_flight[pool.submit(prepare_file, path, content_hash)] = path
+
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    summary['failed'].append(path)
+                    print(f"WARNING: Failed to index {path}: {e}")
+                    continue
+                writer.add(result)
+                summary['indexed'] += 1
+                summary['chunks'] += len(result['ids'])
+                report(result['document_name'], f"{len(result['ids'])} chunks in {result['seconds']:.1f}s")
+
+        writer.commit()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    summary['seconds'] = time.time() - start
+    summary['files_per_second'] = summary['indexed'] / max(summary['seconds'], 1e-9)
+    summary['chunks_per_second'] = summary['chunks'] / max(summary['seconds'], 1e-9)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index a directory of PDFs offline')
+    parser.add_argument('directory', help='Directory to index')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BULK_INDEX_WORKERS', str(os.cpu_count() or 1))),
+                        help='Parse and embed processes')
+    parser.add_argument('--checkpoint', help=f"Checkpoint file (default <directory>/{DEFAULT_CHECKPOINT})")
+    parser.add_argument('--chroma-dir', default=None, help='Vector store directory (default CHROMA_STORAGE_DIR)')
+    parser.add_argument('--no-recursive', action='store_true', help='Only index PDFs directly in the directory')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        sys.exit(f"Not a directory: {args.directory}")
+
+    summary = run(args.directory, max(1, args.workers), args.checkpoint, not args.no_recursive, args.chroma_dir)
+    print(json.dumps(summary, indent=2))
+    if summary['failed']:
+        sys.exit(f"{len(summary['failed'])} files failed and will be retried on the next run")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,126 @@
+import os
+import threading
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from utils.embeddings import get_embeddings_model
+from database.numpy_index import NumpyVectorIndex
 
-def init_chroma():
-    embedding_model = get_embeddings_model()
+# Shared vectorstores, one per persist directory
+_vectorstores = {}
+_vectorstores_lock = threading.Lock()
+
+
+def reset_vectorstores():
+    """
+    Forget vectorstores inherited across a fork. Chroma caches its client system
+    (and SQLite connections) per path, so that cache is cleared as well.
+    """
+    _vectorstores.clear()
+    from chromadb.api.client import SharedSystemClient
+    if hasattr(SharedSystemClient, 'clear_system_cache'):
+        SharedSystemClient.clear_system_cache()
+
+
+def _vector_backend():
+    return os.getenv('VECTOR_BACKEND', 'chroma').lower()
+
+
+def _create_vectorstore(chroma_dir: str):
+    backend = _vector_backend()
+    if backend == 'numpy':
+        return NumpyVectorIndex(os.path.join(chroma_dir, 'numpy_index'), get_embeddings_model())
+    if backend != 'chroma':
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
     return Chroma(
         collection_name="pdf_chunks",
-        embedding_function=embedding_model,
-        persist_directory="/app/storage/chroma"
+        embedding_function=get_embeddings_model(),
+        persist_directory=chroma_dir
+    )
+
+
+def get_vectorstore(chroma_dir: str = None):
+    """
+    Return the shared pdf_chunks vectorstore for the given persist directory.
+    VECTOR_BACKEND selects Chroma (default) or the in-process NumPy index.
+    """
+    if chroma_dir is None:
+        chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
+
+    vectorstore = _vectorstores.get(chroma_dir)
+    if vectorstore is not None:
+        return vectorstore
+
+    with _vectorstores_lock:
+        vectorstore = _vectorstores.get(chroma_dir)
+        if vectorstore is None:
+            vectorstore = _create_vectorstore(chroma_dir)
+            _vectorstores[chroma_dir] = vectorstore
+
+    return vectorstore
+
+
+def get_embeddings_by_content_hash(vectorstore, content_hashes):
+    """
+    Return a dict of content_hash -> stored embedding for chunks already in the collection
+    """
+    if not content_hashes:
+        return {}
+    existing = vectorstore.get(
+        where={"content_hash": {"$in": list(set(content_hashes))}},
+        include=["embeddings", "metadatas"]
+    )
+    embeddings = {}
+    for metadata, embedding in zip(existing.get("metadatas") or [], existing.get("embeddings") or []):
+        if metadata and embedding is not None:
+            embeddings[metadata["content_hash"]] = list(embedding)
+    return embeddings
+
+
+def upsert_chunks(vectorstore, ids, texts, embeddings, metadatas):
+    """
+    Insert or overwrite chunks with precomputed embeddings
+    """
+    # The NumPy index upserts directly, Chroma through its underlying collection
+    collection = vectorstore if isinstance(vectorstore, NumpyVectorIndex) else vectorstore._collection
+    collection.upsert(
+        ids=ids,
+        embeddings=embeddings,
+        metadatas=metadatas,
+        documents=texts
     )
 
+
+def similarity_search_by_vectors(vectorstore, embeddings, k: int, filter=None):
+    """
+    Search many query vectors in one call. Returns a list of (Document, distance)
+    lists, one per query, closest first.
+    """
+    if isinstance(vectorstore, NumpyVectorIndex):
+        return vectorstore.similarity_search_by_vectors(embeddings, k=k, filter=filter)
+
+    results = vectorstore._collection.query(
+        query_embeddings=[[float(x) for x in embedding] for embedding in embeddings],
+        n_results=k,
+        where=filter,
+        include=["documents", "metadatas", "distances"]
+    )
+    return [
+        [
+            (Document(page_content=text, metadata=metadata or {}), distance)
+            for text, metadata, distance in zip(texts, metadatas, distances)
+        ]
+        for texts, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"])
+    ]
+
+
+def delete_stale_chunks(vectorstore, document_name, keep_ids):
+    """
+    Remove chunks of a document that are not part of its latest revision.
+    Returns the number of deleted chunks.
+    """
+    existing_ids = vectorstore.get(where={"document_name": document_name}, include=[]).get("ids", [])
+    keep_ids = set(keep_ids)
+    stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in keep_ids]
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+    return len(stale_ids)
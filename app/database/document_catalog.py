@@ -0,0 +1,208 @@
+import os
+import time
+import threading
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+from database.mongo_client import init_mongo
+from utils.document_matcher import DocumentNameMatcher
+from utils.metrics import span
+
+CATALOG_META_ID = 'documents'
+
+# In-process copy of the catalog, refreshed only when the version counter moves
+_cache = {
+    'version': None,
+    'documents': {},
+    'total_chunks': 0,
+    'checked_at': 0.0
+}
+_cache_lock = threading.Lock()
+
+# Name matcher over every catalog document, extended as new documents appear
+_matcher = DocumentNameMatcher()
+
+
+def _refresh_interval():
+    return float(os.getenv('CATALOG_REFRESH_INTERVAL', '2'))
+
+
+def _bump_catalog_version(db):
+    meta = db.catalog_meta.find_one_and_update(
+        {'_id': CATALOG_META_ID},
+        {'$inc': {'version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return meta['version']
+
+
+def _bootstrap_from_vectorstore(db):
+    """
+    Build the catalog once from the chunks already stored in ChromaDB.
+    Only runs for deployments that indexed documents before the catalog existed.
+    """
+    from database.chroma_client import get_vectorstore
+
+    chroma_data = get_vectorstore().get(include=["metadatas"])
+    counts = {}
+    upload_times = {}
+    for metadata in chroma_data.get("metadatas", []):
+        if metadata and "document_name" in metadata:
+            name = metadata["document_name"]
+            counts[name] = counts.get(name, 0) + 1
+            upload_times[name] = metadata.get('upload_time', upload_times.get(name, ''))
+
+    for name, chunk_count in counts.items():
+        db.documents.update_one(
+            {'document_name': name},
+            {'$setOnInsert': {
+                'document_name': name,
+                'chunks': chunk_count,
+                'upload_time': upload_times[name],
+                'version': 1
+            }},
+            upsert=True
+        )
+
+    # Create the meta document so the bootstrap never runs again
+    db.catalog_meta.update_one(
+        {'_id': CATALOG_META_ID},
+        {'$setOnInsert': {'version': 0}},
+        upsert=True
+    )
+    return _bump_catalog_version(db)
+
+
+def find_indexed_document(document_name: str, content_hash: str):
+    """
+    Return the catalog entry of a document already indexed from a file with this content hash
+    """
+    db = init_mongo()
+    return db.documents.find_one(
+        {'document_name': document_name, 'content_hash': content_hash},
+        {'_id': False}
+    )
+
+
+def record_document_upload(document_name: str, chunk_count: int, upload_time: str = None,
+                           content_hash: str = None, structure: dict = None):
+    """
+    Insert or update a document entry in the catalog and bump the catalog version.
+    structure is the document's structural record (title, first line, abstract,
+    headings, page count) used to answer structural questions without the LLM.
+    Returns the stored catalog entry.
+    """
+    db = init_mongo()
+    entry = db.documents.find_one_and_update(
+        {'document_name': document_name},
+        {
+            '$set': {
+                'chunks': chunk_count,
+                'upload_time': upload_time or datetime.utcnow().isoformat(),
+                'content_hash': content_hash,
+                'structure': structure or None
+            },
+            '$inc': {'version': 1}
+        },
+        upsert=True,
+        projection={'_id': False},
+        return_document=ReturnDocument.AFTER
+    )
+    _bump_catalog_version(db)
+
+    # Force the next read in this process to pick up the change
+    with _cache_lock:
+        _cache['checked_at'] = 0.0
+    _matcher.add_document(document_name)
+
+    return entry
+
+
+def record_document_uploads(entries):
+    """
+    Catalog a batch of uploads at once. entries are dicts with document_name,
+    chunks, upload_time, content_hash and structure. The catalog version is
+    bumped once for the whole batch.
+    """
+    if not entries:
+        return
+    db = init_mongo()
+    db.documents.bulk_write([
+        UpdateOne(
+            {'document_name': entry['document_name']},
+            {
+                '$set': {
+                    'chunks': entry['chunks'],
+                    'upload_time': entry.get('upload_time') or datetime.utcnow().isoformat(),
+                    'content_hash': entry.get('content_hash'),
+                    'structure': entry.get('structure')
+                },
+                '$inc': {'version': 1}
+            },
+            upsert=True
+        )
+        for entry in entries
+    ], ordered=False)
+    _bump_catalog_version(db)
+
+    with _cache_lock:
+        _cache['checked_at'] = 0.0
+    for entry in entries:
+        _matcher.add_document(entry['document_name'])
+
+
+def get_catalog_version():
+    """
+    Return the catalog version the in-process copy was loaded at
+    """
+    get_document_catalog()
+    return _cache['version']
+
+
+def get_total_chunk_count():
+    """
+    Return the number of indexed chunks across all documents in the catalog
+    """
+    get_document_catalog()
+    return _cache['total_chunks']
+
+
+def get_document_catalog():
+    """
+    Return the document catalog as a dict of document_name -> entry.
+    The in-process copy is reused until the catalog version stored in MongoDB changes.
+    """
+    now = time.time()
+    if _cache['version'] is not None and now - _cache['checked_at'] < _refresh_interval():
+        return _cache['documents']
+
+    with span('catalog'), _cache_lock:
+        if _cache['version'] is not None and now - _cache['checked_at'] < _refresh_interval():
+            return _cache['documents']
+
+        db = init_mongo()
+        meta = db.catalog_meta.find_one({'_id': CATALOG_META_ID})
+        version = meta['version'] if meta else _bootstrap_from_vectorstore(db)
+
+        if version != _cache['version']:
+            documents = {}
+            for entry in db.documents.find({}, {'_id': False}):
+                documents[entry['document_name']] = entry
+            _cache['documents'] = documents
+            _cache['total_chunks'] = sum(entry.get('chunks', 0) for entry in documents.values())
+            _cache['version'] = version
+
+        _cache['checked_at'] = now
+        return _cache['documents']
+
+
+def get_document_matcher():
+    """
+    Return the shared document name matcher, extended with any documents
+    added to the catalog since it was last used
+    """
+    documents = get_document_catalog()
+    if len(_matcher) != len(documents):
+        for document_name in documents:
+            _matcher.add_document(document_name)
+    return _matcher
@@ -0,0 +1,282 @@
+import os
+import re
+import json
+import math
+import heapq
+import sqlite3
+import threading
+from langchain_core.documents import Document
+
+INDEX_FILE = 'lexical_index.sqlite3'
+# Bumped when the tables change; an index with another version is rebuilt from the vector store
+SCHEMA_VERSION = 2
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words too common to say anything about a chunk; everything else, numbers included, is indexed
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have how in into is it its
+itself may of on or our such than that the their them then there these they this those
+to was we were what when where which while who why will with would you your
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text: str):
+    """
+    Lowercased word tokens. Hyphenated and dotted terms such as resnet-50 or
+    eq.3 are kept whole as well as split into their parts, so both the exact
+    term and its pieces match.
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        parts = re.split(r"[-./]", term)
+        if len(parts) > 1:
+            tokens.append(term)
+        tokens.extend(part for part in parts if part and part not in STOPWORDS)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunks, stored in SQLite next to the vector store.
+
+    postings holds one row per (term, chunk) with the term frequency and the
+    chunk's document, so a search scoped to one document reads only that
+    document's postings; terms holds each term's document frequency; chunks
+    holds each chunk's length, text and metadata so hits can be returned
+    without a vector store round trip. Corpus totals are kept in meta. All of
+    them are updated in the same transaction as the postings. Each thread uses
+    its own connection; WAL mode lets readers run while ingestion writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        # Several workers may open the same file at once; one of them creates or migrates it
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            version = self._meta(conn).get('schema_version')
+            if version != SCHEMA_VERSION:
+                if version is not None or conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks'").fetchone():
+                    # Rebuilt from the vector store by get_lexical_index, like a new index
+                    print(f"DEBUG: Rebuilding lexical index {path} for schema version {SCHEMA_VERSION}")
+                for statement in (
+                    'DROP TABLE IF EXISTS postings',
+                    'DROP TABLE IF EXISTS terms',
+                    'DROP TABLE IF EXISTS chunks',
+                    'DELETE FROM meta'
+                ):
+                    conn.execute(statement)
+            for statement in (
+                """CREATE TABLE IF NOT EXISTS chunks (
+                    chunk_id TEXT PRIMARY KEY,
+                    document_name TEXT,
+                    length INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )""",
+                'CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_name)',
+                """CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    document_name TEXT,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                ) WITHOUT ROWID""",
+                'CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id)',
+                'CREATE INDEX IF NOT EXISTS postings_document ON postings (term, document_name)',
+                'CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID',
+                "INSERT OR IGNORE INTO meta VALUES ('chunks', 0), ('total_length', 0), ('bootstrapped', 0)",
+            ):
+                conn.execute(statement)
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, conn):
+        return dict(conn.execute('SELECT key, value FROM meta'))
+
+    def _remove(self, conn, chunk_ids):
+        removed, removed_length = 0, 0
+        for chunk_id in chunk_ids:
+            row = conn.execute('SELECT length FROM chunks WHERE chunk_id = ?', (chunk_id,)).fetchone()
+            if row is None:
+                continue
+            terms = [(term,) for (term,) in conn.execute('SELECT term FROM postings WHERE chunk_id = ?', (chunk_id,))]
+            conn.executemany('UPDATE terms SET df = df - 1 WHERE term = ?', terms)
+            conn.execute('DELETE FROM postings WHERE chunk_id = ?', (chunk_id,))
+            conn.execute('DELETE FROM chunks WHERE chunk_id = ?', (chunk_id,))
+            removed += 1
+            removed_length += row[0]
+        if removed:
+            conn.execute('DELETE FROM terms WHERE df <= 0')
+        return removed, removed_length
+
+    def upsert(self, ids, texts, metadatas):
+        """
+        Index chunks, replacing any earlier version of the same chunk IDs
+        """
+        # A repeated ID keeps its last version, as in the vector store
+        chunks = {chunk_id: (text, metadata) for chunk_id, text, metadata in zip(ids, texts, metadatas)}
+        conn = self._connection()
+        with conn:
+            removed, removed_length = self._remove(conn, chunks)
+            added_length = 0
+            for chunk_id, (text, metadata) in chunks.items():
+                terms = tokenize(text)
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                document_name = metadata.get('document_name')
+                conn.execute(
+                    'INSERT INTO chunks VALUES (?, ?, ?, ?, ?)',
+                    (chunk_id, document_name, len(terms), text, json.dumps(metadata))
+                )
+                conn.executemany(
+                    'INSERT INTO postings VALUES (?, ?, ?, ?)',
+                    [(term, chunk_id, document_name, tf) for term, tf in counts.items()]
+                )
+                conn.executemany(
+                    'INSERT INTO terms VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1',
+                    [(term,) for term in counts]
+                )
+                added_length += len(terms)
+            conn.execute("UPDATE meta SET value = value + ? WHERE key = 'chunks'", (len(chunks) - removed,))
+            conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_length'",
+                         (added_length - removed_length,))
+
+    def delete(self, ids):
+        conn = self._connection()
+        with conn:
+            removed, removed_length = self._remove(conn, ids)
+            conn.execute("UPDATE meta SET value = value - ? WHERE key = 'chunks'", (removed,))
+            conn.execute("UPDATE meta SET value = value - ? WHERE key = 'total_length'", (removed_length,))
+        return removed
+
+    def delete_stale(self, document_name: str, keep_ids):
+        """
+        Remove chunks of a document that are not part of its latest revision
+        """
+        keep_ids = set(keep_ids)
+        existing = self._connection().execute(
+            'SELECT chunk_id FROM chunks WHERE document_name = ?', (document_name,)
+        ).fetchall()
+        return self.delete([chunk_id for (chunk_id,) in existing if chunk_id not in keep_ids])
+
+    def count(self):
+        return self._meta(self._connection())['chunks']
+
+    def search(self, query: str, k: int, document_name: str = None):
+        """
+        Return the k best (Document, bm25_score) pairs for the query, highest
+        score first, optionally limited to one document
+        """
+        conn = self._connection()
+        meta = self._meta(conn)
+        total = meta['chunks']
+        if total <= 0:
+            return []
+        average_length = max(meta['total_length'] / total, 1.0)
+
+        scores = {}
+        for term in set(tokenize(query)):
+            row = conn.execute('SELECT df FROM terms WHERE term = ?', (term,)).fetchone()
+            if row is None:
+                continue
+            df = row[0]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            sql = ('SELECT p.chunk_id, p.tf, c.length FROM postings p '
+                   'JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ?')
+            params = (term,)
+            if document_name is not None:
+                sql += ' AND p.document_name = ?'
+                params = (term, document_name)
+            for chunk_id, tf, length in conn.execute(sql, params):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        results = []
+        for chunk_id, score in best:
+            text, metadata = conn.execute(
+                'SELECT text, metadata FROM chunks WHERE chunk_id = ?', (chunk_id,)
+            ).fetchone()
+            results.append((Document(page_content=text, metadata=json.loads(metadata)), score))
+        return results
+
+    def is_bootstrapped(self):
+        return bool(self._meta(self._connection())['bootstrapped'])
+
+    def mark_bootstrapped(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("UPDATE meta SET value = 1 WHERE key = 'bootstrapped'")
+
+
+# Shared lexical indexes, one per vector store directory
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def reset_lexical_indexes():
+    """
+    Forget indexes inherited across a fork; SQLite connections must not be shared
+    """
+    _indexes.clear()
+
+
+def _bootstrap_from_vectorstore(index, chroma_dir):
+    """
+    Index the chunks already stored in the vector store. Only runs once, for
+    deployments that ingested documents before the lexical index existed.
+    """
+    from database.chroma_client import get_vectorstore
+
+    if index.count() == 0:
+        stored = get_vectorstore(chroma_dir).get(include=["metadatas", "documents"])
+        if stored.get('ids'):
+            print(f"DEBUG: Building lexical index from {len(stored['ids'])} stored chunks")
+            index.upsert(stored['ids'], stored['documents'], [metadata or {} for metadata in stored['metadatas']])
+    index.mark_bootstrapped()
+
+
+def get_lexical_index(chroma_dir: str = None):
+    """
+    Return the shared lexical index stored in the given vector store directory
+    """
+    if chroma_dir is None:
+        chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
+
+    index = _indexes.get(chroma_dir)
+    if index is not None:
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(chroma_dir)
+        if index is None:
+            index = LexicalIndex(os.path.join(chroma_dir, INDEX_FILE))
+            if not index.is_bootstrapped():
+                _bootstrap_from_vectorstore(index, chroma_dir)
+            _indexes[chroma_dir] = index
+
+    return index
@@ -0,0 +1,161 @@
+import os
+import time
+import atexit
+import threading
+from collections import deque
+
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_BLOCK = 'block'
+
+
+class LogWriter:
+    """
+    Background sink for log records.
+
+    Records are buffered in a bounded in-memory queue and written by a single
+    writer thread with one bulk insert per batch, flushed whenever batch_size
+    records are waiting or flush_interval seconds have passed. When the queue is
+    full the overflow policy either drops the oldest record or blocks the caller
+    for up to block_timeout seconds.
+    """
+
+    def __init__(self, write_batch, max_queue_size: int = None, batch_size: int = None,
+                 flush_interval: float = None, overflow_policy: str = None, block_timeout: float = None):
+        self._write_batch = write_batch
+        self.max_queue_size = max_queue_size or int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+        self.batch_size = batch_size or int(os.getenv('LOG_BATCH_SIZE', '100'))
+        self.flush_interval = flush_interval or float(os.getenv('LOG_FLUSH_INTERVAL', '1.0'))
+        self.overflow_policy = overflow_policy or os.getenv('LOG_OVERFLOW_POLICY', OVERFLOW_DROP_OLDEST)
+        self.block_timeout = block_timeout or float(os.getenv('LOG_BLOCK_TIMEOUT', '5.0'))
+
+        if self.overflow_policy not in (OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK):
+            raise ValueError(f"Unknown log overflow policy: {self.overflow_policy}")
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._stats = {'enqueued': 0, 'flushed': 0, 'dropped': 0, 'failed': 0}
+
+    def stats(self):
+        """
+        Return a snapshot of the writer counters and current queue depth
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+        return stats
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def write(self, record):
+        """
+        Queue a record for writing. Never raises on a full queue; the record
+        is dropped according to the overflow policy instead.
+        """
+        with self._cond:
+            if self._stopped:
+                write_now = True
+            else:
+                write_now = False
+                self._ensure_started()
+
+                if len(self._queue) >= self.max_queue_size and self.overflow_policy == OVERFLOW_BLOCK:
+                    deadline = time.time() + self.block_timeout
+                    while len(self._queue) >= self.max_queue_size and not self._stopped:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+                if len(self._queue) >= self.max_queue_size:
+                    if self.overflow_policy == OVERFLOW_BLOCK:
+                        # Waited long enough, give up on this record
+                        self._stats['dropped'] += 1
+                        return
+                    self._queue.popleft()
+                    self._stats['dropped'] += 1
+
+                self._queue.append(record)
+                self._stats['enqueued'] += 1
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+
+        # After shutdown there is no writer thread, write synchronously
+        if write_now:
+            self._flush([record])
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.time() + self.flush_interval
+                while not self._stopped and len(self._queue) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                finished = self._stopped and not self._queue
+                # Wake callers blocked on a full queue
+                self._cond.notify_all()
+
+            if batch:
+                self._flush(batch)
+            if finished:
+                return
+
+    def _flush(self, batch):
+        try:
+            self._write_batch(batch)
+            with self._cond:
+                self._stats['flushed'] += len(batch)
+        except Exception as e:
+            with self._cond:
+                self._stats['failed'] += len(batch)
+            print(f"WARNING: Failed to write {len(batch)} log records: {e}")
+
+    def close(self, timeout: float = 10.0):
+        """
+        Stop accepting queued writes and flush everything still buffered
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread = self._thread
+
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        elif self._queue:
+            # The writer never started or already exited; flush on the caller's thread
+            batch = list(self._queue)
+            self._queue.clear()
+            self._flush(batch)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer(write_batch=None):
+    """
+    Return the process-wide log writer, creating it with write_batch on first use
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = LogWriter(write_batch)
+                atexit.register(_writer.close)
+    return _writer
+
+
+def reset_log_writer():
+    """
+    Drop the writer inherited across a fork; its thread does not exist in the child
+    """
+    global _writer
+    _writer = None
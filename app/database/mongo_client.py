@@ -1,21 +1,80 @@
 import os
-from pymongo import MongoClient
+import base64
+import threading
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
 import json
+from database.log_writer import get_log_writer
+from utils.metrics import span, get_current_trace
+
+LOG_COLLECTIONS = ('logs', 'query_logs')
+MAX_LOG_PAGE_SIZE = 500
+
+# One pooled client per process, shared by every caller
+_client = None
+_client_lock = threading.Lock()
+
+def get_mongo_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+                _client = MongoClient(
+                    mongo_uri,
+                    maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+                )
+    return _client
+
+def reset_mongo_client():
+    """
+    Forget the pooled client. MongoClient is not fork-safe, so a forked worker
+    must open its own instead of using the one inherited from the master.
+    """
+    global _client
+    _client = None
 
 def init_mongo():
-    mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
     db_name = os.getenv("MONGODB_DATABASE", "pdf_upload_db")
-    client = MongoClient(mongo_uri)
-    return client[db_name]
+    return get_mongo_client()[db_name]
+
+def ensure_indexes():
+    """
+    Create the indexes used by the log queries, catalog and job lookups
+    """
+    db = init_mongo()
+    for collection_name in LOG_COLLECTIONS:
+        collection = db[collection_name]
+        collection.create_index([('timestamp', DESCENDING), ('_id', DESCENDING)])
+        collection.create_index([('endpoint', ASCENDING), ('timestamp', DESCENDING)])
+        collection.create_index([('status_code', ASCENDING), ('timestamp', DESCENDING)])
+        collection.create_index([('record_id', ASCENDING)])
+        # Every clause of the log_id $or needs an index, or the lookup becomes a collection scan
+        collection.create_index([('log_id', ASCENDING)], sparse=True)
+        collection.create_index([('id', ASCENDING)], sparse=True)
+        collection.create_index([('additional_data.record_id', ASCENDING)])
+    db.documents.create_index([('document_name', ASCENDING)], unique=True)
+    db.ingestion_jobs.create_index([('job_id', ASCENDING)], unique=True)
+    db.ingestion_jobs.create_index([('state', ASCENDING), ('lease_expires_at', ASCENDING)])
+    db.ingestion_jobs.create_index([('owner_id', ASCENDING), ('state', ASCENDING)])
 
 def insert_pdf_record(data):
     db = init_mongo()
     return str(db.pdfs.insert_one(data).inserted_id)
 
-def insert_log_record(data):
+def insert_pdf_records(records):
+    db = init_mongo()
+    return [str(record_id) for record_id in db.pdfs.insert_many(records).inserted_ids]
+
+def write_log_records(records):
     db = init_mongo()
+    with span('mongo_log_write'):
+        db.logs.insert_many(records, ordered=False)
 
+def insert_log_record(data):
     # Ensure timestamp is properly formatted
     if 'timestamp' in data and isinstance(data['timestamp'], datetime):
         data['timestamp'] = data['timestamp'].isoformat()
@@ -29,27 +88,175 @@ def insert_log_record(data):
         else:
             clean_data[key] = value
 
-    # Insert into logs collection (not query_logs)
-    db.logs.insert_one(clean_data)
+    # Attach the request trace so a log record can be matched to its stage timings
+    trace = get_current_trace()
+    if trace is not None:
+        clean_data.setdefault('trace_id', trace['trace_id'])
+        clean_data.setdefault('stage_timings', dict(trace['stages']))
+
+    # Queue for the background writer, which inserts into the logs collection (not query_logs)
+    get_log_writer(write_log_records).write(clean_data)
 
-def get_log_records():
+def get_log_writer_stats():
+    return get_log_writer(write_log_records).stats()
+
+def encode_log_cursor(log):
+    raw = f"{log.get('timestamp', '')}|{log['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_log_cursor(cursor):
+    try:
+        timestamp, object_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return timestamp, ObjectId(object_id)
+    except (ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def build_log_filter(log_id=None, endpoint=None, status_code=None, since=None, until=None, cursor=None):
+    """
+    Build the $match filter applied to both log collections
+    """
+    conditions = []
+    if log_id:
+        id_conditions = [
+            {'record_id': log_id},
+            {'log_id': log_id},
+            {'id': log_id},
+            {'additional_data.record_id': log_id}
+        ]
+        if ObjectId.is_valid(log_id):
+            id_conditions.append({'_id': ObjectId(log_id)})
+        conditions.append({'$or': id_conditions})
+    if endpoint:
+        conditions.append({'endpoint': endpoint})
+    if status_code is not None:
+        conditions.append({'status_code': status_code})
+    if since or until:
+        time_range = {}
+        if since:
+            time_range['$gte'] = since
+        if until:
+            time_range['$lt'] = until
+        conditions.append({'timestamp': time_range})
+    if cursor:
+        # Everything strictly after the last row of the previous page in (timestamp, _id) order
+        timestamp, object_id = decode_log_cursor(cursor)
+        conditions.append({'$or': [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': object_id}}
+        ]})
+
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+def get_log_records(log_id=None, endpoint=None, status_code=None, since=None, until=None,
+                    cursor=None, limit=100):
+    """
+    Return (logs, next_cursor) from the logs and query_logs collections, newest first.
+    Filtering, merging and pagination all run in MongoDB.
+    """
     db = init_mongo()
-    
-    # Get logs from both collections
-    logs_from_logs = list(db.logs.find({}, {'_id': False}).sort('timestamp', -1).limit(50))
-    logs_from_query_logs = list(db.query_logs.find({}, {'_id': False}).sort('timestamp', -1).limit(50))
-    
-    # Combine and sort all logs
-    all_logs = logs_from_logs + logs_from_query_logs
-    
-    # Sort by timestamp (newest first)
-    all_logs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-    
-    # Limit to 100 most recent logs
-    all_logs = all_logs[:100]
-    
+    limit = max(1, min(int(limit or 100), MAX_LOG_PAGE_SIZE))
+    match = build_log_filter(log_id, endpoint, status_code, since, until, cursor)
+
+    # Each collection returns at most one page plus one row, read in order from the
+    # (timestamp, _id) index; only those rows are merged. The extra row detects another page.
+    page = [
+        {'$match': match},
+        {'$sort': {'timestamp': DESCENDING, '_id': DESCENDING}},
+        {'$limit': limit + 1}
+    ]
+    pipeline = page + [
+        {'$unionWith': {'coll': 'query_logs', 'pipeline': list(page)}},
+        {'$sort': {'timestamp': DESCENDING, '_id': DESCENDING}},
+        {'$limit': limit + 1}
+    ]
+    all_logs = list(db.logs.aggregate(pipeline))
+
+    next_cursor = None
+    if len(all_logs) > limit:
+        all_logs = all_logs[:limit]
+        next_cursor = encode_log_cursor(all_logs[-1])
+
     for log in all_logs:
+        log_object_id = log.pop('_id')
+        log.setdefault('log_id', str(log_object_id))
         if 'timestamp' in log and isinstance(log['timestamp'], datetime):
             log['timestamp'] = log['timestamp'].isoformat()
 
-    return all_logs
+    return all_logs, next_cursor
+
+def insert_job_record(data):
+    db = init_mongo()
+    db.ingestion_jobs.insert_one(dict(data))
+    return data['job_id']
+
+def update_job_record(job_id, updates):
+    db = init_mongo()
+    db.ingestion_jobs.update_one({'job_id': job_id}, {'$set': updates})
+
+def get_job_record(job_id):
+    db = init_mongo()
+    return db.ingestion_jobs.find_one({'job_id': job_id}, {'_id': False})
+
+def claim_job_record(job_id, owner_id, lease_expires_at, now):
+    """
+    Atomically take over an unfinished job whose owner stopped renewing its lease
+    (a worker that died or a previous server run). Returns the job record, or None
+    when the lease is still held or another worker claimed the job first.
+    """
+    db = init_mongo()
+    return db.ingestion_jobs.find_one_and_update(
+        {
+            'job_id': job_id,
+            'state': {'$in': ['queued', 'running']},
+            '$or': [{'lease_expires_at': {'$lt': now}}, {'lease_expires_at': {'$exists': False}}]
+        },
+        {'$set': {'owner_id': owner_id, 'lease_expires_at': lease_expires_at}},
+        projection={'_id': False}
+    )
+
+def renew_job_leases(owner_id, lease_expires_at):
+    """
+    Extend the lease of every unfinished job held by this owner
+    """
+    db = init_mongo()
+    db.ingestion_jobs.update_many(
+        {'owner_id': owner_id, 'state': {'$in': ['queued', 'running']}},
+        {'$set': {'lease_expires_at': lease_expires_at}}
+    )
+
+def acquire_document_lock(document_name, owner_id, expires_at, now):
+    """
+    Take the lease on a document name, so only one ingestion job at a time
+    replaces its chunks. Returns False while another owner holds an unexpired lease.
+    """
+    db = init_mongo()
+    try:
+        db.document_locks.update_one(
+            {'_id': document_name, '$or': [{'expires_at': {'$lt': now}}, {'owner_id': owner_id}]},
+            {'$set': {'owner_id': owner_id, 'expires_at': expires_at}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by someone else, so the upsert tried to insert a second one
+        return False
+    return True
+
+def renew_document_lock(document_name, owner_id, expires_at):
+    db = init_mongo()
+    db.document_locks.update_one({'_id': document_name, 'owner_id': owner_id}, {'$set': {'expires_at': expires_at}})
+
+def release_document_lock(document_name, owner_id):
+    db = init_mongo()
+    db.document_locks.delete_one({'_id': document_name, 'owner_id': owner_id})
+
+def get_unfinished_job_records(lease_expired_before=None):
+    """
+    Jobs still queued or running; with lease_expired_before, only those whose owner's lease ran out
+    """
+    db = init_mongo()
+    query = {'state': {'$in': ['queued', 'running']}}
+    if lease_expired_before is not None:
+        query['$or'] = [{'lease_expires_at': {'$lt': lease_expired_before}}, {'lease_expires_at': {'$exists': False}}]
+    return list(db.ingestion_jobs.find(query, {'_id': False}))
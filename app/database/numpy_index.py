@@ -0,0 +1,281 @@
+import os
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.documents import Document
+
+VECTORS_FILE = 'vectors.f32'
+RECORDS_FILE = 'records.jsonl'
+LOCK_FILE = 'index.lock'
+
+# Metadata fields with a value -> rows index, so where clauses on them skip the full scan
+INDEXED_FIELDS = ('document_name', 'content_hash')
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _matches(metadata, condition):
+    for key, expected in condition.items():
+        value = metadata.get(key)
+        if isinstance(expected, dict):
+            if '$in' in expected and value not in expected['$in']:
+                return False
+            if '$eq' in expected and value != expected['$eq']:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class NumpyVectorIndex:
+    """
+    In-process vector index over normalized float32 embeddings.
+
+    Vectors live in an append-only file that is memory-mapped for search, next
+    to a JSON lines log holding one record per row (id, text, metadata) and
+    delete markers. Upserting an existing id appends a new row and retires the
+    old one. Search is one matrix-vector product over the live rows followed
+    by argpartition; rows of a document, or with a content hash, are found
+    through a per-value row index instead of a full scan. Distances are squared L2 between unit
+    vectors, lower is closer, like Chroma's default.
+
+    Writes from several processes are serialized with a file lock, and every
+    reader catches up with rows appended by other processes before searching.
+
+    Implements the subset of the langchain Chroma interface the app uses.
+    """
+
+    def __init__(self, directory: str, embedding_function):
+        self.directory = directory
+        self.embeddings = embedding_function
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, VECTORS_FILE)
+        self._records_path = os.path.join(directory, RECORDS_FILE)
+        self._lock_path = os.path.join(directory, LOCK_FILE)
+
+        self._lock = threading.RLock()
+        self._dim = None
+        self._rows = 0
+        self._vectors = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._id_to_row = {}
+        # field -> value -> rows, retired rows included; for the fields in INDEXED_FIELDS
+        self._field_rows = {field: {} for field in INDEXED_FIELDS}
+        self._records_offset = 0
+
+        with self._lock:
+            self._catch_up()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """
+        Replay records appended since the last read, by this or another process
+        """
+        if not os.path.exists(self._records_path):
+            return
+        if os.path.getsize(self._records_path) == self._records_offset:
+            return
+
+        added = 0
+        retired = []
+        with open(self._records_path, 'r', encoding='utf-8') as f:
+            f.seek(self._records_offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    # A writer is still appending this record
+                    break
+                self._records_offset += len(line.encode('utf-8'))
+                record = json.loads(line)
+                if record['op'] == 'add':
+                    self._dim = self._dim or record['dim']
+                    self._retire(record['id'], retired)
+                    row = len(self._ids)
+                    self._ids.append(record['id'])
+                    self._texts.append(record['text'])
+                    self._metadatas.append(record['metadata'])
+                    self._id_to_row[record['id']] = row
+                    for field, rows_by_value in self._field_rows.items():
+                        value = record['metadata'].get(field)
+                        if value is not None:
+                            rows_by_value.setdefault(value, []).append(row)
+                    added += 1
+                else:
+                    for chunk_id in record['ids']:
+                        self._retire(chunk_id, retired)
+
+        self._rows = len(self._ids)
+        # Readers keep the arrays they started with, so build new ones rather than mutate
+        alive = np.concatenate([self._alive, np.ones(added, dtype=bool)])
+        alive[retired] = False
+        self._alive = alive
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r',
+                                  shape=(self._rows, self._dim)) if self._rows else None
+
+    def _retire(self, chunk_id, retired):
+        row = self._id_to_row.pop(chunk_id, None)
+        if row is not None:
+            retired.append(row)
+
+    def _snapshot(self):
+        with self._lock:
+            self._catch_up()
+            return self._vectors, self._alive, self._rows
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        """
+        Append rows for the given ids; earlier rows with the same id stop being searchable
+        """
+        if not ids:
+            return
+        vectors = _normalize(embeddings)
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up()
+            if self._dim is not None and vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._dim}")
+
+            # Drop the tail of a writer that died mid-append
+            if os.path.exists(self._records_path) and os.path.getsize(self._records_path) > self._records_offset:
+                os.truncate(self._records_path, self._records_offset)
+
+            # Write vectors first; a record only counts once its line is complete
+            with open(self._vectors_path, 'ab') as f:
+                f.truncate(self._rows * vectors.shape[1] * 4)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self._records_path, 'a', encoding='utf-8') as f:
+                for chunk_id, metadata, text in zip(ids, metadatas, documents):
+                    f.write(json.dumps({
+                        'op': 'add',
+                        'id': chunk_id,
+                        'dim': int(vectors.shape[1]),
+                        'text': text,
+                        'metadata': metadata
+                    }) + '\n')
+
+            self._catch_up()
+
+    def delete(self, ids=None):
+        with self._lock, self._file_lock(exclusive=True):
+            self._catch_up()
+            ids = [chunk_id for chunk_id in ids or [] if chunk_id in self._id_to_row]
+            if not ids:
+                return
+            if os.path.getsize(self._records_path) > self._records_offset:
+                os.truncate(self._records_path, self._records_offset)
+            with open(self._records_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'op': 'delete', 'ids': ids}) + '\n')
+            self._catch_up()
+
+    def _candidate_rows(self, where, alive, rows):
+        """
+        Row numbers of live rows matching a Chroma-style where clause, in row order
+        """
+        if not where:
+            return np.flatnonzero(alive[:rows])
+
+        # The first indexed field with an equality or $in condition selects the rows
+        field, values = None, None
+        for key, condition in where.items():
+            if key not in self._field_rows:
+                continue
+            if isinstance(condition, dict):
+                if '$in' in condition:
+                    field, values = key, condition['$in']
+                elif '$eq' in condition:
+                    field, values = key, [condition['$eq']]
+            else:
+                field, values = key, [condition]
+            if field is not None:
+                break
+
+        if field is not None:
+            with self._lock:
+                rows_by_value = self._field_rows[field]
+                candidates = [row for value in set(values) for row in rows_by_value.get(value, ()) if row < rows]
+            # Sorted, so a search over every row is recognized as one and hits map back to rows
+            candidates = np.unique(np.asarray(candidates, dtype=np.int64))
+            candidates = candidates[alive[candidates]] if len(candidates) else candidates
+        else:
+            candidates = np.flatnonzero(alive[:rows])
+
+        rest = {key: value for key, value in where.items() if key != field}
+        if rest:
+            candidates = np.asarray([row for row in candidates if _matches(self._metadatas[row], rest)], dtype=np.int64)
+        return candidates
+
+    def _top_k(self, vectors, candidates, queries, k):
+        """
+        Return per query a list of (row, distance) pairs, closest first
+        """
+        if vectors is None or len(candidates) == 0:
+            return [[] for _ in range(len(queries))]
+
+        # Contiguous slice when searching everything, gathered rows otherwise
+        every_row = len(candidates) == len(vectors) and np.array_equal(candidates, np.arange(len(vectors)))
+        matrix = vectors if every_row else vectors[candidates]
+        scores = queries @ matrix.T
+        k = min(k, len(candidates))
+
+        results = []
+        for row_scores in np.atleast_2d(scores):
+            top = np.argpartition(-row_scores, k - 1)[:k] if k < len(row_scores) else np.arange(len(row_scores))
+            top = top[np.argsort(-row_scores[top])]
+            results.append([(int(candidates[i]), float(2.0 - 2.0 * row_scores[i])) for i in top])
+        return results
+
+    def _document(self, row):
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]))
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k: int = 4, filter=None):
+        return self.similarity_search_by_vectors(np.asarray([embedding]), k=k, filter=filter)[0]
+
+    def similarity_search_by_vectors(self, embeddings, k: int = 4, filter=None):
+        """
+        Batched search: one matrix product for all query vectors.
+        Returns a list of (Document, distance) lists, one per query.
+        """
+        vectors, alive, rows = self._snapshot()
+        candidates = self._candidate_rows(filter, alive, rows)
+        results = self._top_k(vectors, candidates, _normalize(embeddings), k)
+        return [[(self._document(row), distance) for row, distance in hits] for hits in results]
+
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        vectors, alive, rows = self._snapshot()
+        if ids is not None:
+            with self._lock:
+                selected = [self._id_to_row[chunk_id] for chunk_id in ids if chunk_id in self._id_to_row]
+        else:
+            selected = self._candidate_rows(where, alive, rows)
+
+        result = {'ids': [self._ids[row] for row in selected]}
+        if 'metadatas' in include:
+            result['metadatas'] = [dict(self._metadatas[row]) for row in selected]
+        if 'documents' in include:
+            result['documents'] = [self._texts[row] for row in selected]
+        if 'embeddings' in include:
+            result['embeddings'] = [vectors[row] for row in selected] if len(selected) else []
+        return result
+
+    def count(self):
+        _, alive, rows = self._snapshot()
+        return int(alive[:rows].sum())
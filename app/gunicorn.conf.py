@@ -0,0 +1,92 @@
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Load the app, and with it the embedding model, in the master before forking
+preload_app = True
+
+# Workers are processes for CPU-bound embedding; threads cover requests waiting on Ollama and MongoDB
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# LLM generations can take minutes on CPU
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '180'))
+# Time a stopping worker gets to finish ingestion jobs and flush logs
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '120'))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+# Workers share their metrics through snapshot files here, so /metrics covers the whole server
+metrics_dir = os.getenv('METRICS_DIR', '/tmp/app-metrics')
+
+
+def on_starting(server):
+    """
+    Start from empty metrics: snapshots of a previous run's workers would otherwise be summed in
+    """
+    import shutil
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_fork(server, worker):
+    """
+    Replace state that does not survive a fork: database clients, background
+    threads and the vector store handles. The model weights stay shared.
+    """
+    from database.mongo_client import reset_mongo_client
+    from database.log_writer import reset_log_writer
+    from database.chroma_client import reset_vectorstores
+    from database.lexical_index import reset_lexical_indexes
+    from utils.ingestion_queue import reset_ingestion_queue, set_worker_id
+    from rag.scheduler import set_worker_count
+    from utils.metrics import registry
+    from main import init_worker
+
+    reset_mongo_client()
+    reset_log_writer()
+    reset_vectorstores()
+    reset_lexical_indexes()
+    reset_ingestion_queue()
+    # Ingestion jobs are owned per worker, so a dead worker's jobs can be told apart and reclaimed
+    set_worker_id()
+    # The Ollama concurrency and queue limits are for the whole server, not per worker
+    set_worker_count(server.cfg.workers)
+    registry.enable_multiprocess(metrics_dir)
+
+    # Split the CPU between workers instead of every worker using all cores
+    torch_threads = os.getenv('EMBEDDING_TORCH_THREADS')
+    if os.getenv('EMBEDDING_BACKEND', 'huggingface').lower() == 'onnx':
+        # The master never opens an onnxruntime session; each worker opens its own on first encode
+        os.environ.setdefault(
+            'EMBEDDING_ONNX_THREADS', torch_threads or str(max(1, (os.cpu_count() or 1) // server.cfg.workers))
+        )
+    elif torch_threads:
+        import torch
+        torch.set_num_threads(int(torch_threads))
+
+    init_worker()
+
+
+def worker_exit(server, worker):
+    """
+    Graceful stop: let queued and running ingestion jobs finish, then flush the log queue
+    """
+    from utils.ingestion_queue import get_ingestion_queue
+    from database.mongo_client import write_log_records
+    from database.log_writer import get_log_writer
+    from rag.model_residency import get_model_residency_manager
+    from utils.metrics import registry
+
+    get_model_residency_manager().stop()
+    queue = get_ingestion_queue()
+    if queue.pending_jobs:
+        server.log.info("Waiting for %d ingestion jobs (pid: %s)", queue.pending_jobs, worker.pid)
+    queue.shutdown(wait=True)
+    writer = get_log_writer(write_log_records)
+    writer.close()
+    server.log.info("Log writer flushed (pid: %s): %s", worker.pid, writer.stats())
+    registry.close()
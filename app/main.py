@@ -1,42 +1,137 @@
-from flask import Flask
+import time
+from flask import Flask, Response, request, g
 from flask_cors import CORS
 from flask_restx import Api
 from api.endpoints import register_routes
-from database.mongo_client import init_mongo
-from database.chroma_client import init_chroma
+from database.mongo_client import get_mongo_client, ensure_indexes
+from database.chroma_client import get_vectorstore
+from utils.embeddings import get_embeddings_model, warm_up_embeddings_model
+from utils.query_embedding_cache import get_query_embedding_cache
+from utils.metrics import registry, start_trace, request_duration, requests_total
 import os
 
-def create_app():
+def create_app(preload: bool = False):
+    """
+    Build the Flask app. With preload (multi-worker server), only process-independent
+    state is set up here, in the master, so workers share the loaded model weights
+    copy-on-write; each worker then calls init_worker() after the fork. Otherwise
+    init_worker() runs right away.
+
+    Raises RuntimeError when MongoDB or the vector store is unreachable.
+    """
     app = Flask(__name__)
     
     # Enable CORS
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
     
     # Configure app
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-    
+    # Ingestion streams pages in batches, so large books and theses are accepted
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 256 * 1024 * 1024))  # 256MB max file size
+
+    # Load the shared embeddings model once; every caller reuses it via the registry
+    app.extensions['embedding_model'] = get_embeddings_model()
+
+    # Fail fast when a backing service is unreachable instead of serving errors later
+    try:
+        get_mongo_client().admin.command('ping')
+        ensure_indexes()
+    except Exception as e:
+        raise RuntimeError(
+            f"MongoDB is not reachable at {os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')}: {e}"
+        ) from e
+
     try:
-        # Test database connections
-        from database.mongo_client import init_mongo
-        from database.chroma_client import init_chroma
-        
-        mongo_db = init_mongo()
-        chroma_client = init_chroma()
-        
-        # Test ChromaDB connection
-        chroma_client.heartbeat()
-        
+        get_vectorstore()
     except Exception as e:
-        pass  # Continue even if databases are not available during startup
+        raise RuntimeError(
+            f"Vector store at {os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')} could not be opened: {e}"
+        ) from e
+
+    register_metrics(app)
+    register_readiness(app)
 
     api = Api(app, version='1.0', title='Academic Paper Query API',
               description='A Flask API for querying academic papers using RAG with Ollama',
               doc='/swagger/')
 
     register_routes(api)
+
+    if not preload:
+        init_worker()
     
     return app
 
+def init_worker():
+    """
+    Per-process startup: run the first encode, start the LLM residency thread and
+    pick up ingestion jobs interrupted by a restart
+    """
+    warm_up_embeddings_model()
+
+    # Load the LLM in the background and keep it resident; /ready reports when it is warm
+    from rag.model_residency import get_model_residency_manager
+    get_model_residency_manager().start()
+
+    try:
+        from utils.ingestion_queue import resume_unfinished_jobs
+        resume_unfinished_jobs()
+    except Exception as e:
+        print(f"WARNING: Could not resume ingestion jobs: {e}")
+
+def register_metrics(app):
+    """
+    Trace every request and expose Prometheus metrics at /metrics
+    """
+    from database.mongo_client import get_log_writer_stats
+    from rag.scheduler import get_llm_scheduler
+    from utils.ingestion_queue import get_ingestion_queue
+    from rag.model_residency import get_model_residency_manager
+
+    registry.register_gauges('app_log_writer', 'Background log writer counters', get_log_writer_stats)
+    registry.register_gauges('app_llm_scheduler', 'LLM scheduler state', lambda: get_llm_scheduler().stats())
+    registry.register_gauges('app_ollama_model', 'Ollama model residency', lambda: {
+        key: int(value) if isinstance(value, bool) else value
+        for key, value in get_model_residency_manager().stats().items()
+    })
+    registry.register_gauges('app_query_embedding_cache', 'Query embedding cache',
+                             lambda: get_query_embedding_cache().stats())
+    registry.register_gauges('app_ingestion', 'Ingestion queue state',
+                             lambda: {'pending_jobs': get_ingestion_queue().pending_jobs})
+
+    @app.before_request
+    def begin_request_trace():
+        g.request_start = time.perf_counter()
+        g.trace_id = start_trace(request.headers.get('X-Trace-Id'))
+
+    @app.after_request
+    def record_request_metrics(response):
+        if request.path != '/metrics':
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_duration.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+            requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        response.headers['X-Trace-Id'] = g.trace_id
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def register_readiness(app):
+    """
+    Expose /ready: 200 once the LLM is loaded in Ollama, 503 otherwise, so a load
+    balancer only routes queries to warm instances
+    """
+    from rag.model_residency import get_model_residency_manager
+
+    @app.route('/ready')
+    def ready():
+        manager = get_model_residency_manager()
+        stats = manager.stats()
+        body = {'ready': manager.ready, 'embedding_model_loaded': 'embedding_model' in app.extensions, 'llm': stats}
+        return body, 200 if manager.ready else 503
+
+
 if __name__ == '__main__':
     app = create_app()
     debug_mode = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -0,0 +1,240 @@
+import os
+import re
+import time
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.documents import Document
+from database.mongo_client import init_mongo
+from database.document_catalog import get_document_catalog
+from utils.embeddings import get_embeddings_model
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase, collapse whitespace and drop trailing punctuation
+    """
+    return re.sub(r'\s+', ' ', question.strip().lower()).rstrip(' ?!.')
+
+
+def get_corpus_version(document_names):
+    """
+    Version of the targeted part of the corpus: each document with its catalog version
+    """
+    catalog = get_document_catalog()
+    return '|'.join(
+        f"{name}@{catalog.get(name, {}).get('version', 0)}"
+        for name in sorted(set(document_names))
+    )
+
+
+# Per-request measurements of the run that produced an answer. A cache hit did no
+# retrieval or generation, so these must not be reported for it.
+REQUEST_TIMING_KEYS = frozenset((
+    'retrieval_time', 'model_response_time', 'total_processing_time', 'time_to_first_token',
+    'llm_queue_wait_time', 'llm_coalesced_wait_time', 'llm_coalesced'
+))
+
+
+def _cacheable_metadata(processing_metadata):
+    return {key: value for key, value in processing_metadata.items() if key not in REQUEST_TIMING_KEYS}
+
+
+def _serialize_docs(docs):
+    return [{'page_content': doc.page_content, 'metadata': doc.metadata} for doc in docs]
+
+
+def _deserialize_docs(docs):
+    return [Document(page_content=doc['page_content'], metadata=doc['metadata']) for doc in docs]
+
+
+class AnswerCache:
+    """
+    Cache of query chain results keyed by normalized question, target documents
+    and their catalog versions.
+
+    The in-process tier is an LRU with a TTL. An optional MongoDB tier shares
+    entries across workers. When a similarity threshold is set, a miss on the
+    exact key falls back to the cached question with the closest query embedding
+    for the same documents and corpus version.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, similarity_threshold: float = None,
+                 use_mongo: bool = None):
+        self.max_entries = max_entries or int(os.getenv('ANSWER_CACHE_SIZE', '1000'))
+        self.ttl = ttl or float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+        if similarity_threshold is None:
+            threshold = os.getenv('ANSWER_CACHE_SIMILARITY_THRESHOLD', '')
+            similarity_threshold = float(threshold) if threshold else None
+        self.similarity_threshold = similarity_threshold
+        if use_mongo is None:
+            use_mongo = os.getenv('ANSWER_CACHE_MONGO', 'False').lower() == 'true'
+        self.use_mongo = use_mongo
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._mongo_indexed = False
+
+    def _key(self, question_norm, document_names, corpus_version):
+        raw = f"{question_norm}\x00{'|'.join(sorted(set(document_names)))}\x00{corpus_version}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _collection(self):
+        collection = init_mongo().answer_cache
+        if not self._mongo_indexed:
+            collection.create_index('key', unique=True)
+            collection.create_index('created_at', expireAfterSeconds=int(self.ttl))
+            collection.create_index('documents')
+            self._mongo_indexed = True
+        return collection
+
+    def _embed(self, question_norm):
+        embedding = np.asarray(get_embeddings_model().embed_query(question_norm), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['created_at'] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _find_similar_local(self, scope, embedding):
+        best_entry, best_score = None, self.similarity_threshold
+        now = time.time()
+        with self._lock:
+            for entry in self._entries.values():
+                if entry['scope'] != scope or entry['embedding'] is None or now - entry['created_at'] > self.ttl:
+                    continue
+                score = float(np.dot(entry['embedding'], embedding))
+                if score >= best_score:
+                    best_entry, best_score = entry, score
+        return best_entry
+
+    def lookup(self, question: str, document_names):
+        """
+        Return (result, retrieved_docs, processing_metadata, tier) for a cached answer, or None
+        """
+        question_norm = normalize_question(question)
+        corpus_version = get_corpus_version(document_names)
+        key = self._key(question_norm, document_names, corpus_version)
+
+        entry = self._get_local(key)
+        tier = 'memory'
+
+        if entry is None and self.use_mongo:
+            stored = self._collection().find_one({'key': key}, {'_id': False})
+            # MongoDB's TTL monitor only runs about once a minute, so an expired entry may still be found
+            if stored and time.time() - self._stored_created_at(stored) <= self.ttl:
+                entry = self._entry_from_mongo(stored)
+                self._put_local(key, entry)
+                tier = 'mongo'
+
+        if entry is None and self.similarity_threshold is not None:
+            entry = self._find_similar_local(corpus_version, self._embed(question_norm))
+            tier = 'semantic'
+
+        if entry is None:
+            return None
+
+        return (
+            dict(entry['result']),
+            _deserialize_docs(entry['retrieved_docs']),
+            _cacheable_metadata(entry['processing_metadata']),
+            tier
+        )
+
+    def store(self, question: str, document_names, result, retrieved_docs, processing_metadata):
+        question_norm = normalize_question(question)
+        corpus_version = get_corpus_version(document_names)
+        key = self._key(question_norm, document_names, corpus_version)
+        embedding = self._embed(question_norm) if self.similarity_threshold is not None else None
+        processing_metadata = _cacheable_metadata(processing_metadata)
+
+        entry = {
+            'scope': corpus_version,
+            'documents': sorted(set(document_names)),
+            'result': result,
+            'retrieved_docs': _serialize_docs(retrieved_docs),
+            'processing_metadata': processing_metadata,
+            'embedding': embedding,
+            'created_at': time.time()
+        }
+        self._put_local(key, entry)
+
+        if self.use_mongo:
+            self._collection().replace_one({'key': key}, {
+                'key': key,
+                'question': question_norm,
+                'documents': entry['documents'],
+                'corpus_version': corpus_version,
+                'result': result,
+                'retrieved_docs': entry['retrieved_docs'],
+                'processing_metadata': processing_metadata,
+                'embedding': embedding.tolist() if embedding is not None else None,
+                'created_at': datetime.datetime.utcnow()
+            }, upsert=True)
+
+    def _stored_created_at(self, stored):
+        """
+        Epoch seconds of a MongoDB entry's naive UTC created_at
+        """
+        created_at = stored['created_at']
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+        return created_at.timestamp()
+
+    def _entry_from_mongo(self, stored):
+        embedding = stored.get('embedding')
+        return {
+            'scope': stored['corpus_version'],
+            'documents': stored['documents'],
+            'result': stored['result'],
+            'retrieved_docs': stored['retrieved_docs'],
+            'processing_metadata': stored['processing_metadata'],
+            'embedding': np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+            # Keep the stored age, so promotion to memory does not restart the TTL
+            'created_at': self._stored_created_at(stored)
+        }
+
+    def invalidate_document(self, document_name: str):
+        """
+        Drop every cached answer that used the given document
+        """
+        with self._lock:
+            stale_keys = [key for key, entry in self._entries.items() if document_name in entry['documents']]
+            for key in stale_keys:
+                del self._entries[key]
+
+        if self.use_mongo:
+            self._collection().delete_many({'documents': document_name})
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Return the process-wide answer cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
@@ -1,177 +1,314 @@
-from utils.embeddings import get_embeddings_model
+from database.document_catalog import get_total_chunk_count
 from rag.prompt_templates import get_prompt_template
 from rag.output_parser import parse_llm_response
-from langchain_chroma import Chroma
+from rag.retriever import retrieve_chunks_with_scores, retrieve_chunks_batch
+from rag.context_builder import build_context
+from rag.scheduler import get_llm_scheduler, SchedulerOverloaded
+from rag.model_residency import get_model_residency_manager
+from utils.metrics import span, observe_stage
 from langchain_ollama import OllamaLLM
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains.retrieval import create_retrieval_chain
 import os
 import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def run_query_chain(question: str, document_name: str = None):
-    try:
-        start_time = time.time()
-        
-        embedding_model = get_embeddings_model()
+_llm = None
 
-        chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
-        vectorstore = Chroma(
-            collection_name="pdf_chunks",
-            embedding_function=embedding_model,
-            persist_directory=chroma_dir
-        )
-        
-        # Check if there are documents in ChromaDB
-        chroma_data = vectorstore.get()
-        document_count = len(chroma_data["documents"])
-        
-        if document_count == 0:
-            return {
-                "answer": "No documents available for querying. Please upload a PDF file first via /pdf/papers endpoint",
-                "citations": []
-            }
 
-        # Use a simpler retriever with better performance
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3}  # Reduced from 5 to 3 for better performance
-        )
-
-        prompt_template = get_prompt_template()
-        
+def get_llm():
+    """
+    Return the shared Ollama client
+    """
+    global _llm
+    if _llm is None:
         ollama_host = os.getenv('OLLAMA_HOST', 'http://ollama:11434')
         ollama_model = os.getenv('OLLAMA_MODEL', 'academiqa')
-        
-        llm = OllamaLLM(
-            model=ollama_model, 
+
+        _llm = OllamaLLM(
+            model=ollama_model,
             base_url=ollama_host,
-            timeout=120  # 2 minutes timeout
+            timeout=120,
+            # Every request resets the unload timer, so queries must pin residency too
+            keep_alive=get_model_residency_manager().keep_alive
         )
+    return _llm
 
-        # Get retrieved documents
-        retrieved_docs = retriever.invoke(question)
-        
-        if len(retrieved_docs) == 0:
-            return {
-                "answer": "No relevant information found for your question in the document. Try asking a different question or ensure the document contains relevant information.",
-                "citations": []
-            }
 
-        # Format context from retrieved documents
-        context = "\n\n".join([doc.page_content for doc in retrieved_docs])
-        
-        # Create prompt with document name
+def format_prompt(question: str, target_documents, scored_docs, prompt_template=None):
+    """
+    Build the LLM prompt from the retrieved (Document, distance) pairs.
+    Returns (formatted_prompt, used_docs, context_stats); used_docs are the chunks
+    that made it into the token-budgeted context.
+    """
+    prompt_template = prompt_template or get_prompt_template()
+
+    # Merge overlapping chunks and fit the context to the token budget
+    with span('context_building'):
+        context, used_docs, context_stats = build_context(scored_docs)
+
+    # Create prompt with document name
+    with span('prompt_formatting'):
         formatted_prompt = prompt_template.format(
             context=context,
             input=question,
-            document_name=document_name or "the document"
+            document_name=", ".join(target_documents) if target_documents else "the document"
         )
-        
-        result = llm.invoke(formatted_prompt)
+    return formatted_prompt, used_docs, context_stats
+
+
+def prepare_query(question: str, document_name: str = None, mentioned_documents: list = None):
+    """
+    Retrieve context for the question and build the prompt.
+    Returns (early_result, formatted_prompt, retrieved_docs, processing_metadata).
+    early_result is an answer dict when there is nothing to send to the model, otherwise None.
+    """
+    # Check if there are documents in the catalog
+    document_count = get_total_chunk_count()
+
+    if document_count == 0:
+        return {
+            "answer": "No documents available for querying. Please upload a PDF file first via /pdf/papers endpoint",
+            "citations": []
+        }, None, [], {}
+
+    prompt_template = get_prompt_template()
+
+    # Search only the documents the question refers to
+    target_documents = mentioned_documents or ([document_name] if document_name else None)
+
+    # Get retrieved documents with timing
+    retrieval_start = time.time()
+    scored_docs = retrieve_chunks_with_scores(question, target_documents)
+    retrieval_time = time.time() - retrieval_start
+
+    if len(scored_docs) == 0:
+        return {
+            "answer": "No relevant information found for your question in the document. Try asking a different question or ensure the document contains relevant information.",
+            "citations": []
+        }, None, [], {}
+
+    formatted_prompt, retrieved_docs, context_stats = format_prompt(
+        question, target_documents, scored_docs, prompt_template
+    )
+
+    processing_metadata = {
+        'retrieval_time': retrieval_time,
+        'chunks_retrieved': len(scored_docs),
+        'total_documents_in_db': document_count,
+        'document_name': document_name,
+        'searched_documents': target_documents or [],
+        **context_stats
+    }
+
+    return None, formatted_prompt, retrieved_docs, processing_metadata
+
+
+def run_query_chain_with_details(question: str, document_name: str = None, mentioned_documents: list = None):
+    """
+    Enhanced version that returns detailed information for logging.
+    Retrieval is scoped to mentioned_documents when given, otherwise to document_name.
+    """
+    try:
+        start_time = time.time()
+
+        early_result, formatted_prompt, retrieved_docs, processing_metadata = prepare_query(
+            question, document_name, mentioned_documents
+        )
+        if early_result:
+            return early_result, [], {}
+
+        # Generate answer with timing; identical concurrent prompts share one generation
+        model_start = time.time()
+        with span('llm_generation'):
+            result, schedule_metadata = get_llm_scheduler().run(formatted_prompt, get_llm().invoke)
+        model_response_time = time.time() - model_start
 
         processing_time = time.time() - start_time
 
-        parsed_result = parse_llm_response(result)
+        # Prepare processing metadata
+        processing_metadata.update({
+            'total_processing_time': processing_time,
+            'model_response_time': model_response_time,
+            'llm_queue_wait_time': schedule_metadata['queue_wait_time'],
+            'llm_coalesced_wait_time': schedule_metadata['coalesced_wait_time'],
+            'llm_coalesced': schedule_metadata['coalesced']
+        })
+
+        with span('output_parsing'):
+            parsed_result = parse_llm_response(result)
         
-        return parsed_result
+        return parsed_result, retrieved_docs, processing_metadata
     
+    except SchedulerOverloaded:
+        # Let the endpoint answer 429 instead of reporting an error answer
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {
             "answer": f"Error processing the question: {str(e)}",
             "citations": []
-        }
+        }, [], {}
+
 
-def run_query_chain_with_details(question: str, document_name: str = None):
+def stream_query_chain(question: str, document_name: str = None, mentioned_documents: list = None):
     """
-    Enhanced version that returns detailed information for logging
+    Streaming version of run_query_chain_with_details. The caller is responsible
+    for holding an LLM scheduler slot while the generator runs.
+    Yields (event, data) tuples: 'citations' with the retrieved chunks, one 'token' per
+    generated text piece, and a final 'summary' with the parsed result, the retrieved
+    documents and the processing metadata.
     """
-    try:
-        start_time = time.time()
-        
-        embedding_model = get_embeddings_model()
+    start_time = time.time()
 
-        chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
-        vectorstore = Chroma(
-            collection_name="pdf_chunks",
-            embedding_function=embedding_model,
-            persist_directory=chroma_dir
-        )
-        
-        # Check if there are documents in ChromaDB
-        chroma_data = vectorstore.get()
-        document_count = len(chroma_data["documents"])
-        
-        if document_count == 0:
-            return {
-                "answer": "No documents available for querying. Please upload a PDF file first via /pdf/papers endpoint",
-                "citations": []
-            }, [], {}
+    early_result, formatted_prompt, retrieved_docs, processing_metadata = prepare_query(
+        question, document_name, mentioned_documents
+    )
 
-        # Use a simpler retriever with better performance
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3}
-        )
+    yield 'citations', [
+        {
+            'document_name': doc.metadata.get('document_name', ''),
+            'chunk_id': doc.metadata.get('chunk_id', ''),
+            'page': doc.metadata.get('page', '')
+        }
+        for doc in retrieved_docs
+    ]
 
-        prompt_template = get_prompt_template()
-        
-        ollama_host = os.getenv('OLLAMA_HOST', 'http://ollama:11434')
-        ollama_model = os.getenv('OLLAMA_MODEL', 'academiqa')
-        
-        llm = OllamaLLM(
-            model=ollama_model, 
-            base_url=ollama_host,
-            timeout=120
-        )
-        
-        # Get retrieved documents with timing
-        retrieval_start = time.time()
-        retrieved_docs = retriever.invoke(question)
-        retrieval_time = time.time() - retrieval_start
-        
-        if len(retrieved_docs) == 0:
-            return {
+    if early_result:
+        yield 'summary', {'result': early_result, 'retrieved_docs': [], 'processing_metadata': {}}
+        return
+
+    model_start = time.time()
+    time_to_first_token = None
+    pieces = []
+    for token in get_llm().stream(formatted_prompt):
+        if time_to_first_token is None:
+            time_to_first_token = time.time() - model_start
+            observe_stage('llm_time_to_first_token', time_to_first_token)
+        pieces.append(token)
+        yield 'token', token
+
+    model_response_time = time.time() - model_start
+    observe_stage('llm_generation', model_response_time)
+    processing_metadata.update({
+        'total_processing_time': time.time() - start_time,
+        'model_response_time': model_response_time,
+        'time_to_first_token': time_to_first_token or model_response_time,
+        'streamed': True
+    })
+
+    with span('output_parsing'):
+        parsed_result = parse_llm_response(''.join(pieces))
+
+    yield 'summary', {
+        'result': parsed_result,
+        'retrieved_docs': retrieved_docs,
+        'processing_metadata': processing_metadata
+    }
+
+
+def _batch_llm_concurrency():
+    return int(os.getenv('QUERY_BATCH_LLM_CONCURRENCY', '2'))
+
+
+def _batch_max_retries():
+    return int(os.getenv('QUERY_BATCH_MAX_RETRIES', '3'))
+
+
+def _generate_batch_item(index, question, target_documents, scored_docs, retrieval_time, document_count):
+    """
+    Generate and parse the answer for one batch item. Overloaded scheduler
+    admissions are retried after the suggested delay.
+    """
+    start_time = time.time()
+    try:
+        if not scored_docs:
+            return index, {
                 "answer": "No relevant information found for your question in the document. Try asking a different question or ensure the document contains relevant information.",
                 "citations": []
             }, [], {}
 
-        # Format context from retrieved documents
-        context = "\n\n".join([doc.page_content for doc in retrieved_docs])
-        
-        # Create prompt with document name
-        formatted_prompt = prompt_template.format(
-            context=context,
-            input=question,
-            document_name=document_name or "the document"
-        )
+        formatted_prompt, retrieved_docs, context_stats = format_prompt(question, target_documents, scored_docs)
 
-        # Generate answer with timing
         model_start = time.time()
-        result = llm.invoke(formatted_prompt)
+        attempt = 0
+        while True:
+            try:
+                with span('llm_generation'):
+                    result, schedule_metadata = get_llm_scheduler().run(formatted_prompt, get_llm().invoke)
+                break
+            except SchedulerOverloaded as e:
+                attempt += 1
+                if attempt > _batch_max_retries():
+                    return index, {"answer": str(e), "citations": []}, [], {
+                        'error': str(e), 'retry_after': e.retry_after
+                    }
+                time.sleep(e.retry_after)
         model_response_time = time.time() - model_start
 
-        processing_time = time.time() - start_time
+        with span('output_parsing'):
+            parsed_result = parse_llm_response(result)
 
-        # Prepare processing metadata
-        processing_metadata = {
-            'total_processing_time': processing_time,
+        return index, parsed_result, retrieved_docs, {
             'retrieval_time': retrieval_time,
-            'model_response_time': model_response_time,
-            'chunks_retrieved': len(retrieved_docs),
+            'chunks_retrieved': len(scored_docs),
             'total_documents_in_db': document_count,
-            'document_name': document_name
+            'document_name': target_documents[0] if target_documents else None,
+            'searched_documents': target_documents or [],
+            **context_stats,
+            'total_processing_time': retrieval_time + time.time() - start_time,
+            'model_response_time': model_response_time,
+            'llm_queue_wait_time': schedule_metadata['queue_wait_time'],
+            'llm_coalesced_wait_time': schedule_metadata['coalesced_wait_time'],
+            'llm_coalesced': schedule_metadata['coalesced']
         }
 
-        parsed_result = parse_llm_response(result)
-        
-        return parsed_result, retrieved_docs, processing_metadata
-    
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return {
+        return index, {
             "answer": f"Error processing the question: {str(e)}",
             "citations": []
-        }, [], {}
+        }, [], {'error': str(e)}
+
+
+def run_query_batch(items, max_concurrency: int = None):
+    """
+    Answer many questions at once. items is a list of (question, target_documents).
+
+    All questions are embedded and retrieved together, then at most max_concurrency
+    generations of this batch run at a time, still subject to the LLM scheduler.
+    Yields (index, result, retrieved_docs, processing_metadata) as items finish, in
+    completion order. processing_metadata has an 'error' key for failed items.
+    """
+    if not items:
+        return
+
+    document_count = get_total_chunk_count()
+    if document_count == 0:
+        for index in range(len(items)):
+            yield index, {
+                "answer": "No documents available for querying. Please upload a PDF file first via /pdf/papers endpoint",
+                "citations": []
+            }, [], {}
+        return
+
+    retrieval_start = time.time()
+    hits = retrieve_chunks_batch([question for question, _ in items], [documents for _, documents in items])
+    # Retrieval ran once for the whole batch; attribute an equal share to each item
+    retrieval_time = (time.time() - retrieval_start) / len(items)
+
+    pool = ThreadPoolExecutor(max_workers=max_concurrency or _batch_llm_concurrency(),
+                              thread_name_prefix='query-batch')
+    try:
+        futures = [
+            # Each worker runs in a copy of the caller's context so stage timings join its trace
+            pool.submit(contextvars.copy_context().run, _generate_batch_item, index, question, documents,
+                        hits[index], retrieval_time, document_count)
+            for index, (question, documents) in enumerate(items)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Stop queued generations if the caller goes away mid-batch
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,140 @@
+import os
+from utils.metrics import registry
+
+# Shortest suffix/prefix match treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+context_tokens = registry.counter(
+    'app_context_tokens_total',
+    'Estimated prompt context tokens, before (raw) and after (used) context building'
+)
+context_tokens_saved = registry.counter(
+    'app_context_tokens_saved_total',
+    'Estimated prompt context tokens removed by overlap merging and budget trimming'
+)
+
+
+def _token_budget():
+    return int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+
+
+def _chars_per_token():
+    return float(os.getenv('CONTEXT_CHARS_PER_TOKEN', '4'))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for the academiqa (llama3) tokenizer, which averages about
+    four characters per token on English prose
+    """
+    return int(len(text) / _chars_per_token() + 0.5)
+
+
+def _overlap_length(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of left that is also a prefix of right
+    """
+    limit = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for length in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def _merge_document_chunks(chunks):
+    """
+    Merge chunks of one document, ordered by chunk_index, into contiguous segments.
+    Neighbouring chunks are joined with their shared overlap written once; chunks
+    whose text is fully contained in the previous one are dropped.
+    Returns a list of (text, best_distance, docs) segments.
+    """
+    segments = []
+    previous_index = None
+    for doc, distance in chunks:
+        index = doc.metadata.get('chunk_index')
+        text = doc.page_content
+        if segments and index is not None and previous_index is not None and index - previous_index == 1:
+            segment_text, best, docs = segments[-1]
+            overlap = _overlap_length(segment_text, text)
+            if overlap:
+                segment_text += text[overlap:]
+            elif text not in segment_text:
+                segment_text += ' ' + text
+            segments[-1] = (segment_text, min(best, distance), docs + [doc])
+        else:
+            segments.append((text, distance, [doc]))
+        previous_index = index
+    return segments
+
+
+def _assemble(scored_docs):
+    """
+    Group the chunks by document, merge neighbours and order the result: documents
+    by their best chunk, segments in reading order within a document
+    """
+    by_document = {}
+    for doc, distance in scored_docs:
+        by_document.setdefault(doc.metadata.get('document_name', ''), []).append((doc, distance))
+
+    segments = []
+    for chunks in by_document.values():
+        chunks.sort(key=lambda pair: (pair[0].metadata.get('chunk_index', 0), pair[1]))
+        best = min(distance for _, distance in chunks)
+        segments.extend((best, position, segment) for position, segment in enumerate(_merge_document_chunks(chunks)))
+
+    segments.sort(key=lambda entry: (entry[0], entry[1]))
+    return [segment for _, _, segment in segments]
+
+
+def build_context(scored_docs, token_budget: int = None):
+    """
+    Turn retrieved (Document, distance) pairs into prompt context.
+
+    Duplicate chunks are dropped, overlapping or adjacent chunks of a document are
+    merged so shared text appears once, and chunks are admitted best score first
+    for as long as the merged context fits in token_budget (CONTEXT_TOKEN_BUDGET).
+    The best chunk is always kept, truncated if it alone exceeds the budget.
+    Returns (context, used_docs, stats).
+    """
+    token_budget = token_budget or _token_budget()
+    raw_tokens = estimate_tokens("\n\n".join(doc.page_content for doc, _ in scored_docs))
+
+    # Drop repeated chunks, e.g. the same text indexed under two chunk ids
+    unique = []
+    seen = set()
+    for doc, distance in sorted(scored_docs, key=lambda pair: pair[1]):
+        key = doc.metadata.get('content_hash') or doc.page_content
+        if key not in seen:
+            seen.add(key)
+            unique.append((doc, distance))
+
+    selected = []
+    segments = []
+    for candidate in unique:
+        attempt = _assemble(selected + [candidate])
+        if estimate_tokens("\n\n".join(text for text, _, _ in attempt)) <= token_budget:
+            selected.append(candidate)
+            segments = attempt
+        elif not selected:
+            # Even the best chunk is too long; keep as much of it as fits
+            doc, distance = candidate
+            limit = int(token_budget * _chars_per_token())
+            selected.append(candidate)
+            segments = [(doc.page_content[:limit], distance, [doc])]
+
+    context = "\n\n".join(text for text, _, _ in segments)
+    used_docs = [doc for _, _, docs in segments for doc in docs]
+    used_tokens = estimate_tokens(context)
+
+    context_tokens.inc(raw_tokens, kind='raw')
+    context_tokens.inc(used_tokens, kind='used')
+    context_tokens_saved.inc(max(0, raw_tokens - used_tokens))
+
+    return context, used_docs, {
+        'context_tokens': used_tokens,
+        'context_tokens_raw': raw_tokens,
+        'context_tokens_saved': max(0, raw_tokens - used_tokens),
+        'context_chunks_used': len(used_docs),
+        'context_segments': len(segments)
+    }
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+import requests
+
+
+def _parse_keep_alive(value: str):
+    # Ollama accepts a number of seconds or a duration string such as "24h"; -1 keeps the model loaded
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class ModelResidencyManager:
+    """
+    Keeps the Ollama model loaded.
+
+    A background thread checks that OLLAMA_MODEL exists, loads it with an empty
+    warm-up generation carrying keep_alive, and then polls /api/ps. When the model
+    has been evicted (idle timeout, Ollama restart, memory pressure) it is warmed
+    up again, so the first query after an eviction does not pay for the load.
+    """
+
+    def __init__(self, host: str = None, model: str = None, keep_alive: str = None,
+                 check_interval: float = None, warm_up_timeout: float = None):
+        self.host = (host or os.getenv('OLLAMA_HOST', 'http://ollama:11434')).rstrip('/')
+        self.model = model or os.getenv('OLLAMA_MODEL', 'academiqa')
+        self.keep_alive = _parse_keep_alive(keep_alive or os.getenv('OLLAMA_KEEP_ALIVE', '-1'))
+        self.check_interval = check_interval or float(os.getenv('OLLAMA_RESIDENCY_CHECK_INTERVAL', '30'))
+        self.warm_up_timeout = warm_up_timeout or float(os.getenv('OLLAMA_WARM_UP_TIMEOUT', '300'))
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._state = {
+            'model_available': False,
+            'loaded': False,
+            'warm_ups': 0,
+            'rewarms': 0,
+            'last_warm_up_time': None,
+            'last_check': None,
+            'last_error': None
+        }
+
+    def _matches(self, name: str) -> bool:
+        # /api/tags and /api/ps report names with a tag, e.g. academiqa:latest
+        return name == self.model or (':' not in self.model and name == f"{self.model}:latest")
+
+    def _listed(self, path: str) -> bool:
+        response = requests.get(f"{self.host}{path}", timeout=10)
+        response.raise_for_status()
+        return any(
+            self._matches(entry.get('name') or entry.get('model', ''))
+            for entry in response.json().get('models', [])
+        )
+
+    def model_exists(self) -> bool:
+        return self._listed('/api/tags')
+
+    def model_loaded(self) -> bool:
+        return self._listed('/api/ps')
+
+    def warm_up(self):
+        """
+        Load the model with an empty generation and pin it with keep_alive.
+        Returns the time the load took.
+        """
+        start = time.time()
+        response = requests.post(
+            f"{self.host}/api/generate",
+            json={'model': self.model, 'prompt': '', 'stream': False, 'keep_alive': self.keep_alive},
+            timeout=self.warm_up_timeout
+        )
+        response.raise_for_status()
+        warm_up_time = time.time() - start
+        with self._lock:
+            self._state['warm_ups'] += 1
+            self._state['last_warm_up_time'] = warm_up_time
+            self._state['loaded'] = True
+        return warm_up_time
+
+    def check(self):
+        """
+        One residency check: make sure the model exists and is loaded, warming it up if not
+        """
+        try:
+            available = self.model_exists()
+            loaded = available and self.model_loaded()
+            with self._lock:
+                was_loaded = self._state['loaded']
+                self._state.update({'model_available': available, 'loaded': loaded,
+                                    'last_check': time.time(), 'last_error': None})
+
+            if available and not loaded:
+                if was_loaded:
+                    print(f"WARNING: Ollama model {self.model} was evicted, warming it up again")
+                    with self._lock:
+                        self._state['rewarms'] += 1
+                self.warm_up()
+            elif not available:
+                print(f"WARNING: Ollama model {self.model} not found at {self.host}")
+
+        except Exception as e:
+            with self._lock:
+                self._state.update({'loaded': False, 'last_check': time.time(), 'last_error': str(e)})
+            print(f"WARNING: Ollama residency check failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.check_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ollama-residency', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._state['model_available'] and self._state['loaded']
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._state)
+        stats['model'] = self.model
+        stats['keep_alive'] = self.keep_alive
+        return stats
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_residency_manager():
+    """
+    Return the process-wide residency manager
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ModelResidencyManager()
+    return _manager
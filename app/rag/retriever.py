@@ -0,0 +1,188 @@
+import os
+from database.chroma_client import get_vectorstore, similarity_search_by_vectors
+from database.lexical_index import get_lexical_index
+from utils.metrics import span
+
+
+def _default_k():
+    return int(os.getenv('RETRIEVAL_K', '3'))
+
+
+def _per_document_k():
+    return int(os.getenv('RETRIEVAL_PER_DOCUMENT_K', '2'))
+
+
+def _document_filter(document_name: str):
+    return {"document_name": document_name}
+
+
+def _hybrid_enabled():
+    return os.getenv('RETRIEVAL_HYBRID', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _hybrid_candidates():
+    return int(os.getenv('RETRIEVAL_HYBRID_CANDIDATES', '10'))
+
+
+def _rrf_k():
+    return int(os.getenv('RETRIEVAL_RRF_K', '60'))
+
+
+def _scoped_searches(document_names, k: int, per_document_k: int):
+    """
+    Return (document name or None, result count) for each search the target documents need
+    """
+    # Keep the order in which documents were mentioned but drop duplicates
+    document_names = [name for name in dict.fromkeys(document_names or []) if name]
+    if len(document_names) <= 1:
+        return [(document_names[0] if document_names else None, k)]
+    return [(document_name, per_document_k) for document_name in document_names]
+
+
+def reciprocal_rank_fusion(rankings, limit: int = None, rrf_k: int = None):
+    """
+    Merge ranked lists of (Document, score) pairs by reciprocal rank fusion.
+    Chunks are matched by chunk_id and only the rank in each list counts, so
+    scores on different scales can be merged. Returns (Document, distance)
+    pairs, best first, where distance is 1 minus the fused score relative to
+    a chunk ranked first in every list.
+    """
+    rrf_k = rrf_k or _rrf_k()
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking):
+            key = doc.metadata.get('chunk_id') or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(key, doc)
+
+    best_possible = len(rankings) / (rrf_k + 1)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [(docs[key], 1.0 - score / best_possible) for key, score in fused]
+
+
+def retrieve_chunks_with_scores(question: str, document_names=None, k: int = None,
+                                per_document_k: int = None, vectorstore=None):
+    """
+    Retrieve chunks relevant to the question, scoped to the given documents.
+
+    A single document is searched with k results. Several documents are each searched
+    with per_document_k results and merged by distance. Without any document names the
+    whole collection is searched. With RETRIEVAL_HYBRID (default off) vector hits are
+    fused with BM25 hits from the lexical index. Returns (Document, distance) pairs,
+    closest first.
+    """
+    vectorstore = vectorstore or get_vectorstore()
+
+    # Embed the question once and reuse the vector for every scoped search
+    with span('query_embedding'):
+        query_embedding = vectorstore.embeddings.embed_query(question)
+
+    return search_by_vector(
+        query_embedding, document_names, k, per_document_k, vectorstore,
+        question=question if _hybrid_enabled() else None
+    )
+
+
+def search_by_vector(query_embedding, document_names=None, k: int = None,
+                     per_document_k: int = None, vectorstore=None, question: str = None,
+                     lexical_index=None):
+    """
+    Run the scoped similarity search for an already embedded question. When the
+    question text is given too, each search fetches RETRIEVAL_HYBRID_CANDIDATES
+    hits from the vector store and from the lexical index and keeps the best of
+    their reciprocal rank fusion. Returns (Document, distance) pairs, closest first.
+    """
+    vectorstore = vectorstore or get_vectorstore()
+    if question is not None:
+        lexical_index = lexical_index or get_lexical_index()
+
+    results = []
+    for document_name, n_results in _scoped_searches(document_names, k or _default_k(),
+                                                      per_document_k or _per_document_k()):
+        fetch = n_results if question is None else max(n_results, _hybrid_candidates())
+        with span('vector_search'):
+            pairs = vectorstore.similarity_search_by_vector_with_relevance_scores(
+                query_embedding,
+                k=fetch,
+                filter=_document_filter(document_name) if document_name else None
+            )
+        if question is not None:
+            with span('lexical_search'):
+                lexical_pairs = lexical_index.search(question, fetch, document_name)
+            pairs = reciprocal_rank_fusion([pairs, lexical_pairs], limit=n_results)
+        results.extend(pairs)
+
+    results.sort(key=lambda pair: pair[1])
+    return results
+
+
+def retrieve_chunks_batch(questions, document_names_list, k: int = None,
+                          per_document_k: int = None, vectorstore=None):
+    """
+    Batched retrieve_chunks_with_scores: all questions are embedded in one call and
+    searched together. document_names_list holds the target documents of each question.
+    Returns one list of (Document, distance) pairs per question.
+    """
+    vectorstore = vectorstore or get_vectorstore()
+    questions = list(questions)
+
+    with span('query_embedding'):
+        query_embeddings = vectorstore.embeddings.embed_queries(questions)
+
+    return search_by_vectors(
+        query_embeddings, document_names_list, k, per_document_k, vectorstore,
+        questions=questions if _hybrid_enabled() else None
+    )
+
+
+def search_by_vectors(query_embeddings, document_names_list, k: int = None,
+                      per_document_k: int = None, vectorstore=None, questions=None,
+                      lexical_index=None):
+    """
+    Batched search_by_vector. Questions that search the same document with the same
+    k share one vector store query. When the question texts are given, each
+    question's hits are fused with its lexical hits as in search_by_vector.
+    """
+    vectorstore = vectorstore or get_vectorstore()
+    k = k or _default_k()
+    per_document_k = per_document_k or _per_document_k()
+    if questions is not None:
+        lexical_index = lexical_index or get_lexical_index()
+
+    # (document name or None, k) -> indexes of the questions running that search
+    searches = {}
+    for index, document_names in enumerate(document_names_list):
+        for search in _scoped_searches(document_names, k, per_document_k):
+            searches.setdefault(search, []).append(index)
+
+    results = [[] for _ in query_embeddings]
+    for (document_name, n_results), indexes in searches.items():
+        fetch = n_results if questions is None else max(n_results, _hybrid_candidates())
+        with span('vector_search'):
+            hits = similarity_search_by_vectors(
+                vectorstore,
+                [query_embeddings[index] for index in indexes],
+                k=fetch,
+                filter=_document_filter(document_name) if document_name else None
+            )
+        for index, pairs in zip(indexes, hits):
+            if questions is not None:
+                with span('lexical_search'):
+                    lexical_pairs = lexical_index.search(questions[index], fetch, document_name)
+                pairs = reciprocal_rank_fusion([pairs, lexical_pairs], limit=n_results)
+            results[index].extend(pairs)
+
+    for pairs in results:
+        pairs.sort(key=lambda pair: pair[1])
+    return results
+
+
+def retrieve_chunks(question: str, document_names=None, k: int = None,
+                    per_document_k: int = None, vectorstore=None):
+    """
+    Same as retrieve_chunks_with_scores but returns only the documents
+    """
+    return [doc for doc, _ in retrieve_chunks_with_scores(
+        question, document_names, k, per_document_k, vectorstore
+    )]
@@ -0,0 +1,224 @@
+import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+# Server processes sharing one Ollama; set by the gunicorn post_fork hook
+_worker_count = 1
+
+
+def _worker_share(total: int):
+    """
+    This process's part of a server-wide limit, at least 1 when the limit is positive
+    """
+    if total <= 0:
+        return 0
+    if _worker_count > total:
+        print(f"WARNING: {_worker_count} workers share a limit of {total}; each worker still gets 1, "
+              f"so up to {_worker_count} can run at once")
+    return max(1, total // _worker_count)
+
+
+class SchedulerOverloaded(Exception):
+    """
+    Raised when a request cannot get an LLM slot within the wait queue limits
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class LLMScheduler:
+    """
+    Admission control and single-flight coalescing in front of Ollama.
+
+    At most max_concurrency generations run at once. Up to max_queue further
+    requests wait for a slot, each for at most max_wait seconds; beyond that
+    requests fail fast with SchedulerOverloaded. Identical prompts already being
+    generated are not sent again, their callers wait for the running generation.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_queue: int = None, max_wait: float = None):
+        # OLLAMA_MAX_CONCURRENCY and OLLAMA_MAX_QUEUE are server-wide; each worker process gets its share
+        self.max_concurrency = max_concurrency or _worker_share(int(os.getenv('OLLAMA_MAX_CONCURRENCY', '2')))
+        self.max_queue = max_queue if max_queue is not None else _worker_share(int(os.getenv('OLLAMA_MAX_QUEUE', '8')))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('OLLAMA_QUEUE_TIMEOUT', '30'))
+
+        self._slots = threading.Semaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {
+            'active': 0,
+            'queue_depth': 0,
+            'admitted': 0,
+            'rejected': 0,
+            'coalesced': 0,
+            'total_coalesced_wait_time': 0.0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'total_generation_time': 0.0,
+            'generations': 0
+        }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        admitted = stats['admitted'] or 1
+        stats['avg_wait_time'] = stats['total_wait_time'] / admitted
+        stats['avg_generation_time'] = stats['total_generation_time'] / (stats['generations'] or 1)
+        stats['max_concurrency'] = self.max_concurrency
+        stats['max_queue'] = self.max_queue
+        stats['workers'] = _worker_count
+        return stats
+
+    def _retry_after(self):
+        # Roughly the time for the current queue to drain, at least one second
+        with self._lock:
+            generations = self._stats['generations']
+            avg_generation = self._stats['total_generation_time'] / generations if generations else self.max_wait
+            backlog = self._stats['queue_depth'] + self._stats['active']
+        return max(1, int(avg_generation * backlog / self.max_concurrency))
+
+    def _acquire(self):
+        wait_start = time.time()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._stats['queue_depth'] >= self.max_queue:
+                    self._stats['rejected'] += 1
+                    full = True
+                else:
+                    self._stats['queue_depth'] += 1
+                    full = False
+            if full:
+                raise SchedulerOverloaded('LLM queue is full, retry later', self._retry_after())
+
+            acquired = self._slots.acquire(timeout=self.max_wait)
+            with self._lock:
+                self._stats['queue_depth'] -= 1
+                if not acquired:
+                    self._stats['rejected'] += 1
+            if not acquired:
+                raise SchedulerOverloaded('Timed out waiting for an LLM slot', self._retry_after())
+
+        wait_time = time.time() - wait_start
+        with self._lock:
+            self._stats['active'] += 1
+            self._stats['admitted'] += 1
+            self._stats['total_wait_time'] += wait_time
+            self._stats['max_wait_time'] = max(self._stats['max_wait_time'], wait_time)
+        return wait_time
+
+    def _release(self, generation_time: float):
+        with self._lock:
+            self._stats['active'] -= 1
+            self._stats['generations'] += 1
+            self._stats['total_generation_time'] += generation_time
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold one LLM slot for the duration of the block. Yields the time spent waiting.
+        """
+        wait_time = self._acquire()
+        start = time.time()
+        try:
+            yield wait_time
+        finally:
+            self._release(time.time() - start)
+
+    def acquire_slot(self):
+        """
+        Take an LLM slot and return an idempotent release callable, for callers
+        whose generation outlives the current stack frame (streaming responses)
+        """
+        self._acquire()
+        start = time.time()
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self._release(time.time() - start)
+
+        return release
+
+    def run(self, prompt: str, generate):
+        """
+        Run generate(prompt) under admission control. Concurrent calls with the same
+        prompt share one generation. Returns (result, metadata); queue_wait_time is
+        the time spent waiting for a slot, coalesced_wait_time the time a follower
+        waited for the generation it shares.
+        """
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InflightCall()
+                self._inflight[key] = call
+            else:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            wait_start = time.time()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # A follower never queued for a slot; its wait is the leader's generation
+            coalesced_wait_time = time.time() - wait_start
+            with self._lock:
+                self._stats['total_coalesced_wait_time'] += coalesced_wait_time
+            return call.result, {
+                'coalesced': True, 'queue_wait_time': 0.0, 'coalesced_wait_time': coalesced_wait_time
+            }
+
+        try:
+            with self.slot() as wait_time:
+                call.result = generate(prompt)
+            return call.result, {'coalesced': False, 'queue_wait_time': wait_time, 'coalesced_wait_time': 0.0}
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def set_worker_count(workers: int):
+    """
+    Tell the scheduler how many server processes share Ollama, so the limits are
+    divided between them. Drops a scheduler created with the previous count.
+    """
+    global _worker_count, _scheduler
+    _worker_count = max(1, int(workers))
+    _scheduler = None
+
+
+def get_llm_scheduler():
+    """
+    Return the process-wide LLM scheduler
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
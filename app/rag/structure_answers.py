@@ -0,0 +1,182 @@
+import re
+from utils.metrics import registry
+
+structure_answers = registry.counter(
+    'app_structure_answers_total',
+    'Questions answered from the document structure index without retrieval or the LLM'
+)
+
+# Questions that ask for an interpretation rather than a structural fact go to the RAG chain
+_NEEDS_LLM = re.compile(
+    r'\b(why|explain|summari[sz]e|summary|compare|comparison|difference|mean|means|meaning|'
+    r'about|discuss|describe|opinion|evaluate|critique|translate)\b'
+)
+
+# Words that carry no structural meaning: the request phrasing ("can you give me"),
+# references to the document itself ("of the paper") and auxiliaries. They are
+# dropped before a question is matched, so only its core phrase is left.
+_FILLER = frozenset("""
+a all an are article can could did do doc document does exactly file find for from get give has
+have in is it its list me of on paper pdf please print quote read reads return say says show
+tell that the there this to very was were what which would you
+""".split())
+
+# The core phrase of a question must be exactly one of these, so "first line of
+# table 2" or "sections that use dropout" (a noun followed by a verb or anything
+# else but a document reference) are not structural
+_INTENTS = (
+    ('first_sentence', re.compile(r'(opening|first) sentence')),
+    ('first_line', re.compile(r'(opening|first) line')),
+    ('page_count', re.compile(r'how many pages( long| total)?|number pages|page count|how long pages')),
+    ('headings', re.compile(r'(section )?(headings|titles|names)|sections|table contents|outline|structure')),
+    ('abstract', re.compile(r'abstract')),
+    ('title', re.compile(r'title|name|called|titled')),
+)
+
+# "which page does section 3 start on", "page number of the introduction"
+_HEADING_PAGE = re.compile(r'\b(which|what) page\b|\bpage number\b|\bwhere\b.*\b(start|begin)s?\b')
+_HEADING_PAGE_WORDS = frozenset(
+    'which what where page number start starts begin begins appear appears located found at'.split()
+)
+
+# A numbered part of the document: "table 2", "fig. 3", "appendix b"
+_PART_OF_DOCUMENT = re.compile(
+    r'\b(table|figure|fig|section|chapter|appendix|equation|eq|algorithm)\.?(\s*\d+(\.\d+)*|\s+([ivx]+|[a-z]))\b'
+)
+
+
+def _strip_document_names(question: str, document_names):
+    text = question.lower()
+    for name in document_names:
+        text = text.replace(name.lower(), ' ')
+        stem = name.lower().rsplit('.', 1)[0]
+        if stem:
+            text = re.sub(rf'\b{re.escape(stem)}\b', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _words(text: str):
+    """
+    Lowercased words of a question, with possessives dropped and section numbers kept whole
+    """
+    return re.findall(r'[a-z0-9]+(?:\.[a-z0-9]+)*', re.sub(r"'s\b", '', text))
+
+
+def _core_phrase(text: str, ignored=_FILLER):
+    return ' '.join(word for word in _words(text) if word not in ignored)
+
+
+def _heading_phrase(text: str):
+    """
+    What a heading_page question names: "section 3", "3" or a heading title
+    """
+    phrase = _core_phrase(text, _FILLER | _HEADING_PAGE_WORDS)
+    # "the related work section" names the heading "related work"
+    return re.sub(r'\s*\bsection\b(?!\s+\d)\s*', ' ', phrase).strip()
+
+
+def classify_structural_question(question: str, document_names=()):
+    """
+    Return the structural intent of a question, or None when the question needs
+    retrieval and generation
+    """
+    text = _strip_document_names(question, document_names)
+    if _NEEDS_LLM.search(text):
+        return None
+
+    if _HEADING_PAGE.search(text):
+        phrase = _heading_phrase(text)
+        # Only section headings have a recorded page; "which page mentions figure 4" is a content question
+        if phrase and len(phrase.split()) <= 8 and not _PART_OF_DOCUMENT.search(re.sub(r'^section ', '', phrase)):
+            return 'heading_page'
+        return None
+
+    # "the title of table 2" or "the first line of section 3" is not about the document itself
+    if _PART_OF_DOCUMENT.search(text):
+        return None
+
+    core = _core_phrase(text)
+    for intent, pattern in _INTENTS:
+        if pattern.fullmatch(core):
+            return intent
+    return None
+
+
+def _find_heading(text: str, headings):
+    """
+    The heading a question names, by section number or by its exact title
+    """
+    phrase = _heading_phrase(text)
+    match = re.fullmatch(r'(section )?(?P<number>\d+(\.\d+)*|[ivx]+)', phrase)
+    if match:
+        number = match.group('number')
+        return next((heading for heading in headings if (heading.get('number') or '').lower() == number), None)
+    for heading in headings:
+        if _core_phrase(heading['title'].lower()) == phrase:
+            return heading
+    return None
+
+
+def _format_heading(heading):
+    number = f"{heading['number']} " if heading.get('number') else ''
+    return f"{number}{heading['title']} (page {heading['page']})"
+
+
+def _answer_one(intent: str, text: str, structure: dict):
+    """
+    Return (answer, page) for one document, or None when the record lacks the field
+    """
+    if intent in ('first_sentence', 'first_line', 'title', 'abstract'):
+        value = structure.get(intent)
+        return (value, 1) if value else None
+
+    if intent == 'page_count':
+        page_count = structure.get('page_count')
+        return (f"{page_count} pages", None) if page_count else None
+
+    headings = structure.get('headings') or []
+    if intent == 'heading_page':
+        heading = _find_heading(text, headings)
+        return (_format_heading(heading), heading['page']) if heading else None
+
+    if intent == 'headings':
+        if not headings:
+            return None
+        return '\n'.join(_format_heading(heading) for heading in headings), None
+
+    return None
+
+
+def answer_structural_question(question: str, document_names, catalog: dict):
+    """
+    Answer a structural question (first line or sentence, title, abstract,
+    section headings, the page a section starts on, page count) from the
+    structural records stored in the catalog. Returns (result, intent) with the
+    same result shape as the RAG chain, or None when the question is not
+    structural or a document has no record of the requested field, in which
+    case the caller falls back to the RAG chain.
+    """
+    intent = classify_structural_question(question, document_names)
+    if intent is None:
+        return None
+
+    text = _strip_document_names(question, document_names)
+    answers = []
+    citations = []
+    for document_name in document_names:
+        structure = (catalog.get(document_name) or {}).get('structure')
+        answer = _answer_one(intent, text, structure) if structure else None
+        if answer is None:
+            return None
+        value, page = answer
+        answers.append((document_name, value))
+        citations.append({'document_name': document_name, 'chunk_id': '', 'page': page or '', 'confidence': 1.0})
+
+    if len(answers) == 1:
+        answer = answers[0][1]
+    else:
+        answer = '\n\n'.join(f"{document_name}:\n{value}" for document_name, value in answers)
+
+    structure_answers.inc(intent=intent)
+    return {'answer': answer, 'citations': citations}, intent
+
@@ -0,0 +1,140 @@
+import threading
+from collections import deque
+
+
+def get_name_variants(document_name: str):
+    """
+    Return the normalized forms of a document name that may appear in a question
+    """
+    name_lower = document_name.lower()
+    # Remove file extension for comparison
+    name_without_ext = name_lower.replace('.pdf', '').replace('.txt', '')
+
+    variants = {
+        name_lower,
+        name_without_ext,
+        name_without_ext.replace('_', ' '),
+        name_without_ext.replace('-', ' ')
+    }
+    return [variant for variant in variants if variant.strip()]
+
+
+class DocumentNameMatcher:
+    """
+    Aho-Corasick automaton over the name variants of every known document.
+    Finds all mentioned documents in a single pass over the question.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output_link = [0]
+        self._outputs = [[]]  # (pattern length, document name) for patterns ending at a node
+        self._documents = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def __contains__(self, document_name):
+        return document_name in self._documents
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add_document(self, document_name: str):
+        """
+        Add a document's name variants to the automaton. Failure links are
+        recomputed lazily on the next search.
+        """
+        with self._lock:
+            if document_name in self._documents:
+                return
+            self._documents.add(document_name)
+            for variant in get_name_variants(document_name):
+                self._insert(variant, document_name)
+            self._dirty = True
+
+    def _insert(self, pattern: str, document_name: str):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output_link.append(0)
+                self._outputs.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+
+        entry = (len(pattern), document_name)
+        if entry not in self._outputs[node]:
+            self._outputs[node].append(entry)
+
+    def _build_links(self):
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        output_link = self._output_link
+
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            output_link[child] = 0
+            queue.append(child)
+
+        # Breadth-first so every failure target is final before it is used
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                target = fail[child]
+                output_link[child] = target if outputs[target] else output_link[target]
+
+        self._dirty = False
+
+    def find_matches(self, text: str):
+        """
+        Return every (document_name, start, end) occurrence of a name variant in the text
+        """
+        text = text.lower()
+        matches = []
+
+        with self._lock:
+            if self._dirty:
+                self._build_links()
+
+            goto, fail, outputs = self._goto, self._fail, self._outputs
+            output_link = self._output_link
+
+            node = 0
+            for position, char in enumerate(text):
+                while node and char not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(char, 0)
+
+                state = node if outputs[node] else output_link[node]
+                while state:
+                    for length, document_name in outputs[state]:
+                        matches.append((document_name, position - length + 1, position + 1))
+                    state = output_link[state]
+
+        return matches
+
+    def find_documents(self, text: str):
+        """
+        Return the documents mentioned in the text, in order of appearance.
+        Where matches overlap the longest one wins.
+        """
+        selected = []
+        for document_name, start, end in sorted(self.find_matches(text), key=lambda m: (m[1] - m[2], m[1])):
+            overlaps = any(
+                start < s_end and s_start < end and (start, end) != (s_start, s_end)
+                for _, s_start, s_end in selected
+            )
+            if not overlaps:
+                selected.append((document_name, start, end))
+
+        selected.sort(key=lambda m: m[1])
+        return list(dict.fromkeys(document_name for document_name, _, _ in selected))
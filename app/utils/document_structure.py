@@ -0,0 +1,116 @@
+import re
+
+# Unnumbered lines that are section headings in most papers
+KNOWN_HEADINGS = (
+    'abstract', 'introduction', 'background', 'related work', 'method', 'methods', 'methodology',
+    'approach', 'experiments', 'experimental setup', 'evaluation', 'results', 'discussion',
+    'limitations', 'conclusion', 'conclusions', 'future work', 'acknowledgments',
+    'acknowledgements', 'references', 'bibliography', 'appendix'
+)
+
+# "3 Method", "2.1. Datasets", "IV. RESULTS": a section number followed by a short capitalized title
+_NUMBERED_HEADING = re.compile(
+    r'^(?P<number>(?:\d{1,2}(?:\.\d{1,2}){0,2}|[IVX]{1,5})\.?)\s+(?P<title>[A-Z][^\n]{1,79})$'
+)
+_ABSTRACT_START = re.compile(r'^\s*abstract\b[\s.:—–-]*', re.IGNORECASE)
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9])')
+
+MAX_HEADINGS = 200
+MAX_ABSTRACT_CHARS = 3000
+MAX_SENTENCE_CHARS = 500
+# The title, first line and abstract are looked for on the first pages only
+FRONT_MATTER_PAGES = 2
+
+
+def _heading(line: str):
+    """
+    Return (number, title) when the line looks like a section heading, else None
+    """
+    if line.lower().rstrip(':') in KNOWN_HEADINGS:
+        return '', line.rstrip(':')
+    match = _NUMBERED_HEADING.match(line)
+    if not match:
+        return None
+    title = match.group('title').strip()
+    # Headings are short and are not sentences; table rows and numbered list items often are
+    if len(title.split()) > 10 or title.endswith(('.', ',', ';')) or not re.search(r'[a-z]{3}', title.lower()):
+        return None
+    if sum(char.isdigit() for char in title) > len(title) // 3:
+        return None
+    return match.group('number').rstrip('.'), title
+
+
+class DocumentStructureBuilder:
+    """
+    Builds a document's structural record from its pages as they stream past
+    during ingestion: title, first line and sentence, abstract, section
+    headings with their (1-based) page numbers, and page count.
+    """
+
+    def __init__(self, total_pages: int = None):
+        self.total_pages = total_pages
+        self.title = None
+        self.first_line = None
+        self.front_text = []
+        self.headings = []
+        self._metadata_title = None
+
+    def add_page(self, page):
+        page_number = page.metadata.get('page', 0)
+        lines = [line.strip() for line in page.page_content.splitlines() if line.strip()]
+
+        if page_number == 0:
+            self._metadata_title = str(page.metadata.get('title') or '').strip() or None
+        if self.first_line is None and lines:
+            self.first_line = lines[0]
+            # A PDF title field is often empty or a file name; then the first substantial line is the title
+            self.title = next((line for line in lines[:5] if len(line.split()) >= 2), lines[0])
+        if page_number < FRONT_MATTER_PAGES:
+            self.front_text.extend(lines)
+
+        for line in lines:
+            if len(self.headings) >= MAX_HEADINGS:
+                break
+            heading = _heading(line)
+            if heading:
+                number, title = heading
+                self.headings.append({
+                    'number': number,
+                    'title': title,
+                    'page': page_number + 1,
+                    'page_label': page.metadata.get('page_label', str(page_number + 1))
+                })
+
+    def _abstract(self):
+        for index, line in enumerate(self.front_text):
+            match = _ABSTRACT_START.match(line)
+            if not match:
+                continue
+            parts = [line[match.end():]] if line[match.end():] else []
+            for following in self.front_text[index + 1:]:
+                if _heading(following) or following.lower().startswith(('keywords', 'index terms')):
+                    break
+                parts.append(following)
+                if sum(len(part) for part in parts) >= MAX_ABSTRACT_CHARS:
+                    break
+            abstract = re.sub(r'-\s+(?=[a-z])', '', ' '.join(parts)).strip()
+            return abstract[:MAX_ABSTRACT_CHARS] or None
+        return None
+
+    def build(self):
+        metadata_title = self._metadata_title
+        if metadata_title and (metadata_title.lower().endswith(('.pdf', '.doc', '.docx', '.tex'))
+                               or metadata_title.lower() in ('untitled', 'title')):
+            metadata_title = None
+
+        first_text = ' '.join(self.front_text[:40])
+        first_sentence = _SENTENCE_END.split(first_text, maxsplit=1)[0][:MAX_SENTENCE_CHARS] if first_text else None
+
+        return {
+            'title': metadata_title or self.title,
+            'first_line': self.first_line,
+            'first_sentence': first_sentence,
+            'abstract': self._abstract(),
+            'headings': self.headings,
+            'page_count': self.total_pages
+        }
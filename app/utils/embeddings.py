@@ -1,15 +1,60 @@
 import os
+import threading
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from utils.metrics import span
+from utils.query_embedding_cache import CachedQueryEmbeddings
 
-def get_embeddings_model():
+# Process-wide registry of loaded embedding models, keyed by (backend, model_name, device)
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _embedding_backend():
+    return os.getenv('EMBEDDING_BACKEND', 'huggingface').lower()
+
+
+def get_embeddings_model(model_name: str = None, device: str = None):
+    """
+    Return the shared embeddings model for the given model name and device.
+    The weights are loaded once per process and the same instance is reused by every caller.
+    EMBEDDING_BACKEND selects PyTorch through HuggingFace (default) or the int8 ONNX export.
+    Query vectors are served from the process-wide query embedding cache.
+    """
+    model_name = model_name or os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    device = device or os.getenv('EMBEDDING_DEVICE', 'cpu')
+    backend = _embedding_backend()
+    key = (backend, model_name, device)
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with span('embedding_model_acquisition'), _models_lock:
+        # Another thread may have loaded the model while we were waiting for the lock
+        model = _models.get(key)
+        if model is None:
+            print(f"DEBUG: Loading embedding model: {model_name} on {device} ({backend})")
+            if backend == 'onnx':
+                from utils.onnx_embeddings import OnnxEmbeddings
+                model = OnnxEmbeddings(model_name)
+            elif backend == 'huggingface':
+                model = HuggingFaceEmbeddings(
+                    model_name=model_name,
+                    model_kwargs={'device': device}
+                )
+            else:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+            model = CachedQueryEmbeddings(model, f"{backend}:{model_name}")
+            _models[key] = model
+
+    return model
+
+
+def warm_up_embeddings_model(model_name: str = None, device: str = None):
     """
-    Initialize and return HuggingFace embeddings model
+    Load the embeddings model into the registry and run one encode so the first
+    request does not pay for weight loading and lazy initialization.
     """
-    model_name = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
-    
-    print(f"DEBUG: Using embedding model: {model_name}")
-    
-    return HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs={'device': 'cpu'}
-    )
+    model = get_embeddings_model(model_name, device)
+    model.embed_documents(["warm-up"])
+    return model
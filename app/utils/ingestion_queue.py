@@ -0,0 +1,375 @@
+import os
+import time
+import uuid
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database.mongo_client import (
+    insert_pdf_record, insert_log_record, insert_job_record,
+    update_job_record, get_unfinished_job_records, claim_job_record, renew_job_leases,
+    acquire_document_lock, renew_document_lock, release_document_lock
+)
+from database.document_catalog import record_document_upload, find_indexed_document
+from utils.pdf_processor import process_pdf, hash_file
+from rag.answer_cache import get_answer_cache
+from utils.metrics import start_trace, get_current_trace
+
+
+def _new_worker_id():
+    return f"{os.getpid()}-{uuid.uuid4().hex}"
+
+
+# Owner of the jobs this process runs. A forked worker must call set_worker_id(),
+# or it would share the id of the master and of every other worker.
+WORKER_ID = _new_worker_id()
+
+
+def set_worker_id():
+    """
+    Give this process its own job owner id; called after each fork
+    """
+    global WORKER_ID
+    WORKER_ID = _new_worker_id()
+    return WORKER_ID
+
+
+def _lease_seconds():
+    return float(os.getenv('INGESTION_JOB_LEASE_SECONDS', '120'))
+
+
+def _lease_expiry():
+    """
+    A job's owner renews its lease while the job is queued or running; once it
+    expires (the worker died), any other worker may claim the job
+    """
+    return time.time() + _lease_seconds()
+
+
+def _wait_for_document(document_name, job_id):
+    """
+    Block until this job holds the lease on its document name. Every job deletes
+    the chunks of its document that it did not write, so two jobs for the same
+    name, in this or another worker, must not run at the same time.
+    """
+    delay = 0.5
+    while not acquire_document_lock(document_name, job_id, _lease_expiry(), time.time()):
+        time.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
+
+class IngestionQueueFull(Exception):
+    """
+    Raised when the ingestion queue has no free slot for a new job
+    """
+    pass
+
+
+def _store_upload(filepath, stored_path):
+    """
+    Move a staged upload to its stored path once its job is done reading it, so
+    a later upload of the same name never rewrites a file a job is still reading.
+    Returns the path the file now has.
+    """
+    if not stored_path or stored_path == filepath:
+        return filepath
+    os.replace(filepath, stored_path)
+    try:
+        os.rmdir(os.path.dirname(filepath))
+    except OSError:
+        pass
+    return stored_path
+
+
+def _discard_upload(filepath, stored_path):
+    """
+    Delete a staged upload whose job failed; the previously stored file stays as it was
+    """
+    if not stored_path or stored_path == filepath:
+        return
+    try:
+        os.remove(filepath)
+        os.rmdir(os.path.dirname(filepath))
+    except OSError:
+        pass
+
+
+class IngestionQueue:
+    """
+    Bounded worker pool that indexes uploaded PDFs outside the request thread.
+    Job state is persisted in the MongoDB ingestion_jobs collection.
+    """
+
+    def __init__(self, max_workers: int = None, max_queued: int = None):
+        self.max_workers = max_workers or int(os.getenv('INGESTION_WORKERS', '2'))
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv('INGESTION_QUEUE_SIZE', '16'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingestion')
+        # One slot per running or waiting job; submit fails fast when none is free
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queued)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        # Renews the leases of this worker's jobs and takes over jobs of dead workers
+        self._stopped = threading.Event()
+        self._lease_thread = threading.Thread(target=self._maintain_leases, name='ingestion-leases', daemon=True)
+        self._lease_thread.start()
+
+    @property
+    def pending_jobs(self):
+        return self._pending
+
+    def has_capacity(self):
+        """
+        Whether a job submitted now would find a free slot. Advisory only: submit
+        can still raise IngestionQueueFull when other requests take the last slots.
+        """
+        return self._pending < self.max_workers + self.max_queued
+
+    def submit(self, filename: str, filepath: str, chroma_dir: str = None, stored_path: str = None):
+        """
+        Create a job record and schedule it. Raises IngestionQueueFull when the queue is full.
+        With stored_path, filepath is a staged upload that is moved to stored_path
+        once the job is done reading it, and deleted when the job fails.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise IngestionQueueFull('Ingestion queue is full, retry later')
+
+        try:
+            job_id = uuid.uuid4().hex
+            insert_job_record({
+                'job_id': job_id,
+                'filename': filename,
+                'filepath': filepath,
+                'stored_path': stored_path or filepath,
+                'chroma_dir': chroma_dir,
+                'owner_id': WORKER_ID,
+                'lease_expires_at': _lease_expiry(),
+                'state': 'queued',
+                'progress': {'pages_processed': 0, 'total_pages': None, 'chunks_embedded': 0},
+                'queued_at': datetime.datetime.utcnow().isoformat(),
+                'started_at': None,
+                'finished_at': None,
+                'timings': {},
+                'result': None,
+                'error': None
+            })
+            self._schedule(job_id, filename, filepath, chroma_dir, stored_path)
+        except Exception:
+            self._slots.release()
+            raise
+
+        return job_id
+
+    def _schedule(self, job_id, filename, filepath, chroma_dir, stored_path=None):
+        with self._pending_lock:
+            self._pending += 1
+        self._executor.submit(self._run_job, job_id, filename, filepath, chroma_dir, stored_path, time.time())
+
+    def resume(self, job):
+        """
+        Re-schedule a job whose owner stopped renewing its lease: a worker that died
+        or a previous server run. Returns False when another worker took the job over
+        first, or when its file is gone, in which case the job is marked failed.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise IngestionQueueFull('Ingestion queue is full, retry later')
+        if claim_job_record(job['job_id'], WORKER_ID, _lease_expiry(), time.time()) is None:
+            self._slots.release()
+            return False
+        if not os.path.exists(job.get('filepath', '')):
+            self._slots.release()
+            update_job_record(job['job_id'], {
+                'state': 'failed',
+                'finished_at': datetime.datetime.utcnow().isoformat(),
+                'error': 'Uploaded file no longer exists'
+            })
+            return False
+        update_job_record(job['job_id'], {'state': 'queued'})
+        self._schedule(job['job_id'], job['filename'], job['filepath'], job.get('chroma_dir'), job.get('stored_path'))
+        return True
+
+    def _maintain_leases(self):
+        interval = max(_lease_seconds() / 3, 1.0)
+        while not self._stopped.wait(interval):
+            try:
+                if self._pending:
+                    renew_job_leases(WORKER_ID, _lease_expiry())
+                resume_unfinished_jobs(self)
+            except Exception as e:
+                print(f"WARNING: Could not renew ingestion job leases: {e}")
+
+    def _run_job(self, job_id, filename, filepath, chroma_dir, stored_path, queued_time):
+        start_time = time.time()
+        # Trace the job under its own id so log records and stage timings line up
+        start_trace(job_id)
+        locked = False
+
+        def report_progress(progress):
+            lease_expires_at = _lease_expiry()
+            update_job_record(job_id, {'progress': progress, 'lease_expires_at': lease_expires_at})
+            renew_document_lock(filename, job_id, lease_expires_at)
+
+        try:
+            # Stays queued while an earlier job for the same document runs
+            _wait_for_document(filename, job_id)
+            locked = True
+            start_time = time.time()
+            update_job_record(job_id, {
+                'state': 'running',
+                'started_at': datetime.datetime.utcnow().isoformat(),
+                'lease_expires_at': _lease_expiry()
+            })
+
+            if chroma_dir is None:
+                chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
+            content_hash = hash_file(filepath)
+
+            # An identical file is already indexed under this name, nothing to parse or embed
+            indexed = find_indexed_document(filename, content_hash)
+            if indexed:
+                update_job_record(job_id, {
+                    'state': 'completed',
+                    'finished_at': datetime.datetime.utcnow().isoformat(),
+                    'timings': {
+                        'queue_wait_time': start_time - queued_time,
+                        'processing_time': time.time() - start_time
+                    },
+                    'result': {'duplicate': True, 'chunks_processed': indexed.get('chunks', 0)}
+                })
+                _store_upload(filepath, stored_path)
+                insert_log_record({
+                    'timestamp': datetime.datetime.utcnow().isoformat(),
+                    'endpoint': '/pdf/papers',
+                    'method': 'POST',
+                    'status_code': 200,
+                    'message': 'PDF already indexed, skipped',
+                    'additional_data': {
+                        'filename': filename,
+                        'job_id': job_id,
+                        'content_hash': content_hash
+                    }
+                })
+                return
+
+            structure = {}
+            chunk_count = process_pdf(filepath, chroma_dir, progress_callback=report_progress,
+                                      document_hash=content_hash, structure_callback=structure.update)
+            upload_time = datetime.datetime.utcnow().isoformat()
+            filepath = _store_upload(filepath, stored_path)
+
+            # Store metadata in MongoDB
+            record_id = insert_pdf_record({
+                'filename': filename,
+                'filepath': filepath,
+                'chunks': chunk_count,
+                'content_hash': content_hash,
+                'upload_time': upload_time
+            })
+
+            # Update the document catalog read by the query path
+            record_document_upload(filename, chunk_count, upload_time, content_hash, structure)
+
+            # Answers computed from the previous revision are no longer valid
+            get_answer_cache().invalidate_document(filename)
+
+            update_job_record(job_id, {
+                'state': 'completed',
+                'finished_at': datetime.datetime.utcnow().isoformat(),
+                'timings': {
+                    'queue_wait_time': start_time - queued_time,
+                    'processing_time': time.time() - start_time,
+                    'stages': dict(get_current_trace()['stages'])
+                },
+                'result': {'record_id': record_id, 'chunks_processed': chunk_count}
+            })
+
+            insert_log_record({
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'endpoint': '/pdf/papers',
+                'method': 'POST',
+                'status_code': 200,
+                'message': 'PDF uploaded and indexed',
+                'additional_data': {
+                    'filename': filename,
+                    'record_id': record_id,
+                    'job_id': job_id,
+                    'chunks': chunk_count
+                }
+            })
+
+        except Exception as e:
+            _discard_upload(filepath, stored_path)
+            update_job_record(job_id, {
+                'state': 'failed',
+                'finished_at': datetime.datetime.utcnow().isoformat(),
+                'timings': {
+                    'queue_wait_time': start_time - queued_time,
+                    'processing_time': time.time() - start_time
+                },
+                'error': str(e)
+            })
+            insert_log_record({
+                'timestamp': datetime.datetime.utcnow().isoformat(),
+                'endpoint': '/pdf/papers',
+                'method': 'POST',
+                'status_code': 500,
+                'message': f'Error processing PDF: {str(e)}',
+                'additional_data': {'filename': filename, 'job_id': job_id}
+            })
+
+        finally:
+            if locked:
+                release_document_lock(filename, job_id)
+            with self._pending_lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop accepting jobs; with wait, block until queued and running jobs are done
+        """
+        self._executor.shutdown(wait=wait)
+        # Jobs that did not finish keep their lease until it expires, then another worker claims them
+        self._stopped.set()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingestion_queue():
+    """
+    Return the process-wide ingestion queue, creating it on first use
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestionQueue()
+    return _queue
+
+
+def resume_unfinished_jobs(queue=None):
+    """
+    Re-schedule jobs left queued or running by a worker that died or by a previous
+    server run, i.e. jobs whose lease expired. Jobs are claimed atomically, so with
+    several workers each job is resumed by one of them. Jobs whose file is gone are
+    marked failed. Returns the number of resumed jobs.
+    """
+    queue = queue or get_ingestion_queue()
+    resumed = 0
+    for job in get_unfinished_job_records(lease_expired_before=time.time()):
+        if not queue.has_capacity():
+            break
+        try:
+            if queue.resume(job):
+                resumed += 1
+        except IngestionQueueFull:
+            break
+    return resumed
+
+
+def reset_ingestion_queue():
+    """
+    Drop the queue inherited across a fork; its worker threads do not exist in the child
+    """
+    global _queue
+    _queue = None
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+# Per-request trace: trace id plus the time spent in each stage
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _render_counter(name, description, series):
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+    for key, value in sorted(series.items()):
+        lines.append(f"{name}{_format_labels(key)} {value}")
+    return lines
+
+
+def _render_histogram(name, description, buckets, series):
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    for key, values in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(buckets, values['counts']):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {values['count']}")
+        lines.append(f"{name}_sum{_format_labels(key)} {values['sum']}")
+        lines.append(f"{name}_count{_format_labels(key)} {values['count']}")
+    return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(key), value] for key, value in self._values.items()]
+        return {'type': 'counter', 'description': self.description, 'series': series}
+
+    def render(self):
+        with self._lock:
+            series = dict(self._values)
+        return _render_counter(self.name, self.description, series)
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(key), dict(values, counts=list(values['counts']))] for key, values in self._series.items()]
+        return {'type': 'histogram', 'description': self.description, 'buckets': list(self.buckets), 'series': series}
+
+    def render(self):
+        with self._lock:
+            series = {key: dict(values, counts=list(values['counts'])) for key, values in self._series.items()}
+        return _render_histogram(self.name, self.description, self.buckets, series)
+
+
+def _pid_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    Holds counters, histograms and gauge callbacks and renders them in the
+    Prometheus text exposition format.
+
+    Under a multi-process server each worker has its own registry. With
+    enable_multiprocess, every worker writes a snapshot of its registry to a
+    shared directory, and a scrape served by any worker merges all of them:
+    counters and histograms are summed over workers, including workers that
+    have exited, and gauges are reported per live worker with a worker label.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._gauges = []
+        self._lock = threading.Lock()
+        self._directory = None
+        self._snapshot_path = None
+        self._stopped = threading.Event()
+
+    def counter(self, name: str, description: str):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, description)
+            return self._metrics[name]
+
+    def histogram(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, description, buckets)
+            return self._metrics[name]
+
+    def register_gauges(self, prefix: str, description: str, collect):
+        """
+        Register a callable returning a dict of numeric values, exported at scrape
+        time as gauges named <prefix>_<key>
+        """
+        with self._lock:
+            self._gauges.append((prefix, description, collect))
+
+    def _collect_gauges(self):
+        with self._lock:
+            gauges = list(self._gauges)
+        collected = []
+        for prefix, description, collect in gauges:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"WARNING: Could not collect {prefix} metrics: {e}")
+                continue
+            values = {
+                key: value for key, value in values.items()
+                if not isinstance(value, bool) and isinstance(value, (int, float))
+            }
+            collected.append([prefix, description, values])
+        return collected
+
+    def _render_gauges(self, sources):
+        """
+        sources: (labels, collected gauges) pairs, one per process; each gauge is
+        written once with a sample per process
+        """
+        families = {}
+        for labels, gauges in sources:
+            for prefix, description, values in gauges:
+                for key, value in values.items():
+                    family = families.setdefault(f"{prefix}_{key}", (description, []))
+                    family[1].append((labels, value))
+        lines = []
+        for name, (description, samples) in sorted(families.items()):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return lines
+
+    def render(self):
+        if self._directory is not None:
+            return self._render_multiprocess()
+
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.extend(self._render_gauges([((), self._collect_gauges())]))
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self, alive: bool = True):
+        """
+        This process's metrics as a JSON-serializable dict; gauges only while alive
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {
+            'pid': os.getpid(),
+            'metrics': {name: metric.snapshot() for name, metric in metrics.items()},
+            'gauges': self._collect_gauges() if alive else []
+        }
+
+    def write_snapshot(self, alive: bool = True):
+        if self._snapshot_path is None:
+            return
+        temp_path = f"{self._snapshot_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(alive), f)
+        os.replace(temp_path, self._snapshot_path)
+
+    def _flush_periodically(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"WARNING: Could not write metrics snapshot: {e}")
+
+    def enable_multiprocess(self, directory: str, interval: float = None):
+        """
+        Share this process's metrics with the other workers through directory,
+        rewriting its snapshot every interval seconds and on every scrape. Values
+        inherited from the parent process are dropped, or every worker would count them.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+        interval = interval or float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._snapshot_path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        self._stopped.clear()
+        self.write_snapshot()
+        threading.Thread(target=self._flush_periodically, args=(interval,),
+                         name='metrics-snapshot', daemon=True).start()
+
+    def close(self):
+        """
+        Final snapshot of an exiting worker: its counters stay in the totals, its gauges go
+        """
+        self._stopped.set()
+        if self._snapshot_path is not None:
+            self.write_snapshot(alive=False)
+
+    def _render_multiprocess(self):
+        self.write_snapshot()
+        snapshots = []
+        for filename in sorted(os.listdir(self._directory)):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self._directory, filename)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Removed or being replaced by its worker right now
+                continue
+
+        merged = {}
+        gauge_sources = []
+        for snapshot in snapshots:
+            for name, metric in snapshot['metrics'].items():
+                target = merged.setdefault(name, {
+                    'type': metric['type'],
+                    'description': metric['description'],
+                    'buckets': tuple(metric.get('buckets', ())),
+                    'series': {}
+                })
+                for key, value in metric['series']:
+                    key = tuple(tuple(pair) for pair in key)
+                    if metric['type'] == 'counter':
+                        target['series'][key] = target['series'].get(key, 0.0) + value
+                        continue
+                    total = target['series'].get(key)
+                    if total is None:
+                        target['series'][key] = dict(value, counts=list(value['counts']))
+                    else:
+                        total['counts'] = [a + b for a, b in zip(total['counts'], value['counts'])]
+                        total['sum'] += value['sum']
+                        total['count'] += value['count']
+            # A worker that crashed never wrote its final snapshot; its gauges are stale
+            if snapshot['gauges'] and _pid_alive(snapshot['pid']):
+                gauge_sources.append(((('worker', snapshot['pid']),), snapshot['gauges']))
+
+        lines = []
+        for name, metric in sorted(merged.items()):
+            if metric['type'] == 'counter':
+                lines.extend(_render_counter(name, metric['description'], metric['series']))
+            else:
+                lines.extend(_render_histogram(name, metric['description'], metric['buckets'], metric['series']))
+        lines.extend(self._render_gauges(gauge_sources))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    'app_stage_duration_seconds',
+    'Time spent in each query and ingestion stage'
+)
+request_duration = registry.histogram(
+    'app_request_duration_seconds',
+    'HTTP request duration by endpoint'
+)
+requests_total = registry.counter(
+    'app_requests_total',
+    'HTTP requests by endpoint, method and status code'
+)
+
+
+def start_trace(trace_id: str = None):
+    """
+    Begin a trace for the current request and return its id
+    """
+    trace = {'trace_id': trace_id or uuid.uuid4().hex, 'stages': {}}
+    _current_trace.set(trace)
+    return trace['trace_id']
+
+
+def get_current_trace():
+    return _current_trace.get()
+
+
+def get_trace_id():
+    trace = _current_trace.get()
+    return trace['trace_id'] if trace else None
+
+
+def observe_stage(stage: str, seconds: float):
+    """
+    Record time spent in a stage, both in the histogram and in the current trace
+    """
+    stage_duration.observe(seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace['stages'][stage] = trace['stages'].get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time the enclosed block as one stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
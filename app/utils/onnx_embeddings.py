@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_FILE = 'model.onnx'
+QUANTIZED_FILE = 'model.int8.onnx'
+CONFIG_FILE = 'embedding_config.json'
+
+# Sentences used to compare the quantized model against the PyTorch model after export
+PARITY_SAMPLES = (
+    "What is the main contribution of this paper?",
+    "Summarize the methodology used in the experiments.",
+    "The proposed model outperforms the baseline on all three benchmarks.",
+    "Table 2 reports precision, recall and F1 for each dataset.",
+    "We thank the anonymous reviewers for their helpful comments.",
+    "Transformers rely on self-attention to model long-range dependencies in text.",
+    "Results are averaged over five random seeds with standard deviation in parentheses.",
+    "Future work will extend the approach to multilingual corpora.",
+)
+
+
+def _onnx_dir(model_name: str):
+    base = os.getenv('EMBEDDING_ONNX_DIR', '/app/storage/onnx')
+    return os.path.join(base, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+
+
+def _mean_pool(token_embeddings, attention_mask):
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def cosine_agreement(reference, candidate):
+    """
+    Per-row cosine similarity between two sets of embeddings
+    """
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    dot = (reference * candidate).sum(axis=1)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return dot / np.clip(norms, 1e-12, None)
+
+
+def export_quantized_model(model_name: str, output_dir: str = None):
+    """
+    Export a sentence-transformers model to ONNX, quantize its weights to int8
+    with dynamic quantization and record the parity of the result against the
+    PyTorch model. Returns the export directory.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = output_dir or _onnx_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+
+    reference = SentenceTransformer(model_name, device='cpu')
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["export sample"], return_tensors='pt')
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    fp32_path = os.path.join(output_dir, ONNX_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, QUANTIZED_FILE), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+
+    # Match the sentence-transformers pipeline: sequence limit and whether it normalizes
+    config = {
+        'model_name': model_name,
+        'max_seq_length': reference.max_seq_length,
+        'normalize': any(type(module).__name__ == 'Normalize' for module in reference),
+        'input_names': input_names
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), 'w') as f:
+        json.dump(config, f)
+
+    # A local instance, released on return: the export may run in the gunicorn master before it forks
+    quantized = OnnxEmbeddings(model_name, output_dir=output_dir)
+    agreement = cosine_agreement(
+        reference.encode(list(PARITY_SAMPLES)),
+        quantized.embed_documents(list(PARITY_SAMPLES))
+    )
+    config['parity'] = {'min_cosine': float(agreement.min()), 'mean_cosine': float(agreement.mean())}
+    with open(os.path.join(output_dir, CONFIG_FILE), 'w') as f:
+        json.dump(config, f)
+    print(f"DEBUG: Exported {model_name} to {output_dir}, parity {config['parity']}")
+
+    return output_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Int8-quantized ONNX version of a sentence-transformers model, run on
+    onnxruntime. Texts are sorted by length and encoded in batches so each batch
+    pads to similar lengths. The model is exported on first use when no export
+    exists yet.
+
+    The inference session and tokenizer are created on the first encode, not
+    here: the gunicorn master builds the shared model before forking, and an
+    onnxruntime session (and its thread pool) must not cross a fork. Each worker
+    therefore opens its own session, with its own EMBEDDING_ONNX_THREADS.
+    """
+
+    def __init__(self, model_name: str, output_dir: str = None, threads: int = None, batch_size: int = None):
+        self.model_name = model_name
+        self.output_dir = output_dir or _onnx_dir(model_name)
+        self.batch_size = batch_size or int(os.getenv('EMBEDDING_ONNX_BATCH_SIZE', '32'))
+        self.threads = threads
+        self.session = None
+        self.tokenizer = None
+        self._load_lock = threading.Lock()
+
+        if not os.path.exists(os.path.join(self.output_dir, CONFIG_FILE)):
+            export_quantized_model(model_name, self.output_dir)
+
+        with open(os.path.join(self.output_dir, CONFIG_FILE)) as f:
+            self.config = json.load(f)
+
+        parity = self.config.get('parity')
+        min_cosine = float(os.getenv('EMBEDDING_ONNX_MIN_COSINE', '0.99'))
+        if parity and parity['min_cosine'] < min_cosine:
+            print(f"WARNING: ONNX embeddings for {model_name} agree with PyTorch only to cosine "
+                  f"{parity['min_cosine']:.4f}; re-index before switching backends")
+
+    def _load(self):
+        """
+        Open the inference session and tokenizer in the process that encodes
+        """
+        with self._load_lock:
+            if self.session is not None:
+                return
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+
+            threads = self.threads if self.threads is not None else int(os.getenv('EMBEDDING_ONNX_THREADS', '0'))
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self.tokenizer = AutoTokenizer.from_pretrained(self.output_dir)
+            self.session = ort.InferenceSession(
+                os.path.join(self.output_dir, QUANTIZED_FILE),
+                sess_options=options,
+                providers=['CPUExecutionProvider']
+            )
+
+    def _encode_batch(self, texts):
+        if self.session is None:
+            self._load()
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.config['max_seq_length'],
+            return_tensors='np'
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in self.config['input_names']}
+        token_embeddings = self.session.run(['last_hidden_state'], inputs)[0]
+        embeddings = _mean_pool(token_embeddings, encoded['attention_mask'])
+        if self.config['normalize']:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encoded = self._encode_batch([texts[i] for i in batch])
+            if embeddings.shape[1] == 0:
+                embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            embeddings[batch] = encoded
+        return embeddings.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
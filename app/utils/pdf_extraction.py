@@ -0,0 +1,146 @@
+import os
+import atexit
+import threading
+import multiprocessing
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader
+
+# Every task opens the PDF and re-parses shared fonts, so tasks are kept large:
+# about two per worker to even out uneven pages, never fewer than this many pages.
+# Finished tasks wait in memory until the consumer reaches them, so tasks are also
+# capped in size and only a window of IN_FLIGHT_PER_WORKER per worker is submitted.
+MIN_PAGES_PER_TASK = 16
+MAX_PAGES_PER_TASK = 64
+TASKS_PER_WORKER = 2
+IN_FLIGHT_PER_WORKER = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _extract_workers():
+    return int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+
+def _parallel_min_pages():
+    return int(os.getenv('PDF_PARALLEL_MIN_PAGES', '100'))
+
+
+def _clean_metadata(metadata: dict) -> dict:
+    """
+    Normalize PDF document info the way langchain's PyPDFParser does, so chunk
+    metadata keeps the keys it had when pages were loaded with PyPDFLoader
+    """
+    cleaned = {}
+    for key, value in metadata.items():
+        if type(value) not in (str, int):
+            value = str(value)
+        key = key[1:].lower() if key.startswith('/') else key.lower()
+        if key in ('creationdate', 'moddate'):
+            try:
+                cleaned[key] = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                cleaned[key] = value
+        elif isinstance(value, str):
+            cleaned[key] = value.strip()
+        else:
+            cleaned[key] = value
+    return cleaned
+
+
+def document_metadata(reader: PdfReader, file_path: str) -> dict:
+    return _clean_metadata(
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | dict(reader.metadata or {})
+        | {"source": file_path, "total_pages": len(reader.pages)}
+    )
+
+
+def iter_page_range(file_path: str, start: int = 0, end: int = None, reader: PdfReader = None):
+    """
+    Yield (text, metadata) for pages start..end-1. This is the only page
+    extraction code; the serial and parallel paths both go through it, so
+    their output is identical.
+    """
+    reader = reader or PdfReader(file_path)
+    base_metadata = document_metadata(reader, file_path)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    # page_labels is recomputed for the whole document on every access
+    page_labels = reader.page_labels
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        yield text, dict(base_metadata, page=page_number, page_label=page_labels[page_number])
+
+
+def extract_page_range(file_path: str, start: int, end: int):
+    """
+    Process pool task: extract one page range in full
+    """
+    return list(iter_page_range(file_path, start, end))
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: the caller is multi-threaded, and forking it could copy held locks
+                _pool = ProcessPoolExecutor(
+                    max_workers=_extract_workers(),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def iter_pages_parallel(file_path: str, total_pages: int):
+    """
+    Extract page ranges on the process pool and yield pages in page order. At
+    most IN_FLIGHT_PER_WORKER ranges per worker are submitted or waiting to be
+    consumed at a time, so memory stays flat however long the document is.
+    """
+    workers = _extract_workers()
+    pages_per_task = min(MAX_PAGES_PER_TASK,
+                         max(MIN_PAGES_PER_TASK, -(-total_pages // (workers * TASKS_PER_WORKER))))
+    ranges = iter([(start, min(start + pages_per_task, total_pages))
+                   for start in range(0, total_pages, pages_per_task)])
+    pool = _get_pool()
+    in_flight = deque()
+
+    def submit_next():
+        page_range = next(ranges, None)
+        if page_range is not None:
+            in_flight.append(pool.submit(extract_page_range, file_path, *page_range))
+
+    try:
+        for _ in range(workers * IN_FLIGHT_PER_WORKER):
+            submit_next()
+        while in_flight:
+            pages = in_flight.popleft().result()
+            # Refill the window before handing pages to the consumer, so workers stay busy while it embeds
+            submit_next()
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def iter_pdf_pages(file_path: str, total_pages: int = None, parallel: bool = None):
+    """
+    Yield (text, metadata) per page. Documents with at least PDF_PARALLEL_MIN_PAGES
+    pages are extracted on a pool of PDF_EXTRACT_WORKERS processes, smaller ones
+    on the calling thread.
+    """
+    reader = None
+    if total_pages is None:
+        reader = PdfReader(file_path)
+        total_pages = len(reader.pages)
+    if parallel is None:
+        parallel = _extract_workers() > 1 and total_pages >= _parallel_min_pages()
+
+    if parallel:
+        yield from iter_pages_parallel(file_path, total_pages)
+    else:
+        yield from iter_page_range(file_path, reader=reader)
@@ -1,53 +1,263 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
+import time
+import hashlib
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from utils.embeddings import get_embeddings_model
+from langchain_core.documents import Document
+from pypdf import PdfReader
+from database.chroma_client import (
+    get_vectorstore, get_embeddings_by_content_hash, upsert_chunks, delete_stale_chunks
+)
+from database.lexical_index import get_lexical_index
+from utils.metrics import span, observe_stage
+from utils.pdf_extraction import iter_pdf_pages
+from utils.document_structure import DocumentStructureBuilder
 from datetime import datetime
 
-def process_pdf(file_path: str, chroma_dir: str = None) -> int:
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def _embedding_batch_size():
+    return int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+
+
+def get_text_splitter():
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+    )
+
+
+def iter_pages(file_path: str, total_pages: int = None, parallel: bool = None):
     """
-    Process a PDF file and store chunks in ChromaDB
+    Lazily yield one Document per PDF page, in page order. Large documents are
+    extracted page-range-parallel on a process pool (see utils.pdf_extraction).
     """
-    try:
-        # Load PDF
-        loader = PyPDFLoader(file_path)
-        pages = loader.load()
-        
-        # Split into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+    for text, metadata in iter_pdf_pages(file_path, total_pages, parallel):
+        yield Document(page_content=text, metadata=metadata)
+
+
+def iter_chunks(pages, text_splitter=None):
+    """
+    Split a stream of pages into chunks without loading the whole document.
+
+    The last piece of each page is held back and split again together with the
+    next page, so chunks and their overlap run across page boundaries. Each chunk
+    carries the metadata of the page it starts on.
+    """
+    text_splitter = text_splitter or get_text_splitter()
+    carry_text = ''
+    carry_metadata = None
+
+    for page in pages:
+        if not page.page_content:
+            continue
+
+        buffer = f"{carry_text}\n{page.page_content}" if carry_text else page.page_content
+        carry_length = len(carry_text) + 1 if carry_text else 0
+        pieces = text_splitter.split_text(buffer)
+        if not pieces:
+            continue
+
+        search_from = 0
+        starts = []
+        for piece in pieces:
+            start = buffer.find(piece, search_from)
+            start = search_from if start < 0 else start
+            starts.append(start)
+            search_from = start + 1
+
+        for piece, start in zip(pieces[:-1], starts[:-1]):
+            metadata = carry_metadata if start < carry_length else page.metadata
+            yield Document(page_content=piece, metadata=dict(metadata))
+
+        carry_text = pieces[-1]
+        carry_metadata = carry_metadata if starts[-1] < carry_length else page.metadata
+
+    if carry_text:
+        yield Document(page_content=carry_text, metadata=dict(carry_metadata))
+
+
+def iter_batches(items, batch_size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def timed_iter(iterable, timings: dict, key: str):
+    """
+    Yield from iterable, adding the time spent producing each item to timings[key]
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+            return
+        timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+        yield item
+
+
+def get_page_count(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Return the SHA-256 hex digest of a file, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_chunk_id(document_hash: str, chunk_index: int, content_hash: str) -> str:
+    """
+    Deterministic chunk ID, so re-ingesting the same file overwrites the same rows
+    """
+    return f"{document_hash[:16]}-{chunk_index}-{content_hash[:16]}"
+
+
+def iter_document_chunks(pages, document_name: str, document_hash: str, total_pages: int,
+                         upload_time: str = None):
+    """
+    Split a stream of pages into chunks carrying the metadata stored with every
+    chunk: deterministic ID, position, content and document hashes, and the
+    document's name, dates and page count
+    """
+    upload_time = upload_time or datetime.utcnow().isoformat()
+    creation_date = None
+    for chunk_index, chunk in enumerate(iter_chunks(pages)):
+        if creation_date is None:
+            creation_date = str(chunk.metadata.get('creation_date', 'Unknown'))
+        content_hash = hash_text(chunk.page_content)
+        chunk.metadata.update({
+            'chunk_id': make_chunk_id(document_hash, chunk_index, content_hash),
+            'chunk_index': chunk_index,
+            'content_hash': content_hash,
+            'document_hash': document_hash,
+            'document_name': document_name,
+            'upload_time': upload_time,
+            'creation_date': creation_date,
+            'total_pages': total_pages
+        })
+        yield chunk
+
+
+def store_chunk_batch(vectorstore, batch, lexical_index=None):
+    """
+    Embed and upsert a batch of chunks, and add them to the lexical index when
+    one is given. Chunks whose content is already stored reuse the existing
+    vector instead of being embedded again.
+    Returns the number of chunks that had to be embedded.
+    """
+    content_hashes = [chunk.metadata['content_hash'] for chunk in batch]
+    with span('ingest_vector_lookup'):
+        known_embeddings = get_embeddings_by_content_hash(vectorstore, content_hashes)
+
+    missing = [chunk for chunk in batch if chunk.metadata['content_hash'] not in known_embeddings]
+    if missing:
+        with span('ingest_embed'):
+            new_embeddings = vectorstore.embeddings.embed_documents([chunk.page_content for chunk in missing])
+        for chunk, embedding in zip(missing, new_embeddings):
+            known_embeddings[chunk.metadata['content_hash']] = embedding
+
+    with span('ingest_upsert'):
+        upsert_chunks(
+            vectorstore,
+            ids=[chunk.metadata['chunk_id'] for chunk in batch],
+            texts=[chunk.page_content for chunk in batch],
+            embeddings=[known_embeddings[content_hash] for content_hash in content_hashes],
+            metadatas=[chunk.metadata for chunk in batch]
         )
-        chunks = text_splitter.split_documents(pages)
-        
-        # Add metadata to chunks
-        for i, chunk in enumerate(chunks):
-            chunk.metadata.update({
-                'chunk_id': f"chunk_{i}",
-                'document_name': os.path.basename(file_path),
-                'upload_time': datetime.utcnow().isoformat(),
-                'creation_date': str(pages[0].metadata.get('creation_date', 'Unknown')),
-                'total_pages': len(pages)
-            })
-        
-        # Initialize embeddings and vectorstore
-        embedding_model = get_embeddings_model()
-        
+    if lexical_index is not None:
+        with span('ingest_lexical_index'):
+            lexical_index.upsert(
+                [chunk.metadata['chunk_id'] for chunk in batch],
+                [chunk.page_content for chunk in batch],
+                [chunk.metadata for chunk in batch]
+            )
+    return len(missing)
+
+
+def process_pdf(file_path: str, chroma_dir: str = None, progress_callback=None,
+                document_hash: str = None, structure_callback=None) -> int:
+    """
+    Process a PDF file and store chunks in ChromaDB and the lexical index.
+
+    Pages are loaded, split, embedded and written in fixed-size batches, so memory
+    stays flat regardless of document size. Chunk IDs are derived from the file and
+    chunk content hashes, so re-ingestion is an idempotent upsert and chunks left over
+    from a previous revision are removed. progress_callback, if given, is called
+    with a dict of progress counters after every batch. structure_callback, if
+    given, is called once with the document's structural record (see
+    utils.document_structure) after all pages have been read.
+    """
+    try:
+        document_hash = document_hash or hash_file(file_path)
+        total_pages = get_page_count(file_path)
+        document_name = os.path.basename(file_path)
+        upload_time = datetime.utcnow().isoformat()
+        progress = {'pages_processed': 0, 'total_pages': total_pages, 'chunks_embedded': 0, 'chunks_reused': 0}
+        timings = {}
+        structure = DocumentStructureBuilder(total_pages)
+
+        def counted_pages():
+            for page in timed_iter(iter_pages(file_path, total_pages), timings, 'parse'):
+                progress['pages_processed'] += 1
+                structure.add_page(page)
+                yield page
+
         if chroma_dir is None:
             chroma_dir = os.getenv('CHROMA_STORAGE_DIR', '/app/storage/chroma')
-            
-        vectorstore = Chroma(
-            collection_name="pdf_chunks",
-            embedding_function=embedding_model,
-            persist_directory=chroma_dir
+        vectorstore = get_vectorstore(chroma_dir)
+        lexical_index = get_lexical_index(chroma_dir)
+
+        chunk_ids = []
+        chunks = timed_iter(
+            iter_document_chunks(counted_pages(), document_name, document_hash, total_pages, upload_time),
+            timings, 'parse_and_split'
         )
-        
-        # Store chunks in ChromaDB
-        vectorstore.add_documents(chunks)
-        
-        return len(chunks)
-        
+        for batch in iter_batches(chunks, _embedding_batch_size()):
+            chunk_ids.extend(chunk.metadata['chunk_id'] for chunk in batch)
+
+            # Embed and store this batch in ChromaDB
+            embedded = store_chunk_batch(vectorstore, batch, lexical_index)
+
+            progress['chunks_embedded'] += embedded
+            progress['chunks_reused'] += len(batch) - embedded
+            if progress_callback:
+                progress_callback(dict(progress))
+
+        # Page loading happens inside chunk iteration, so splitting is the remainder
+        observe_stage('pdf_parse', timings.get('parse', 0.0))
+        observe_stage('pdf_split', timings.get('parse_and_split', 0.0) - timings.get('parse', 0.0))
+
+        # Drop chunks of a previous revision of this document
+        with span('ingest_cleanup'):
+            delete_stale_chunks(vectorstore, document_name, chunk_ids)
+            lexical_index.delete_stale(document_name, chunk_ids)
+
+        if progress_callback:
+            progress_callback(dict(progress))
+        if structure_callback:
+            structure_callback(structure.build())
+
+        return len(chunk_ids)
+
     except Exception as e:
         raise Exception(f"Error processing PDF: {str(e)}")
@@ -0,0 +1,143 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _cache_bytes():
+    return int(os.getenv('QUERY_EMBEDDING_CACHE_BYTES', str(8 * 1024 * 1024)))
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Unicode-normalize, strip and collapse whitespace. Case is kept, since a
+    cased embedding model gives different vectors for different case.
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query vectors keyed by (model, normalized text), bounded by
+    memory instead of entry count. Vectors are kept as float32 arrays; an
+    entry's size is its vector plus its key text.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = _cache_bytes() if max_bytes is None else max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def _size(key, vector):
+        return vector.nbytes + len(key[1].encode('utf-8'))
+
+    def get(self, model_key: str, text: str):
+        key = (model_key, text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return vector
+
+    def put(self, model_key: str, text: str, embedding):
+        key = (model_key, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        size = self._size(key, vector)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._size(key, previous)
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, old_vector = self._entries.popitem(last=False)
+                self._bytes -= self._size(old_key, old_vector)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model so query vectors come from the shared cache.
+    Document embedding passes straight through; ingestion never repeats a
+    text often enough to be worth caching.
+    """
+
+    def __init__(self, model, model_key: str, cache: QueryEmbeddingCache = None):
+        self.model = model
+        self.model_key = model_key
+        self.cache = cache or get_query_embedding_cache()
+
+    def embed_documents(self, texts):
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts):
+        """
+        Embed several queries, computing only the ones not cached in one batch
+        """
+        texts = [normalize_query_text(text) for text in texts]
+        vectors = [self.cache.get(self.model_key, text) for text in texts]
+
+        # Repeated questions within the batch are embedded once
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.model.embed_documents(missing)))
+            for text, embedding in computed.items():
+                self.cache.put(self.model_key, text, embedding)
+            vectors = [
+                vector if vector is not None else np.asarray(computed[text], dtype=np.float32)
+                for text, vector in zip(texts, vectors)
+            ]
+
+        return [vector.tolist() for vector in vectors]
+
+    def __getattr__(self, name):
+        # Anything else, e.g. model_name or the ONNX config, comes from the wrapped model
+        model = self.__dict__.get('model')
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_embedding_cache():
+    """
+    Return the process-wide query embedding cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryEmbeddingCache()
+    return _cache
@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production serving:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is created once in the gunicorn master (preload_app), so the embedding
+model weights are loaded before the workers fork and shared copy-on-write.
+Per-worker state is set up by the post_fork hook in gunicorn.conf.py.
+"""
+from main import create_app
+
+app = create_app(preload=True)
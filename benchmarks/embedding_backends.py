@@ -0,0 +1,132 @@
+"""
+Compare the PyTorch and int8 ONNX embedding backends.
+
+Chunks are taken from a PDF (default content.pdf) with the app's own splitter.
+Both backends encode the chunks and a set of questions. The report has:
+- documents/s and query latency for each backend
+- cosine agreement between the two backends' vectors
+- cross-backend retrieval overlap: the top-k chunks found with ONNX query
+  vectors against the existing PyTorch-indexed chunks, compared with the
+  PyTorch top-k. Overlap close to 1.0 means the backend can be switched
+  without re-indexing.
+
+    python benchmarks/embedding_backends.py --pdf content.pdf --output embeddings.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'app'))
+
+from utils.pdf_processor import iter_pages, iter_chunks
+from utils.onnx_embeddings import OnnxEmbeddings, cosine_agreement
+
+QUESTIONS = (
+    "What is the main contribution of the paper?",
+    "Which datasets are used for evaluation?",
+    "How is the model trained?",
+    "What are the limitations of the approach?",
+    "What baselines are compared against?",
+    "What is the first sentence of the document?",
+    "Which metrics are reported?",
+    "What future work is proposed?",
+)
+
+
+def load_chunks(pdf_path, limit):
+    chunks = [chunk.page_content for chunk in iter_chunks(iter_pages(pdf_path))]
+    return chunks[:limit] if limit else chunks
+
+
+def time_documents(model, texts, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = model.embed_documents(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return np.asarray(vectors, dtype=np.float32), best
+
+
+def time_queries(model, questions):
+    latencies = []
+    vectors = []
+    for question in questions:
+        start = time.perf_counter()
+        vectors.append(model.embed_query(question))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return np.asarray(vectors, dtype=np.float32), {
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * latencies[len(latencies) // 2]
+    }
+
+
+def top_k(queries, corpus, k):
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark embedding backends')
+    parser.add_argument('--pdf', default=os.path.join(REPO_DIR, 'content.pdf'))
+    parser.add_argument('--model', default=os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2'))
+    parser.add_argument('--limit', type=int, default=0, help='Use at most this many chunks')
+    parser.add_argument('--repeats', type=int, default=3, help='Keep the best of this many encoding runs')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=None, help='onnxruntime intra-op threads')
+    parser.add_argument('--batch-size', type=int, default=None, help='ONNX encoding batch size')
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    chunks = load_chunks(args.pdf, args.limit)
+    questions = list(QUESTIONS)
+
+    start = time.perf_counter()
+    torch_model = HuggingFaceEmbeddings(model_name=args.model, model_kwargs={'device': 'cpu'})
+    torch_load = time.perf_counter() - start
+    start = time.perf_counter()
+    onnx_model = OnnxEmbeddings(args.model, threads=args.threads, batch_size=args.batch_size)
+    onnx_load = time.perf_counter() - start
+
+    results = {'model': args.model, 'chunks': len(chunks)}
+    vectors = {}
+    for name, model, load_seconds in (('pytorch', torch_model, torch_load), ('onnx_int8', onnx_model, onnx_load)):
+        documents, seconds = time_documents(model, chunks, args.repeats)
+        queries, query_latency = time_queries(model, questions)
+        vectors[name] = (documents, queries)
+        results[name] = {
+            'load_seconds': load_seconds,
+            'documents_per_second': len(chunks) / seconds,
+            'query_latency': query_latency
+        }
+
+    agreement = cosine_agreement(vectors['pytorch'][0], vectors['onnx_int8'][0])
+    reference = top_k(vectors['pytorch'][1], vectors['pytorch'][0], args.k)
+    mixed = top_k(vectors['onnx_int8'][1], vectors['pytorch'][0], args.k)
+    overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(reference, mixed)])
+
+    results['parity'] = {
+        'min_cosine': float(agreement.min()),
+        'mean_cosine': float(agreement.mean()),
+        'p1_cosine': float(np.percentile(agreement, 1)),
+        'cross_backend_top_k_overlap': float(overlap)
+    }
+    results['speedup'] = results['onnx_int8']['documents_per_second'] / results['pytorch']['documents_per_second']
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
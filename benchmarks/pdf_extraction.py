@@ -0,0 +1,83 @@
+"""
+Measure serial against page-parallel PDF text extraction.
+
+Extracts each PDF once serially and once per worker count on the process
+pool, checks that every run yields exactly the same pages and metadata, and
+reports pages/s. Only pypdf is needed.
+
+    python benchmarks/pdf_extraction.py --synthetic-pages 600 --workers 2 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'app'))
+
+from synthetic_pdf import write_synthetic_pdf
+from utils import pdf_extraction
+
+
+def timed_extract(path, parallel):
+    start = time.perf_counter()
+    pages = list(pdf_extraction.iter_pdf_pages(path, parallel=parallel))
+    return pages, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark page-parallel PDF extraction')
+    parser.add_argument('--pdf', action='append', help='PDF to extract (repeatable)')
+    parser.add_argument('--synthetic-pages', type=int, action='append',
+                        help='Also extract a synthetic PDF with this many pages (default 600)')
+    parser.add_argument('--workers', type=int, action='append', help='Worker counts to try (default 2 and 4)')
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='pdf-extract-bench-')
+    pdfs = list(args.pdf or [])
+    for pages in args.synthetic_pages or [600]:
+        pdfs.append(write_synthetic_pdf(os.path.join(workdir, f"synthetic_{pages}_pages.pdf"), pages))
+
+    results = {'cpu_count': os.cpu_count(), 'documents': []}
+    for path in pdfs:
+        serial_pages, serial_seconds = timed_extract(path, parallel=False)
+        entry = {
+            'document': os.path.basename(path),
+            'pages': len(serial_pages),
+            'serial': {'seconds': serial_seconds, 'pages_per_second': len(serial_pages) / serial_seconds},
+            'parallel': []
+        }
+
+        for workers in args.workers or [2, 4]:
+            os.environ['PDF_EXTRACT_WORKERS'] = str(workers)
+            if pdf_extraction._pool is not None:
+                pdf_extraction._pool.shutdown()
+                pdf_extraction._pool = None
+            # Start the pool outside the measurement; spawning workers is a one-off cost
+            pdf_extraction._get_pool().submit(len, '').result()
+
+            pages, seconds = timed_extract(path, parallel=True)
+            entry['parallel'].append({
+                'workers': workers,
+                'seconds': seconds,
+                'pages_per_second': len(pages) / seconds,
+                'speedup': serial_seconds / seconds,
+                'identical': pages == serial_pages
+            })
+        results['documents'].append(entry)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if not all(run['identical'] for entry in results['documents'] for run in entry['parallel']):
+        sys.exit("Parallel extraction differs from serial extraction")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Measure recall@k of vector, BM25 and hybrid (reciprocal rank fusion) retrieval.
+
+Chunks come from a PDF (default content.pdf) via the app's own splitter and
+metadata. Queries are generated from the chunks themselves, in two styles:
+- sentence: one sentence taken from a chunk; every chunk containing it is relevant
+- terms: the rarest terms of a chunk, like a question naming a method or dataset;
+  the source chunk is relevant
+Hand-written queries can be added with --queries, a JSON lines file of
+{"question": ..., "contains": "text the relevant chunks contain"}.
+
+Vector search is exact cosine over the embedded chunks, BM25 runs on the
+app's lexical index in a temporary directory, and hybrid fuses the two with the
+retriever's reciprocal_rank_fusion exactly as queries do.
+
+    python benchmarks/retrieval_recall.py --pdf content.pdf --output recall.json
+"""
+import os
+import re
+import sys
+import json
+import random
+import argparse
+import tempfile
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'app'))
+
+from langchain_core.documents import Document
+from utils.pdf_processor import iter_pages, iter_document_chunks, hash_file, get_page_count
+from utils.embeddings import get_embeddings_model
+from database.lexical_index import LexicalIndex, INDEX_FILE, tokenize
+from rag.retriever import reciprocal_rank_fusion
+
+K_VALUES = (1, 3, 5, 10)
+
+
+def load_chunks(pdf_path):
+    total_pages = get_page_count(pdf_path)
+    return list(iter_document_chunks(
+        iter_pages(pdf_path, total_pages), os.path.basename(pdf_path), hash_file(pdf_path), total_pages
+    ))
+
+
+def sentence_queries(chunks, count, rng):
+    queries = []
+    for chunk in rng.sample(chunks, min(count, len(chunks))):
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', chunk.page_content) if len(s.split()) >= 6]
+        if sentences:
+            sentence = rng.choice(sentences)
+            queries.append({'question': sentence, 'contains': sentence})
+    return queries
+
+
+def term_queries(chunks, count, rng, terms_per_query=3):
+    document_frequency = {}
+    for chunk in chunks:
+        for term in set(tokenize(chunk.page_content)):
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    queries = []
+    for chunk in rng.sample(chunks, min(count, len(chunks))):
+        # Rare alphabetic terms, i.e. names rather than page numbers or stray digits
+        terms = sorted(
+            (term for term in set(tokenize(chunk.page_content)) if len(term) > 3 and not term.isdigit()),
+            key=lambda term: (document_frequency[term], term)
+        )[:terms_per_query]
+        if terms:
+            queries.append({'question': ' '.join(terms), 'chunk_ids': [chunk.metadata['chunk_id']]})
+    return queries
+
+
+def relevant_ids(query, chunks):
+    if 'chunk_ids' in query:
+        return set(query['chunk_ids'])
+    needle = ' '.join(query['contains'].split())
+    return {chunk.metadata['chunk_id'] for chunk in chunks if needle in ' '.join(chunk.page_content.split())}
+
+
+def evaluate(rankings, relevant):
+    """
+    recall@k averaged over queries, plus mean reciprocal rank of the first relevant hit
+    """
+    recall = {k: 0.0 for k in K_VALUES}
+    reciprocal_ranks = 0.0
+    for ranking, wanted in zip(rankings, relevant):
+        for k in K_VALUES:
+            recall[k] += len(wanted & set(ranking[:k])) / len(wanted)
+        first = next((rank for rank, chunk_id in enumerate(ranking) if chunk_id in wanted), None)
+        reciprocal_ranks += 1.0 / (first + 1) if first is not None else 0.0
+    n = max(len(rankings), 1)
+    return {'recall': {f"@{k}": recall[k] / n for k in K_VALUES}, 'mrr': reciprocal_ranks / n}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vector, BM25 and hybrid retrieval recall')
+    parser.add_argument('--pdf', default=os.path.join(REPO_DIR, 'content.pdf'))
+    parser.add_argument('--queries', help='JSON lines file of hand-written queries')
+    parser.add_argument('--samples', type=int, default=100, help='Generated queries per style')
+    parser.add_argument('--candidates', type=int, default=int(os.getenv('RETRIEVAL_HYBRID_CANDIDATES', '10')),
+                        help='Hits fetched from each retriever before fusion')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chunks = load_chunks(args.pdf)
+    ids = [chunk.metadata['chunk_id'] for chunk in chunks]
+    depth = max(max(K_VALUES), args.candidates)
+
+    model = get_embeddings_model()
+    matrix = np.asarray(model.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    lexical_index = LexicalIndex(os.path.join(tempfile.mkdtemp(prefix='recall-bench-'), INDEX_FILE))
+    lexical_index.upsert(ids, [chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks])
+
+    query_sets = {
+        'sentence': sentence_queries(chunks, args.samples, rng),
+        'terms': term_queries(chunks, args.samples, rng)
+    }
+    if args.queries:
+        with open(args.queries) as f:
+            query_sets['custom'] = [json.loads(line) for line in f if line.strip()]
+
+    results = {'document': os.path.basename(args.pdf), 'chunks': len(chunks), 'candidates': args.candidates}
+    for style, queries in query_sets.items():
+        queries = [query for query in queries if relevant_ids(query, chunks)]
+        relevant = [relevant_ids(query, chunks) for query in queries]
+        vectors = np.asarray(model.embed_queries([query['question'] for query in queries]), dtype=np.float32)
+        similarities = vectors @ matrix.T
+
+        rankings = {'vector': [], 'bm25': [], 'hybrid': []}
+        for query, row in zip(queries, similarities):
+            order = np.argsort(-row)[:depth]
+            dense = [(Document(page_content='', metadata={'chunk_id': ids[i]}), 1.0 - row[i]) for i in order]
+            sparse = lexical_index.search(query['question'], depth)
+            rankings['vector'].append([doc.metadata['chunk_id'] for doc, _ in dense])
+            rankings['bm25'].append([doc.metadata['chunk_id'] for doc, _ in sparse])
+            fused = reciprocal_rank_fusion([dense[:args.candidates], sparse[:args.candidates]])
+            rankings['hybrid'].append([doc.metadata['chunk_id'] for doc, _ in fused])
+
+        results[style] = {'queries': len(queries)}
+        for name, ranked in rankings.items():
+            results[style][name] = evaluate(ranked, relevant)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
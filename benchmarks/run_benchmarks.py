@@ -0,0 +1,394 @@
+"""
+Offline benchmark harness for the query API.
+
+Starts create_app() in-process against a temporary Chroma directory, a local
+MongoDB stand-in (mongomock, or a real server via --mongo-uri) and a stub
+Ollama server, then replays an ingestion and query workload over HTTP.
+Results are written as JSON: ingestion throughput, query throughput and
+latency percentiles, peak RSS and per-stage timings from /metrics.
+
+The embedding model must already be in the local Hugging Face cache;
+set HF_HUB_OFFLINE=1 to make sure nothing is downloaded.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --output results.json --compare benchmarks/baseline.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+APP_DIR = os.path.join(REPO_DIR, 'app')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+import requests
+from stub_ollama import StubOllamaServer
+from synthetic_pdf import write_synthetic_pdf
+
+QUESTION_TEMPLATES = (
+    "What is the main contribution of {doc}?",
+    "Summarize the methods described in {doc}.",
+    "Which datasets are used in {doc}?",
+    "What are the limitations discussed in {doc}?",
+    "What is the first sentence of {doc}?",
+)
+
+# Result fields checked in comparison mode: (path, higher_is_better)
+COMPARED_FIELDS = (
+    (('queries', 'throughput_rps'), True),
+    (('queries', 'latency', 'p50'), False),
+    (('queries', 'latency', 'p95'), False),
+    (('queries', 'latency', 'p99'), False),
+    (('peak_rss_mb',), False),
+)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize_latencies(latencies):
+    return {
+        'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else 0.0
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def configure_environment(workdir, stub_url, args):
+    os.environ['CHROMA_STORAGE_DIR'] = os.path.join(workdir, 'chroma')
+    os.environ['PDF_STORAGE_DIR'] = os.path.join(workdir, 'pdfs')
+    os.environ['OLLAMA_HOST'] = stub_url
+    os.environ['OLLAMA_MODEL'] = args.model
+    os.environ['CATALOG_REFRESH_INTERVAL'] = '0'
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    if args.vector_backend:
+        os.environ['VECTOR_BACKEND'] = args.vector_backend
+    if args.embedding_backend:
+        os.environ['EMBEDDING_BACKEND'] = args.embedding_backend
+    if args.no_answer_cache:
+        os.environ['ANSWER_CACHE_TTL'] = '0.000001'
+
+
+def install_mongo_stand_in(mongo_uri):
+    """
+    Point the app at a real MongoDB, or replace the pooled client with mongomock
+    """
+    if mongo_uri:
+        os.environ['MONGODB_URI'] = mongo_uri
+        return 'mongodb'
+
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock is not installed; pip install mongomock or pass --mongo-uri")
+
+    import database.mongo_client as mongo_client
+    client = mongomock.MongoClient()
+    mongo_client.get_mongo_client = lambda: client
+    return 'mongomock'
+
+
+def start_app_server():
+    from werkzeug.serving import make_server
+    from main import create_app
+
+    app = create_app()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='bench-app', daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+_METRIC_LINE = re.compile(r'^app_stage_duration_seconds_(bucket|sum|count)\{(.*)\} (\S+)$')
+
+
+def scrape_stage_metrics(base_url):
+    """
+    Return {stage: {'buckets': {le: cumulative}, 'sum': s, 'count': n}} from /metrics
+    """
+    stages = {}
+    for line in requests.get(f"{base_url}/metrics", timeout=30).text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        kind, raw_labels, value = match.groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', raw_labels))
+        stage = stages.setdefault(labels['stage'], {'buckets': {}, 'sum': 0.0, 'count': 0})
+        if kind == 'bucket':
+            stage['buckets'][labels['le']] = float(value)
+        elif kind == 'sum':
+            stage['sum'] = float(value)
+        else:
+            stage['count'] = int(float(value))
+    return stages
+
+
+def _bucket_quantile(buckets, count, pct):
+    target = count * pct / 100.0
+    for bound, cumulative in sorted(buckets.items(), key=lambda item: float(item[0])):
+        if cumulative >= target:
+            return float(bound)
+    return float('inf')
+
+
+def stage_breakdown(before, after):
+    """
+    Per-stage count, mean and bucket-resolution p95/p99 for what happened between two scrapes
+    """
+    breakdown = {}
+    for stage, current in after.items():
+        previous = before.get(stage, {'buckets': {}, 'sum': 0.0, 'count': 0})
+        count = current['count'] - previous['count']
+        if count <= 0:
+            continue
+        buckets = {
+            le: value - previous['buckets'].get(le, 0.0)
+            for le, value in current['buckets'].items()
+        }
+        breakdown[stage] = {
+            'count': count,
+            'total': current['sum'] - previous['sum'],
+            'mean': (current['sum'] - previous['sum']) / count,
+            'p95': _bucket_quantile(buckets, count, 95),
+            'p99': _bucket_quantile(buckets, count, 99)
+        }
+    return breakdown
+
+
+def ingest_document(base_url, path, timeout):
+    """
+    Upload a PDF and wait for its ingestion job to finish
+    """
+    start = time.time()
+    with open(path, 'rb') as f:
+        response = requests.post(
+            f"{base_url}/pdf/papers",
+            files={'file': (os.path.basename(path), f, 'application/pdf')},
+            timeout=timeout
+        )
+    response.raise_for_status()
+    job_id = response.json()['data']['job_id']
+
+    while True:
+        job = requests.get(f"{base_url}/pdf/jobs/{job_id}", timeout=30).json()['data']
+        if job['state'] in ('completed', 'failed'):
+            break
+        if time.time() - start > timeout:
+            raise TimeoutError(f"Ingestion of {path} did not finish in {timeout}s")
+        time.sleep(0.1)
+
+    seconds = time.time() - start
+    if job['state'] == 'failed':
+        raise RuntimeError(f"Ingestion of {path} failed: {job.get('error')}")
+
+    pages = (job.get('progress') or {}).get('total_pages') or 0
+    chunks = (job.get('result') or {}).get('chunks_processed', 0)
+    return {
+        'document': os.path.basename(path),
+        'pages': pages,
+        'chunks': chunks,
+        'seconds': seconds,
+        'pages_per_second': pages / seconds if seconds else 0.0,
+        'chunks_per_second': chunks / seconds if seconds else 0.0
+    }
+
+
+def build_questions(document_names, total, unique):
+    questions = []
+    stems = [os.path.splitext(name)[0] for name in document_names]
+    i = 0
+    while len(questions) < total:
+        template = QUESTION_TEMPLATES[i % len(QUESTION_TEMPLATES)]
+        stem = stems[(i // len(QUESTION_TEMPLATES)) % len(stems)]
+        question = template.format(doc=stem)
+        if unique:
+            question = f"{question} (variant {i})"
+        questions.append(question)
+        i += 1
+    return questions
+
+
+def run_query_mix(base_url, questions, concurrency, timeout):
+    latencies = []
+    status_codes = {}
+    lock = threading.Lock()
+
+    def send(question):
+        start = time.perf_counter()
+        try:
+            status = requests.post(f"{base_url}/query/", data={'question': question}, timeout=timeout).status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, questions))
+    duration = time.time() - start
+
+    return {
+        'requests': len(questions),
+        'errors': sum(count for status, count in status_codes.items() if status != '200'),
+        'concurrency': concurrency,
+        'duration': duration,
+        'throughput_rps': len(questions) / duration if duration else 0.0,
+        'latency': summarize_latencies(latencies),
+        'status_codes': status_codes
+    }
+
+
+def _get_path(data, path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def compare_results(results, baseline, tolerance):
+    """
+    Return a list of regressions: fields that got worse than the baseline by more than tolerance
+    """
+    checks = list(COMPARED_FIELDS)
+    for entry in baseline.get('ingestion', []):
+        checks.append((('ingestion_seconds', entry['document']), False))
+
+    results = dict(results, ingestion_seconds={e['document']: e['seconds'] for e in results.get('ingestion', [])})
+    baseline = dict(baseline, ingestion_seconds={e['document']: e['seconds'] for e in baseline.get('ingestion', [])})
+
+    regressions = []
+    for path, higher_is_better in checks:
+        current, previous = _get_path(results, path), _get_path(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        regressions.append({
+            'metric': '.'.join(path),
+            'baseline': previous,
+            'current': current,
+            'change': change,
+            'regression': worse
+        })
+    return [r for r in regressions if r['regression']], regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline ingestion and query benchmarks')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative slowdown before flagging')
+    parser.add_argument('--mongo-uri', help='Use a real MongoDB instead of mongomock')
+    parser.add_argument('--pdf', action='append', help='PDF to ingest (default: content.pdf)')
+    parser.add_argument('--synthetic-pages', type=int, action='append', default=None,
+                        help='Also ingest a synthetic PDF with this many pages (repeatable)')
+    parser.add_argument('--queries', type=int, default=200, help='Number of /query/ requests')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent query clients')
+    parser.add_argument('--unique-questions', action='store_true', help='Never repeat a question')
+    parser.add_argument('--no-answer-cache', action='store_true', help='Expire answer cache entries immediately')
+    parser.add_argument('--model', default='academiqa')
+    parser.add_argument('--stub-latency', type=float, default=0.2, help='Stub LLM seconds before first token')
+    parser.add_argument('--stub-token-rate', type=float, default=50.0, help='Stub LLM tokens per second')
+    parser.add_argument('--stub-tokens', type=int, default=64, help='Stub LLM tokens per answer')
+    parser.add_argument('--vector-backend', choices=('chroma', 'numpy'), help='VECTOR_BACKEND to benchmark')
+    parser.add_argument('--embedding-backend', choices=('huggingface', 'onnx'), help='EMBEDDING_BACKEND to benchmark')
+    parser.add_argument('--timeout', type=float, default=1800.0)
+    parser.add_argument('--keep-workdir', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='academiqa-bench-')
+    stub = StubOllamaServer(model=args.model, latency=args.stub_latency,
+                            token_rate=args.stub_token_rate, tokens=args.stub_tokens).start()
+    configure_environment(workdir, stub.url, args)
+    mongo_mode = install_mongo_stand_in(args.mongo_uri)
+
+    pdfs = args.pdf or [os.path.join(REPO_DIR, 'content.pdf')]
+    for pages in args.synthetic_pages or [300]:
+        pdfs.append(write_synthetic_pdf(os.path.join(workdir, f"synthetic_{pages}_pages.pdf"), pages))
+
+    server = None
+    try:
+        startup_start = time.time()
+        server, base_url = start_app_server()
+        startup_seconds = time.time() - startup_start
+
+        before = scrape_stage_metrics(base_url)
+        ingestion = [ingest_document(base_url, path, args.timeout) for path in pdfs]
+        after_ingestion = scrape_stage_metrics(base_url)
+
+        questions = build_questions([entry['document'] for entry in ingestion], args.queries, args.unique_questions)
+        queries = run_query_mix(base_url, questions, args.concurrency, args.timeout)
+        after_queries = scrape_stage_metrics(base_url)
+
+        results = {
+            'config': {
+                'mongo': mongo_mode,
+                'queries': args.queries,
+                'concurrency': args.concurrency,
+                'unique_questions': args.unique_questions,
+                'stub_latency': args.stub_latency,
+                'stub_token_rate': args.stub_token_rate,
+                'stub_tokens': args.stub_tokens,
+                'vector_backend': os.getenv('VECTOR_BACKEND', 'chroma'),
+                'embedding_backend': os.getenv('EMBEDDING_BACKEND', 'huggingface')
+            },
+            'startup_seconds': startup_seconds,
+            'ingestion': ingestion,
+            'queries': queries,
+            'llm_requests': stub.requests,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': {
+                'ingestion': stage_breakdown(before, after_ingestion),
+                'query': stage_breakdown(after_ingestion, after_queries)
+            }
+        }
+    finally:
+        if server is not None:
+            server.shutdown()
+        stub.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({k: results[k] for k in ('ingestion', 'queries', 'peak_rss_mb')}, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions, checked = compare_results(results, baseline, args.tolerance)
+        for entry in checked:
+            flag = 'REGRESSION' if entry['regression'] else 'ok'
+            print(f"{flag:>10}  {entry['metric']}: {entry['baseline']:.4f} -> {entry['current']:.4f} ({entry['change']:+.1%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
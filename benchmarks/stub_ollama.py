@@ -0,0 +1,185 @@
+"""
+Minimal stand-in for the Ollama HTTP API used by the benchmarks.
+
+Implements /api/generate (streaming and non-streaming), /api/tags, /api/ps and
+/api/show with a configurable prefill latency and token rate, so query
+benchmarks run without Docker, a GPU or network access.
+"""
+import json
+import time
+import argparse
+import threading
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _keep_alive_seconds(keep_alive):
+    """
+    Seconds the model stays loaded for a keep_alive value: a number of seconds or a
+    duration such as "10m"; negative keeps it loaded forever, missing means 5 minutes
+    """
+    if keep_alive is None:
+        return 300.0
+    if isinstance(keep_alive, str):
+        units = {'s': 1, 'm': 60, 'h': 3600}
+        if keep_alive and keep_alive[-1] in units:
+            keep_alive = float(keep_alive[:-1]) * units[keep_alive[-1]]
+        else:
+            keep_alive = float(keep_alive)
+    return float('inf') if keep_alive < 0 else float(keep_alive)
+
+
+class StubOllamaServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, model: str = 'academiqa',
+                 latency: float = 0.2, token_rate: float = 50.0, tokens: int = 64):
+        self.model = model
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._loaded_until = 0.0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path == '/':
+                    body = b'Ollama is running'
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/api/tags':
+                    self._send_json({'models': [stub._model_entry()]})
+                elif self.path == '/api/ps':
+                    loaded = [stub._model_entry()] if stub._loaded_until > time.time() else []
+                    self._send_json({'models': loaded})
+                else:
+                    self._send_json({'error': 'not found'}, 404)
+
+            def do_POST(self):
+                payload = self._read_json()
+                if self.path == '/api/show':
+                    self._send_json({'modelfile': '', 'parameters': '', 'details': {}})
+                elif self.path == '/api/generate':
+                    stub._generate(self, payload)
+                else:
+                    self._send_json({'error': 'not found'}, 404)
+
+        return Handler
+
+    def _model_entry(self):
+        return {'name': f"{self.model}:latest", 'model': f"{self.model}:latest", 'size': 0}
+
+    def _chunk(self, text, done=False, **extra):
+        return dict({
+            'model': self.model,
+            'created_at': datetime.datetime.utcnow().isoformat() + 'Z',
+            'response': text,
+            'done': done
+        }, **extra)
+
+    def _generate(self, handler, payload):
+        with self._lock:
+            self.requests += 1
+        self._loaded_until = time.time() + _keep_alive_seconds(payload.get('keep_alive'))
+
+        start = time.time()
+        time.sleep(self.latency)
+        token_delay = 1.0 / self.token_rate if self.token_rate > 0 else 0.0
+        tokens = [f"token{i} " for i in range(self.tokens if payload.get('prompt') else 0)]
+        final = {
+            'done_reason': 'stop',
+            'context': [],
+            'prompt_eval_count': len(payload.get('prompt', '').split()),
+            'eval_count': len(tokens)
+        }
+
+        if payload.get('stream', True) is False:
+            time.sleep(token_delay * len(tokens))
+            final['total_duration'] = int((time.time() - start) * 1e9)
+            handler._send_json(self._chunk(''.join(tokens), done=True, **final))
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def write_line(obj):
+            data = (json.dumps(obj) + '\n').encode('utf-8')
+            handler.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+            handler.wfile.flush()
+
+        for token in tokens:
+            write_line(self._chunk(token))
+            time.sleep(token_delay)
+        final['total_duration'] = int((time.time() - start) * 1e9)
+        write_line(self._chunk('', done=True, **final))
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stub Ollama server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--model', default='academiqa')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds before the first token')
+    parser.add_argument('--token-rate', type=float, default=50.0, help='Tokens per second')
+    parser.add_argument('--tokens', type=int, default=64, help='Tokens per answer')
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, args.model, args.latency, args.token_rate, args.tokens)
+    print(f"Stub Ollama listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Generate synthetic multi-page text PDFs for ingestion benchmarks, without
+any PDF library. Text is deterministic for a given seed so runs are comparable.
+"""
+import random
+import argparse
+
+WORDS = (
+    "model data training network results method analysis performance learning "
+    "evaluation dataset baseline attention transformer retrieval embedding query "
+    "document corpus experiment accuracy precision recall benchmark latency "
+    "throughput optimization gradient parameter layer inference sampling"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_lines(rng, page_number, lines_per_page, words_per_line):
+    lines = [f"Section {page_number + 1}. Synthetic page {page_number + 1}"]
+    for _ in range(lines_per_page - 1):
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(words_per_line)))
+    return lines
+
+
+def write_synthetic_pdf(path: str, pages: int = 300, lines_per_page: int = 45,
+                        words_per_line: int = 12, seed: int = 0):
+    """
+    Write a PDF with the given number of text pages and return its path
+    """
+    rng = random.Random(seed)
+    objects = []
+
+    # 1: catalog, 2: page tree, 3: font; pages and contents follow
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = ' '.join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode('ascii'))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    for page_number, page_id in enumerate(page_ids):
+        content_id = page_id + 1
+        text_ops = ["BT", "/F1 10 Tf", "12 TL", "50 790 Td"]
+        for line in _page_lines(rng, page_number, lines_per_page, words_per_line):
+            text_ops.append(f"({_escape(line)}) Tj T*")
+        text_ops.append("ET")
+        stream = '\n'.join(text_ops).encode('latin-1')
+
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode('ascii'))
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode('ascii') + stream + b"\nendstream"
+        )
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n".encode('ascii') + body + b"\nendobj\n")
+        xref_offset = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n".encode('ascii'))
+        f.write(b"0000000000 65535 f \n")
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode('ascii'))
+        f.write((
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        ).encode('ascii'))
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic text PDF')
+    parser.add_argument('path')
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic_pdf(args.path, args.pages, seed=args.seed)
+    print(f"Wrote {args.pages} pages to {args.path}")
+
+
+if __name__ == '__main__':
+    main()
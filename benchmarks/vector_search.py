@@ -0,0 +1,120 @@
+"""
+Compare vector search latency of the Chroma and NumPy backends.
+
+Both backends are filled with the same random unit vectors spread over a set
+of documents, then queried with the same vectors, unscoped and scoped to one
+document, through the same calls the retriever makes. No embedding model is
+loaded; vectors are generated directly.
+
+    python benchmarks/vector_search.py --vectors 200000 --dim 384 --queries 200
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'app'))
+
+from database.numpy_index import NumpyVectorIndex
+
+
+def make_corpus(vectors, dim, documents, seed):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(vectors, dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = [f"chunk-{i}" for i in range(vectors)]
+    metadatas = [{'document_name': f"doc_{i % documents}.pdf", 'chunk_index': i // documents} for i in range(vectors)]
+    texts = [f"chunk {i}" for i in range(vectors)]
+    return ids, embeddings, metadatas, texts
+
+
+def open_backend(name, directory):
+    if name == 'numpy':
+        return NumpyVectorIndex(directory, None), None
+    from langchain_chroma import Chroma
+    store = Chroma(collection_name='pdf_chunks', embedding_function=None, persist_directory=directory)
+    return store, store._collection
+
+
+def load(store, collection, ids, embeddings, metadatas, texts, batch_size):
+    target = collection if collection is not None else store
+    start = time.perf_counter()
+    for offset in range(0, len(ids), batch_size):
+        end = offset + batch_size
+        target.upsert(
+            ids=ids[offset:end],
+            embeddings=embeddings[offset:end].tolist(),
+            metadatas=metadatas[offset:end],
+            documents=texts[offset:end]
+        )
+    return time.perf_counter() - start
+
+
+def time_queries(store, queries, k, filter=None):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=k, filter=filter)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        'mean_ms': 1000 * sum(latencies) / len(latencies),
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'p99_ms': 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vector search backends')
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--documents', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--backend', action='append', choices=('chroma', 'numpy'),
+                        help='Backend to measure (repeatable, default both)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    ids, embeddings, metadatas, texts = make_corpus(args.vectors, args.dim, args.documents, args.seed)
+    queries = embeddings[np.random.default_rng(args.seed + 1).choice(args.vectors, args.queries)]
+
+    results = {}
+    for name in args.backend or ['chroma', 'numpy']:
+        directory = tempfile.mkdtemp(prefix=f'vector-bench-{name}-')
+        try:
+            store, collection = open_backend(name, directory)
+            load_seconds = load(store, collection, ids, embeddings, metadatas, texts, args.batch_size)
+
+            # Search a batch of all queries at once where the backend supports it
+            batched = None
+            if hasattr(store, 'similarity_search_by_vectors'):
+                start = time.perf_counter()
+                store.similarity_search_by_vectors(queries, k=args.k)
+                batched = 1000 * (time.perf_counter() - start) / len(queries)
+
+            results[name] = {
+                'load_seconds': load_seconds,
+                'vectors_per_second': args.vectors / load_seconds,
+                'unscoped': time_queries(store, queries, args.k),
+                'scoped': time_queries(store, queries, args.k, filter={'document_name': 'doc_0.pdf'}),
+                'batched_mean_ms': batched
+            }
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
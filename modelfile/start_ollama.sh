@@ -4,7 +4,9 @@ echo "Starting ollama serve in background..."
 ollama serve &
 
 echo "Waiting for ollama to be ready..."
-sleep 15
+until ollama list > /dev/null 2>&1; do
+    sleep 1
+done
 
 echo "Creating academiqa model..."
 ollama create academiqa -f /modelfile/Modelfile
@@ -0,0 +1,84 @@
+"""
+Routing of questions by the structural question classifier: structural facts
+about a document take the fast path, content questions go to the RAG chain.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from rag.structure_answers import classify_structural_question, answer_structural_question
+
+# (question, intent), None meaning the question goes to the RAG chain
+EXAMPLE_QUESTIONS = (
+    ('What is the first line of content.pdf?', 'first_line'),
+    ("content.pdf's opening line", 'first_line'),
+    ('What does the first line of the paper say?', 'first_line'),
+    ('What is the first sentence?', 'first_sentence'),
+    ('What is the title of content.pdf?', 'title'),
+    ('What is the paper called?', 'title'),
+    ('Show me the abstract', 'abstract'),
+    ('How many pages does content.pdf have?', 'page_count'),
+    ('How many pages are there in the document?', 'page_count'),
+    ('What are the sections of content.pdf?', 'headings'),
+    ('List the section headings', 'headings'),
+    ('Give me the table of contents', 'headings'),
+    ('Give an outline of the paper', 'headings'),
+    ('Which page does section 3 start on?', 'heading_page'),
+    ('What page is the related work section on?', 'heading_page'),
+    ('Page number of the introduction in content.pdf', 'heading_page'),
+    ('Which sections of content.pdf use dropout?', None),
+    ('What results are shown in the first line of Table 2?', None),
+    ('Give an outline of the training algorithm', None),
+    ('What is the title of table 3?', None),
+    ('What is the first line of section 2?', None),
+    ('Which sections discuss attention?', None),
+    ('How many pages discuss the results?', None),
+    ('Which page mentions figure 4?', None),
+    ('Why is the title misleading?', None),
+    ('Summarize the abstract', None),
+    ('What does the abstract say about dropout?', None),
+)
+
+CATALOG = {
+    'content.pdf': {
+        'structure': {
+            'title': 'A Paper',
+            'first_line': 'A Paper',
+            'first_sentence': 'A Paper studies things.',
+            'abstract': None,
+            'page_count': 7,
+            'headings': [
+                {'number': '1', 'title': 'Introduction', 'page': 1, 'page_label': '1'},
+                {'number': '2', 'title': 'Related Work', 'page': 2, 'page_label': '2'},
+                {'number': '3', 'title': 'Method', 'page': 3, 'page_label': '3'},
+            ]
+        }
+    }
+}
+
+
+@pytest.mark.parametrize('question, intent', EXAMPLE_QUESTIONS)
+def test_classify_structural_question(question, intent):
+    assert classify_structural_question(question, ['content.pdf']) == intent
+
+
+@pytest.mark.parametrize('question, answer, page', [
+    ('Which page does section 3 start on?', '3 Method (page 3)', 3),
+    ('What page is the related work section on?', '2 Related Work (page 2)', 2),
+    ('Page number of the introduction in content.pdf', '1 Introduction (page 1)', 1),
+])
+def test_heading_page_answers(question, answer, page):
+    result, intent = answer_structural_question(question, ['content.pdf'], CATALOG)
+    assert intent == 'heading_page'
+    assert result['answer'] == answer
+    assert result['citations'][0]['page'] == page
+
+
+def test_missing_field_falls_back_to_rag():
+    assert answer_structural_question('Show me the abstract', ['content.pdf'], CATALOG) is None
+
+
+def test_unknown_heading_falls_back_to_rag():
+    assert answer_structural_question('Which page mentions dropout?', ['content.pdf'], CATALOG) is None